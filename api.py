@@ -0,0 +1,235 @@
+"""記事生成パイプラインの軽量HTTP API（標準ライブラリの http.server だけで動く）
+
+リクエスト・レスポンスはすべてJSONです。各ステージを同期的に実行するエンドポイントと、
+ジョブキュー（jobs.py）に投入して結果を後から取りに来るエンドポイントがあります。
+
+    POST   /outline   {"keyword", "intent", "num_h2"}
+    POST   /body      {"outline_data", "parallel"}
+    POST   /meta      {"article_body"}
+    POST   /check     {"article_body", "keyword", "meta_data"}
+    POST   /revise    {"article_body", "seo_check", "keyword", "incremental"}
+    POST   /scrape    {"url", "backend", "force_refresh"}
+    POST   /jobs      {"kind": "outline" など, "params": {...}}  → {"id"}
+    GET    /jobs/<id>                                          → ジョブの状態と結果
+    DELETE /jobs/<id>                                          → キャンセル
+    GET    /healthz
+    GET    /metrics   → ステージ別の所要時間・トークン数・推定コスト（Prometheusのテキスト形式）
+
+使い方:
+    GEMINI_API_KEY=... python api.py --port 8000 --workers 4
+"""
+
+import argparse
+import json
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import core
+import extractor
+import job_handlers
+import jobs
+import llm
+import telemetry
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8000
+MAX_BODY_BYTES = 2 * 1024 * 1024   # 2MB
+
+
+class HTTPError(Exception):
+    """ステータスコードつきでクライアントに返すエラー"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _require(payload, *keys):
+    missing = [key for key in keys if key not in payload]
+    if missing:
+        raise HTTPError(400, f"必須の項目がありません: {', '.join(missing)}")
+
+
+def _options(payload):
+    """リクエストに共通のオプション（キャッシュのバイパス）から generate を作る"""
+    return core.make_generate(use_cache=not payload.get("bypass_cache", False))
+
+
+def handle_outline(payload):
+    _require(payload, "keyword")
+    return core.outline(payload["keyword"], payload.get("intent", ""), payload.get("num_h2", 5),
+                        generate=_options(payload))
+
+
+def handle_body(payload):
+    _require(payload, "outline_data")
+    return {"article_body": core.body(payload["outline_data"], parallel=payload.get("parallel", False),
+                                      generate=_options(payload))}
+
+
+def handle_meta(payload):
+    _require(payload, "article_body")
+    return core.meta(payload["article_body"], generate=_options(payload))
+
+
+def handle_check(payload):
+    _require(payload, "article_body", "keyword")
+    return core.check(payload["article_body"], payload["keyword"], payload.get("meta_data"),
+                      generate=_options(payload))
+
+
+def handle_revise(payload):
+    _require(payload, "article_body", "seo_check", "keyword")
+    return core.revise(payload["article_body"], payload["seo_check"], payload["keyword"],
+                       incremental=payload.get("incremental", True), generate=_options(payload))
+
+
+def handle_scrape(payload):
+    _require(payload, "url")
+    page = core.scrape(payload["url"], backend=payload.get("backend", extractor.DEFAULT_BACKEND),
+                       force_refresh=payload.get("force_refresh", False))
+    return {key: page[key] for key in ("url", "text", "cache")}
+
+
+STAGE_ROUTES = {
+    "/outline": handle_outline,
+    "/body": handle_body,
+    "/meta": handle_meta,
+    "/check": handle_check,
+    "/revise": handle_revise,
+    "/scrape": handle_scrape,
+}
+
+
+def flow_control_metrics():
+    """Gemini呼び出しの同時実行数の上限・実行中の件数・サーキットの状態（Prometheusのテキスト形式）"""
+    stats = llm.flow_control_stats()
+    return (
+        "# HELP seo_studio_llm_concurrency_limit Current adaptive concurrency limit for Gemini calls.\n"
+        "# TYPE seo_studio_llm_concurrency_limit gauge\n"
+        f"seo_studio_llm_concurrency_limit {stats['limit']}\n"
+        "# HELP seo_studio_llm_in_flight Gemini calls currently in flight.\n"
+        "# TYPE seo_studio_llm_in_flight gauge\n"
+        f"seo_studio_llm_in_flight {stats['in_flight']}\n"
+        "# HELP seo_studio_llm_circuit_open Whether the circuit breaker is blocking Gemini calls.\n"
+        "# TYPE seo_studio_llm_circuit_open gauge\n"
+        f"seo_studio_llm_circuit_open {int(stats['circuit'] != 'closed')}\n"
+    )
+
+
+class APIHandler(BaseHTTPRequestHandler):
+    """JSONで入出力するリクエストハンドラー（server.queue にジョブキューを持つ）"""
+
+    server_version = "SEOStudioAPI/1.0"
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8")
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413, "リクエストが大きすぎます。")
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "リクエストの本文がJSONではありません。")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "リクエストの本文はJSONオブジェクトにしてください。")
+        return payload
+
+    def _job_id(self):
+        job_id = self.path.rstrip("/")[len("/jobs/"):]
+        if not self.path.startswith("/jobs/") or not job_id:
+            raise HTTPError(404, f"見つかりません: {self.path}")
+        return job_id
+
+    def _dispatch(self, method):
+        try:
+            self._send_json(200, method())
+        except HTTPError as e:
+            self._send_json(e.status, {"error": str(e)})
+        except Exception as e:
+            self._send_json(500, {"error": str(e)})
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body = telemetry.metrics_text() + flow_control_metrics()
+            self._send(200, body.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def do_DELETE(self):
+        self._dispatch(self._delete)
+
+    def _get(self):
+        if self.path == "/healthz":
+            return {"status": "ok"}
+        job = self.server.queue.get(self._job_id())
+        if job is None:
+            raise HTTPError(404, "ジョブが見つかりません。")
+        return job
+
+    def _post(self):
+        payload = self._read_json()
+        if self.path in STAGE_ROUTES:
+            return STAGE_ROUTES[self.path](payload)
+        if self.path == "/jobs":
+            _require(payload, "kind")
+            try:
+                return {"id": self.server.queue.submit(payload["kind"], payload.get("params", {}))}
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+        raise HTTPError(404, f"見つかりません: {self.path}")
+
+    def _delete(self):
+        job_id = self._job_id()
+        self.server.queue.cancel(job_id)
+        return {"id": job_id}
+
+
+def create_server(host=DEFAULT_HOST, port=DEFAULT_PORT, queue=None):
+    """APIサーバーを作る（serve_forever() で起動する）"""
+    server = ThreadingHTTPServer((host, port), APIHandler)
+    server.daemon_threads = True
+    server.queue = queue if queue is not None else jobs.JobQueue(job_handlers.HANDLERS)
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="記事生成パイプラインのHTTP APIを起動します。")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="待ち受けるアドレス")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="待ち受けるポート")
+    parser.add_argument("--workers", type=int, default=jobs.DEFAULT_WORKERS,
+                        help="/jobs を処理するワーカースレッド数（0なら別プロセスのワーカーに任せる）")
+    args = parser.parse_args(argv)
+
+    if not core.configure_from_env():
+        parser.error("環境変数 GEMINI_API_KEY を設定してください。")
+
+    server = create_server(args.host, args.port)
+    if args.workers:
+        server.queue.recover()
+        server.queue.start_workers(args.workers)
+    print(f"APIサーバーを起動しました: http://{args.host}:{args.port}（Ctrl+Cで終了します）", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.queue.stop_workers()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
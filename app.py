@@ -1,12 +1,24 @@
 import streamlit as st
-import google.generativeai as genai
 import os
+import time
 import json
-import re
-# WebスクレイピングとHTML埋め込み用ライブラリ
-import requests
-from bs4 import BeautifulSoup
-import streamlit.components.v1 as components 
+import hashlib
+import uuid
+# パイプライン本体（google.generativeai・requests・bs4 は使うときまで読み込まれない）
+import core
+import crawler
+import extractor
+import fetcher
+# Gemini応答の解析・セクション並列生成
+import llm
+import pipeline
+import telemetry
+import seo_metrics
+import revision
+import site_audit
+import jobs
+import job_handlers
+from section_writer import generate_sections_parallel
 
 # --- 0. 広告コードの定義 ---
 
@@ -66,7 +78,12 @@ except Exception as e:
     st.error(f"🚨 広告表示エラー（メインヘッダー）が発生しましたが、アプリは継続します。詳細: {e}")
 
 
-# 🔑 APIキーの取得 (ロジックは変更なし)
+# 🔑 APIキーの取得
+@st.cache_resource
+def configure_gemini(api_key):
+    """APIキーの設定はプロセスごとに1回だけ実行する（再実行のたびに設定し直さない）"""
+    llm.configure(api_key)
+
 try:
     API_KEY = os.environ.get("GEMINI_API_KEY") 
     
@@ -74,7 +91,7 @@ try:
         API_KEY = st.secrets["GEMINI_API_KEY"]
 
     if API_KEY:
-        genai.configure(api_key=API_KEY)
+        configure_gemini(API_KEY)
         api_key_valid = True
     else:
         api_key_valid = False
@@ -84,13 +101,81 @@ except Exception as e:
     api_key_valid = False
     st.error(f"API設定エラー: {e}")
 
+def get_response_cache():
+    """全セッション・バックグラウンドジョブで共有するGemini応答キャッシュ"""
+    return core.get_response_cache()
+
+# 🗄️ キャッシュの状態表示と、キャッシュを使わない再生成の切り替え
+@st.fragment
+def render_cache_panel():
+    """サイドバーのキャッシュ表示（削除ボタンを押してもページ全体は再実行しない）"""
+    st.markdown("#### 🗄️ AI応答キャッシュ")
+    st.checkbox("キャッシュを使わずに再生成する", key="bypass_cache")
+    if st.button("🧹 キャッシュを削除", key="clear_cache_btn"):
+        get_response_cache().clear()
+    cache_stats = get_response_cache().stats()
+    st.caption(
+        f"ヒット: {cache_stats['hits']} / ミス: {cache_stats['misses']} "
+        f"(ヒット率 {cache_stats['hit_rate']:.0%}) ・ "
+        f"{cache_stats['entries']}件 / {cache_stats['bytes'] / 1024:.0f}KB"
+    )
+
+# 📈 ステージごとの所要時間・トークン数・推定コスト（管理者向け: URLに ?admin=1 を付けると表示）
+TELEMETRY_PERIODS = {"直近1時間": 60 * 60, "直近24時間": 24 * 60 * 60, "すべて": None}
+TELEMETRY_COLUMNS = {
+    "kind": "種類", "stage": "ステージ", "count": "件数", "errors": "エラー",
+    "p50_ms": "p50 (ms)", "p95_ms": "p95 (ms)", "cache_hit_rate": "キャッシュ率", "retries": "リトライ",
+    "prompt_tokens": "入力トークン", "output_tokens": "出力トークン", "cost_usd": "推定コスト ($)",
+}
+
+@st.fragment
+def render_telemetry_panel():
+    """ステージ別のp50/p95・トークン数・推定コストの表（全プロセスの記録ファイルから集計する）"""
+    with st.expander("📈 パフォーマンス（管理者向け）"):
+        period = st.selectbox("集計期間", list(TELEMETRY_PERIODS), key="telemetry_period")
+        st.button("🔄 更新", key="refresh_telemetry_btn")
+        seconds = TELEMETRY_PERIODS[period]
+        rows = telemetry.summarize(telemetry.load_records(since=time.time() - seconds if seconds else None))
+        if not rows:
+            st.caption("まだ記録がありません。")
+            return
+        st.dataframe([{TELEMETRY_COLUMNS[k]: v for k, v in row.items()} for row in rows], hide_index=True)
+        st.caption(f"推定コスト合計: ${sum(row['cost_usd'] for row in rows):.4f}")
+
+with st.sidebar:
+    render_cache_panel()
+    if st.query_params.get("admin") == "1":
+        render_telemetry_panel()
+
 # セッションステートの初期化 (変更なし)
 if 'outline_data' not in st.session_state: st.session_state.outline_data = None
 if 'article_body' not in st.session_state: st.session_state.article_body = None
 if 'revised_body' not in st.session_state: st.session_state.revised_body = None
 if 'meta_data' not in st.session_state: st.session_state.meta_data = None
 if 'seo_check' not in st.session_state: st.session_state.seo_check = None
+if 'revision_changes' not in st.session_state: st.session_state.revision_changes = None
 if 'is_diagnosis_mode' not in st.session_state: st.session_state.is_diagnosis_mode = False
+# 類似検索インデックスに登録するときの、このセッションの記事・骨子のID
+if 'index_session_id' not in st.session_state: st.session_state.index_session_id = uuid.uuid4().hex
+if 'indexed_outline' not in st.session_state: st.session_state.indexed_outline = None
+if 'indexed_article' not in st.session_state: st.session_state.indexed_article = None
+# 実行中のバックグラウンドジョブ（ページを再読み込みした場合はURLのジョブIDから復元する）
+if 'active_jobs' not in st.session_state:
+    st.session_state.active_jobs = [job_id for job_id in st.query_params.get('jobs', '').split(',') if job_id]
+
+def reset_session():
+    """セッションステートをリセットする"""
+    st.session_state.outline_data = None
+    st.session_state.article_body = None
+    st.session_state.revised_body = None
+    st.session_state.meta_data = None
+    st.session_state.seo_check = None
+    st.session_state.revision_changes = None
+    st.session_state.is_diagnosis_mode = False
+    # やり直した後の記事・骨子は、前の記事とは別の文書として登録する
+    st.session_state.index_session_id = uuid.uuid4().hex
+    st.session_state.indexed_outline = None
+    st.session_state.indexed_article = None
 
 
 # --- 2. アプリのモード選択 ---
@@ -99,91 +184,101 @@ mode = st.radio(
     "アプリのモードを選択してください",
     ('🚀 記事ゼロイチ生成（新規作成）', '🔍 既存コンテンツ診断（添削）'),
     key='app_mode',
-    horizontal=True
+    horizontal=True,
+    # モードを切り替えたときだけリセットする（同じモード内の操作では結果を保持する）
+    on_change=reset_session
 )
 st.markdown("---")
 
 # --- 3. 共通関数定義 ---
 
-def get_gemini_response(prompt, json_mode=False):
-    """Gemini APIを呼び出す共通関数"""
+def get_gemini_response(prompt, json_mode=False, use_cache=True, stream=False, stage=None):
+    """Gemini APIを呼び出す共通関数（同一リクエストはキャッシュから返す）
+
+    stream=Trueの場合は、生成されたテキストを少しずつ返すジェネレーターを返します。
+    stage は計測（telemetry）で使うステージ名です。
+    """
     if not api_key_valid: return None
+    use_cache = use_cache and not st.session_state.get("bypass_cache", False)
+
+    if stream:
+        return _stream_gemini_response(prompt, use_cache, stage)
+
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash")
-        config = {}
-        if json_mode:
-            config["response_mime_type"] = "application/json"
-        response = model.generate_content(prompt, generation_config=config)
-        if json_mode:
-            match = re.search(r'\{.*\}', response.text, re.DOTALL)
-            return json.loads(match.group(0)) if match else None
-        return response.text
+        with telemetry.stage(stage):
+            text = llm.generate_text(prompt, json_mode, cache=get_response_cache(), use_cache=use_cache)
+            if json_mode:
+                return llm.parse_json_response(text)
+            return text
     except Exception as e:
         st.error(f"AI処理中にエラーが発生しました: {e}")
         return None
 
-def reset_session():
-    """セッションステートをリセットする"""
-    st.session_state.outline_data = None
-    st.session_state.article_body = None
-    st.session_state.revised_body = None
-    st.session_state.meta_data = None
-    st.session_state.seo_check = None
-    st.session_state.is_diagnosis_mode = False
+def _stream_gemini_response(prompt, use_cache, stage=None):
+    """生成中のテキストをチャンクごとに返す（st.write_stream用）"""
+    try:
+        yield from llm.stream_text(prompt, cache=get_response_cache(), use_cache=use_cache, stage=stage)
+    except Exception as e:
+        st.error(f"AI処理中にエラーが発生しました: {e}")
+
+def write_gemini_stream(prompt, stage=None):
+    """ストリーミング生成した本文をページに逐次表示し、完成したテキストを返す"""
+    chunks = get_gemini_response(prompt, stream=True, stage=stage)
+    if chunks is None:
+        return None
+    text = st.write_stream(chunks)
+    return text or None
 
 # --- Webスクレイピング機能 ---
 
-def scrape_and_extract_text(url):
-    """URLからHTMLを取得し、本文テキストのみを抽出する"""
+def get_scrape_cache():
+    """全セッション・バックグラウンドジョブで共有する取得済みページのキャッシュ"""
+    return core.get_scrape_cache()
+
+# 本文抽出エンジンの表示名
+EXTRACT_BACKEND_LABELS = {
+    "lxml": "高速（lxml・定型部分と重複を除去）",
+    "legacy": "従来（html.parser）",
+}
+
+# キャッシュの取得結果ごとの表示ラベル
+SCRAPE_CACHE_LABELS = {"hit": "キャッシュ", "revalidated": "キャッシュ（未変更を確認）", "miss": "新規取得"}
+
+def scrape_and_extract_text(url, force_refresh=False, backend=extractor.DEFAULT_BACKEND):
+    """URLからHTMLを取得し、本文テキストのみを抽出する（取得済みページはキャッシュを再利用）"""
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        
         st.info(f"🌐 URL: {url} のコンテンツを取得中です...")
         
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status() 
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        article_text = []
-        for tag in soup.find_all(['p', 'h1', 'h2', 'h3', 'li', 'span']): 
-            text = tag.get_text(strip=True)
-            if text and len(text) > 10: 
-                article_text.append(text)
-
-        full_text = '\n\n'.join(article_text)
+        page = core.scrape(url, backend=backend, force_refresh=force_refresh)
+        full_text = page["text"]
         
         if len(full_text) < 500:
             st.warning("⚠️ 取得した本文が非常に短いです。Webサイト側でスクレイピングがブロックされているか、記事形式ではない可能性があります。")
             
-        st.success(f"✅ コンテンツの取得が完了しました。文字数: {len(full_text)}字")
+        st.success(f"✅ コンテンツの取得が完了しました。文字数: {len(full_text)}字（{SCRAPE_CACHE_LABELS[page['cache']]}）")
         return full_text
 
-    except requests.exceptions.RequestException as e:
-        st.error(f"接続エラーまたはページ取得エラーが発生しました: {e}")
-        return None
     except Exception as e:
-        st.error(f"コンテンツ解析中に予期せぬエラーが発生しました: {e}")
+        if fetcher.is_request_error(e):
+            st.error(f"接続エラーまたはページ取得エラーが発生しました: {e}")
+        else:
+            st.error(f"コンテンツ解析中に予期せぬエラーが発生しました: {e}")
         return None
 
+def scrape_many(urls, force_refresh=False, backend=extractor.DEFAULT_BACKEND):
+    """複数URLを並列に取得し、URLごとの本文テキスト（またはエラー）を返す"""
+    return core.scrape_many(urls, backend=backend, force_refresh=force_refresh)
+
 # --- 4. メタ情報生成ロジック ---
 
 def generate_meta(article_body):
     """SEOメタ情報（タイトル、ディスクリプション）を生成する"""
     if not article_body: return
     
-    meta_prompt = f"""
-    あなたは広告コピーライターであり、SEOスペシャリストです。
-    以下の記事本文の内容に基づき、検索結果のクリック率（CTR）を最大化するためのSEOメタ情報をJSON形式で生成してください。
-    【ルール】1. meta_title: 30文字〜35文字に収め、クリック率を高めること。 2. meta_description: 100文字〜120文字に収め、具体的に示し、クリックを促すこと。
-    【記事本文抜粋】{article_body[:2000]}
-    【出力形式】 {{"meta_title": "生成されたSEOタイトル", "meta_description": "生成されたメタディスクリプション"}}
-    """
+    meta_prompt = pipeline.build_meta_prompt(article_body)
     
     with st.spinner("✨ クリック率を高めるメタ情報を生成中..."):
-        data = get_gemini_response(meta_prompt, json_mode=True)
+        data = get_gemini_response(meta_prompt, json_mode=True, stage="meta")
         if data:
             st.session_state.meta_data = data
             st.success("✅ メタ情報の生成が完了しました。")
@@ -191,53 +286,405 @@ def generate_meta(article_body):
 # --- 5. 記事チェックリストロジック ---
 
 def check_seo(article_body, keyword):
-    """生成された記事をSEOチェックリストで評価する"""
+    """生成された記事をSEOチェックリストで評価する
+
+    文字数やキーワード出現率などの数値項目はローカルで計算し、主観的な項目だけをAIに評価させます。
+    AIが利用できない場合も、ローカル分析の結果だけでチェックリストを表示します。
+    """
     if not article_body: return
     
-    check_prompt = f"""
-    あなたは厳格なSEO監査官です。以下の記事本文とターゲットキーワードに基づき、記事の改善点を指摘するチェックリストをJSON形式で生成してください。
-    【ターゲットキーワード】: {keyword}
-    【記事本文】: {article_body[:3000]}
-    【評価項目】以下の4つの項目について、改善の必要性を評価してください。
-    【出力形式】 {{ "seo_checklist": [ {{"item": "網羅性・深さ", "evaluation": "...", "status": "OK" / "要改善", "suggestion": "..."}}, ... ] }}
-    """
+    metrics, local_items = pipeline.local_seo_check(article_body, keyword, st.session_state.meta_data)
+    check_prompt = pipeline.build_check_prompt(article_body, keyword, seo_metrics.summarize(metrics))
     
     with st.spinner("🔍 記事のSEO監査（チェック）を実行中..."):
-        data = get_gemini_response(check_prompt, json_mode=True)
+        data = get_gemini_response(check_prompt, json_mode=True, stage="check")
+        st.session_state.seo_check = pipeline.merge_checklists(local_items, data)
         if data:
-            st.session_state.seo_check = data
             st.success("✅ SEOチェックが完了しました。")
+        else:
+            st.warning("⚠️ AIによる評価を取得できなかったため、ローカル分析の結果のみを表示しています。")
 
 # --- 6. 自動修正ロジック ---
 
-def revise_article(original_body, seo_check_data, keyword):
-    """SEOチェックリストの提案に基づき、記事本文を自動修正する"""
+def revise_article(original_body, seo_check_data, keyword, incremental=True):
+    """SEOチェックリストの提案に基づき、記事本文を自動修正する
+
+    incremental=True の場合は、指摘に該当するセクションだけを並列に書き直します。
+    """
     if not original_body or not seo_check_data:
         st.error("記事本文またはSEOチェックデータが不足しています。")
         return
 
-    improvements = []
-    for item in seo_check_data.get("seo_checklist", []):
-        if item.get("status") == "要改善":
-            improvements.append(f"- {item.get('item')}: {item.get('suggestion')}")
+    improvements = pipeline.collect_improvements(seo_check_data)
     
     if not improvements:
         st.success("🎉 AIによる修正の必要はありません。記事はすでに『OK』レベルです！")
         return
 
-    revision_prompt = f"""
-    あなたはプロのSEOライターです。
-    以下の「元の記事本文」を、[改善提案リスト]に記載されたすべての指摘を完璧に満たすように修正し、新しい記事本文（修正版）を生成してください。
-    【元の記事本文】 {original_body}
-    【改善提案リスト】 {'\n'.join(improvements)}
-    【ルール】1. 元の記事の構造を保ちながら、本文だけを修正。 2. 修正版の文字数は元の記事と大きく変わらないようにする。 3. プレーンテキスト形式で、修正後の記事本文のみを出力してください。
-    """
-    
-    with st.spinner("🔧 AIが改善提案に基づき、記事本文を自動修正中..."):
-        revised_text = get_gemini_response(revision_prompt)
-        if revised_text:
+    if not incremental and not pipeline.fits_full_revision(original_body):
+        st.info("ℹ️ 記事が長いため、全文ではなく改善提案に該当する箇所だけを修正します。")
+        incremental = True
+
+    if incremental:
+        if not api_key_valid: return
+        use_cache = not st.session_state.get("bypass_cache", False)
+        cache = get_response_cache()
+
+        def generate(prompt):
+            return llm.generate_text(prompt, cache=cache, use_cache=use_cache, stage="revise")
+
+        with st.spinner("🔧 AIが改善提案に該当する箇所だけを修正中..."):
+            try:
+                revised_text, changes = revision.revise_sections(
+                    original_body, pipeline.collect_improvement_items(seo_check_data), keyword, generate
+                )
+            except Exception as e:
+                st.error(f"AI処理中にエラーが発生しました: {e}")
+                return
+        if changes:
             st.session_state.revised_body = revised_text
-            st.success("✅ 記事の自動修正が完了しました。修正版をご確認ください。")
+            st.session_state.revision_changes = changes
+            st.success(f"✅ 記事の自動修正が完了しました（{len(changes)}箇所）。修正箇所の差分をご確認ください。")
+        return
+
+    revision_prompt = pipeline.build_revision_prompt(original_body, improvements)
+    
+    st.info("🔧 AIが改善提案に基づき、記事本文を自動修正中...（生成された文章から順に表示されます）")
+    revised_text = write_gemini_stream(revision_prompt, stage="revise")
+    if revised_text:
+        st.session_state.revised_body = revised_text
+        st.session_state.revision_changes = None
+        st.success("✅ 記事の自動修正が完了しました。修正版をご確認ください。")
+
+
+# --- 類似検索インデックス（作成済みの骨子の再利用・内部リンクの候補） ---
+
+def _digest(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def index_outline(outline_data, keyword):
+    """表示中の骨子を類似検索インデックスに登録する（内容が変わったときだけ）"""
+    digest = _digest(outline_data)
+    if st.session_state.indexed_outline == digest:
+        return
+    try:
+        core.index_outline(f"outline:{st.session_state.index_session_id}", outline_data, keyword)
+    except Exception as e:
+        st.caption(f"⚠️ 骨子を類似検索インデックスに登録できませんでした: {e}")
+    st.session_state.indexed_outline = digest
+
+
+def article_index_key():
+    """記事の登録に使うキー（診断モードでURLがあればURL、なければこのセッションのID）"""
+    url = st.session_state.get("diagnosis_url_input") if st.session_state.is_diagnosis_mode else None
+    return f"article:{url or st.session_state.index_session_id}"
+
+
+def index_article(article_body, keyword):
+    """表示中の記事本文を類似検索インデックスに登録する（本文が変わったときだけ）"""
+    digest = _digest([article_index_key(), article_body])
+    if st.session_state.indexed_article == digest:
+        return
+    title = (st.session_state.outline_data or {}).get("article_title_H1", "")
+    url = st.session_state.get("diagnosis_url_input", "") if st.session_state.is_diagnosis_mode else ""
+    try:
+        core.index_article(article_index_key(), article_body, title=title, keyword=keyword or "", url=url)
+    except Exception as e:
+        st.caption(f"⚠️ 記事を類似検索インデックスに登録できませんでした: {e}")
+    st.session_state.indexed_article = digest
+
+
+def render_covered_outlines(keyword):
+    """骨子を生成する前に、同じテーマで作成済みの骨子があれば表示して再利用できるようにする"""
+    try:
+        matches = core.find_covered_outlines(keyword, exclude_key=f"outline:{st.session_state.index_session_id}")
+    except Exception:
+        return
+    if not matches:
+        return
+    with st.expander(f"📚 このテーマで作成済みの骨子があります（{len(matches)}件）", expanded=True):
+        st.caption("再利用すると、AIを呼び出さずにこの骨子から始められます。")
+        for match in matches:
+            st.markdown(f"**{match['title'] or '（タイトルなし）'}**　🔑 {match['keyword'] or '-'}　類似度 {match['score']:.2f}")
+            if st.button("♻️ この骨子を再利用する", key=f"reuse_outline_{match['id']}"):
+                st.session_state.outline_data = match["payload"]
+                st.session_state.article_body = None
+                st.session_state.revised_body = None
+                st.session_state.meta_data = None
+                st.session_state.seo_check = None
+                st.session_state.revision_changes = None
+                # 同じ骨子をこのセッションの骨子として登録し直さない
+                st.session_state.indexed_outline = _digest(match["payload"])
+                st.rerun()
+
+
+def render_internal_links(article_body):
+    """最終本文の内部リンク先の候補（登録済みの記事のうち、内容が近いもの）"""
+    try:
+        links = core.suggest_internal_links(article_body, exclude_key=article_index_key())
+    except Exception as e:
+        st.caption(f"⚠️ 内部リンクの候補を検索できませんでした: {e}")
+        return
+    if not links:
+        return
+    with st.expander(f"🔗 内部リンクの候補（{len(links)}件）"):
+        for link in links:
+            target = f"[{link['title']}]({link['url']})" if link["url"] else f"**{link['title']}**"
+            st.markdown(f"- {target}　アンカーテキスト例: 「{link['anchor']}」　類似度 {link['score']:.2f}")
+
+
+# --- 複数URLの一括取得パネル（診断モード） ---
+
+@st.fragment
+def render_bulk_fetch_panel(force_refresh, extract_backend):
+    with st.expander("🌐 複数URLをまとめて取得する（競合分析用）"):
+        bulk_urls_text = st.text_area(
+            "取得したいURLを1行に1つずつ入力してください",
+            height=150,
+            key="bulk_urls_input"
+        )
+        if st.button("📥 まとめて取得する", key="bulk_fetch_btn"):
+            urls = [line.strip() for line in bulk_urls_text.splitlines() if line.strip()]
+            if not urls:
+                st.error("URLを1つ以上入力してください。")
+            else:
+                with st.spinner(f"🌐 {len(urls)}件のURLを並列に取得中..."):
+                    st.session_state.bulk_pages = scrape_many(urls, force_refresh=force_refresh, backend=extract_backend)
+
+        for page in st.session_state.get("bulk_pages") or []:
+            if page.get("error"):
+                st.error(f"❌ {page['url']}: {page['error']}")
+            else:
+                label = SCRAPE_CACHE_LABELS[page["cache"]]
+                with st.expander(f"✅ {page['url']}（{len(page['text'])}字 / {page['elapsed']:.1f}秒 / {label}）"):
+                    st.text(page["text"][:3000])
+
+
+# --- サイト全体のカニバリゼーション分析パネル（診断モード） ---
+
+SITE_AUDIT_REASON_LABELS = {"duplicate": "📑 近似重複", "cannibalization": "⚔️ キーワードの競合"}
+
+def render_site_audit_result(result):
+    """クラスターごとに、重複・競合しているページとSEOチェックの要改善項目を表示する"""
+    counts = result["counts"]
+    st.caption(
+        f"取得: {counts.get('fetched', 0)}件 / robots.txtで除外: {counts.get('robots', 0)}件 / "
+        f"エラー: {counts.get('errors', 0)}件 / 本文が短く対象外: {counts.get('too_short', 0)}件 / "
+        f"重複・競合: {counts.get('flagged', 0)}ページ"
+    )
+    if not result["clusters"]:
+        st.success("🎉 重複・競合しているページは見つかりませんでした。")
+    for cluster in result["clusters"]:
+        label = SITE_AUDIT_REASON_LABELS[cluster["reason"]]
+        with st.expander(
+            f"{label}「{cluster['keyword']}」（{len(cluster['pages'])}ページ / 類似度 {cluster['similarity']:.0%}）"
+        ):
+            st.caption(f"共通して狙っている語: {'、'.join(cluster['shared_terms'])}")
+            rows = []
+            for page in cluster["pages"]:
+                row = {"URL": page["url"], "タイトル": page["title"], "文字数": page["chars"]}
+                if "seo_check" in page:
+                    items = pipeline.collect_improvement_items(page["seo_check"])
+                    row["要改善の項目"] = "、".join(item["item"] for item in items) or "なし"
+                elif "seo_check_error" in page:
+                    row["要改善の項目"] = f"チェック失敗: {page['seo_check_error']}"
+                rows.append(row)
+            st.dataframe(rows, hide_index=True)
+    if result["errors"]:
+        with st.expander(f"❌ 取得できなかったページ（{len(result['errors'])}件）"):
+            for error in result["errors"]:
+                st.caption(f"{error['url']}: {error['error']}")
+
+@st.fragment
+def render_site_audit_panel(force_refresh, extract_backend):
+    with st.expander("🕸️ サイト全体の重複・カニバリゼーション分析"):
+        seed = st.text_input(
+            "sitemap.xml のURL、またはリンクをたどり始めるページのURL",
+            key="site_audit_seed"
+        )
+        max_pages = st.number_input(
+            "取得するページ数の上限", min_value=10, max_value=5000,
+            value=crawler.DEFAULT_MAX_PAGES, step=50, key="site_audit_max_pages"
+        )
+        check_pages = st.checkbox(
+            "重複・競合が見つかったページだけをAIでSEOチェックする",
+            key="site_audit_check",
+            help=f"チェックするのは最大{site_audit.DEFAULT_MAX_CHECKED_PAGES}ページです。"
+        )
+        if st.button("🕸️ サイトを分析する", key="site_audit_btn", disabled=job_running("audit")):
+            if not seed:
+                st.error("URLを入力してください。")
+            elif check_pages and not api_key_valid:
+                st.error("AIでチェックするにはAPIキーが必要です。")
+            elif use_background_jobs():
+                submit_job("audit", {
+                    "seed": seed,
+                    "max_pages": int(max_pages),
+                    "check_pages": check_pages,
+                    "force_refresh": force_refresh,
+                    "backend": extract_backend,
+                })
+            else:
+                progress = st.empty()
+                fetched = 0
+
+                def on_page(page):
+                    nonlocal fetched
+                    fetched += 1
+                    progress.caption(f"🌐 取得済み: {fetched}件（{page['url']}）")
+
+                use_cache = not st.session_state.get("bypass_cache", False)
+                with st.spinner("🕸️ サイトをクロールして、重複・競合しているページを探しています..."):
+                    try:
+                        st.session_state.site_audit = core.audit_site(
+                            seed, backend=extract_backend, max_pages=int(max_pages),
+                            force_refresh=force_refresh, check_pages=check_pages,
+                            generate=core.make_generate(use_cache=use_cache), on_page=on_page,
+                        )
+                    except Exception as e:
+                        st.error(f"サイトの分析中にエラーが発生しました: {e}")
+                progress.empty()
+
+        if st.session_state.get("site_audit"):
+            render_site_audit_result(st.session_state.site_audit)
+
+
+# --- バックグラウンドジョブ ---
+
+# ジョブの種類ごとの表示名
+JOB_LABELS = {
+    "outline": "🧠 骨子の生成",
+    "body": "✍️ 本文の執筆",
+    "meta": "✨ メタ情報の生成",
+    "check": "🔍 SEOチェック",
+    "revise": "🔧 自動修正",
+    "scrape": "🌐 ページの取得",
+    "audit": "🕸️ サイトの分析",
+}
+JOB_STATUS_LABELS = {"queued": "待機中", "running": "実行中"}
+
+@st.cache_resource
+def get_job_queue():
+    """全セッションで共有するジョブキュー
+
+    環境変数 SEO_STUDIO_EXTERNAL_WORKERS が設定されている場合は、
+    別プロセスのワーカー（python jobs.py）に処理を任せ、このプロセスではワーカーを起動しません。
+    """
+    queue = jobs.JobQueue(job_handlers.HANDLERS)
+    if not os.environ.get("SEO_STUDIO_EXTERNAL_WORKERS"):
+        queue.recover()
+        queue.start_workers()
+    return queue
+
+def use_background_jobs():
+    return st.session_state.get("use_background_jobs", True)
+
+def _sync_job_query_params():
+    """再読み込み後も同じジョブに再接続できるよう、実行中のジョブIDをURLに残す"""
+    if st.session_state.active_jobs:
+        st.query_params["jobs"] = ",".join(st.session_state.active_jobs)
+    elif "jobs" in st.query_params:
+        del st.query_params["jobs"]
+
+def submit_job(kind, params):
+    """ジョブを登録し、状況表示を始めるためページ全体を再実行する"""
+    if not api_key_valid and kind not in ("scrape", "audit"): return
+    params = dict(params, bypass_cache=st.session_state.get("bypass_cache", False))
+    job_id = get_job_queue().submit(kind, params)
+    st.session_state.active_jobs.append(job_id)
+    _sync_job_query_params()
+    st.rerun(scope="app")
+
+def job_running(kind):
+    """同じ種類のジョブが実行中かどうか（ボタンの二重押し防止用）"""
+    queue = get_job_queue()
+    return any((queue.get(job_id) or {}).get("kind") == kind for job_id in st.session_state.active_jobs)
+
+def apply_job_result(job):
+    """完了したジョブの結果をセッションステートに反映する"""
+    kind, params, result = job["kind"], job["params"], job["result"]
+    if kind == "outline":
+        reset_session()
+        st.session_state.outline_data = result
+    elif kind == "body":
+        st.session_state.article_body = result
+    elif kind == "meta":
+        st.session_state.meta_data = result
+    elif kind == "check":
+        st.session_state.seo_check = result
+        if result.get("ai_error"):
+            st.toast("⚠️ AIによる評価を取得できなかったため、ローカル分析の結果のみを表示しています。")
+    elif kind == "revise":
+        if result["revised_body"] != params["article_body"]:
+            st.session_state.revised_body = result["revised_body"]
+            st.session_state.revision_changes = result["changes"]
+    elif kind == "audit":
+        st.session_state.site_audit = result
+    elif kind == "scrape":
+        # 取得できた本文（不十分なら貼り付けた本文）でそのまま診断を続ける
+        article = result["text"]
+        if len(article) > 50:
+            st.session_state.pending_article_input = article
+        else:
+            st.toast("⚠️ URLからのコンテンツ取得に失敗したか、内容が不十分でした。貼り付けた本文を使用します。")
+            article = params.get("fallback_text") or ""
+        if len(article) > 50:
+            st.session_state.article_body = article
+            st.session_state.is_diagnosis_mode = True
+            job_id = get_job_queue().submit("check", {
+                "article_body": article,
+                "keyword": params["keyword"],
+                "bypass_cache": params.get("bypass_cache", False),
+            })
+            st.session_state.active_jobs.append(job_id)
+        else:
+            st.toast("❌ 診断できるほどの十分な長さの本文が取得できませんでした。")
+
+@st.fragment(run_every=1.0)
+def render_job_monitor():
+    """実行中のジョブの状況を定期的に確認し、終わったものから結果を反映する"""
+    queue = get_job_queue()
+    finished = False
+    st.markdown("#### ⏳ バックグラウンド処理")
+    for job_id in list(st.session_state.active_jobs):
+        job = queue.get(job_id)
+        if job is None:
+            st.session_state.active_jobs.remove(job_id)
+            finished = True
+            continue
+        label = JOB_LABELS.get(job["kind"], job["kind"])
+        if job["status"] in jobs.FINISHED_STATUSES:
+            st.session_state.active_jobs.remove(job_id)
+            finished = True
+            if job["status"] == "done":
+                apply_job_result(job)
+                st.toast(f"✅ {label}が完了しました。")
+            elif job["status"] == "failed":
+                st.toast(f"❌ {label}中にエラーが発生しました: {job['error']}")
+            else:
+                st.toast(f"⏹️ {label}をキャンセルしました。")
+            continue
+
+        elapsed = time.time() - (job["started_at"] or job["created_at"])
+        status = "キャンセル中" if job["cancel_requested"] else JOB_STATUS_LABELS[job["status"]]
+        st.caption(f"{label}: {status}（{elapsed:.0f}秒）")
+        if st.button("⏹️ キャンセル", key=f"cancel_job_{job_id}", disabled=job["cancel_requested"]):
+            queue.cancel(job_id)
+
+    if finished:
+        _sync_job_query_params()
+        st.rerun(scope="app")
+
+with st.sidebar:
+    st.toggle(
+        "⏳ AI処理をバックグラウンドで実行する",
+        value=True,
+        key="use_background_jobs",
+        help="オンにすると、処理中も画面を操作でき、ページを再読み込みしても結果を受け取れます。オフにすると生成中の文章を逐次表示します。"
+    )
+    if st.session_state.active_jobs:
+        render_job_monitor()
 
 
 # =================================================================
@@ -256,20 +703,17 @@ if mode == '🚀 記事ゼロイチ生成（新規作成）':
 
     def generate_outline_logic(keyword, intent, num_h2):
         if not api_key_valid: return
-        system_prompt = f"""
-        あなたはプロのSEOコンテンツストラテジストであり、人気ブログの編集長です。
-        ユーザーが指定したキーワードと検索意図に基づき、SEOで上位表示を目指すための、論理的で網羅性の高い記事の骨子（アウトライン）をJSON形式で生成してください。
-        ... (プロンプトは簡略化しています) ...
-        """
+        system_prompt = pipeline.build_outline_prompt(keyword, intent, num_h2)
 
         with st.spinner("🧠 検索意図と競合を分析し、最適な骨子を設計中..."):
-            data = get_gemini_response(system_prompt, json_mode=True)
+            data = get_gemini_response(system_prompt, json_mode=True, stage="outline")
             if data:
                 st.session_state.outline_data = data
                 st.session_state.article_body = None
                 st.session_state.revised_body = None
                 st.session_state.meta_data = None
                 st.session_state.seo_check = None
+                st.session_state.revision_changes = None
                 st.success("✅ 記事の骨子（アウトライン）が正常に生成されました。")
     
     # --- UIとボタン配置（新規作成） ---
@@ -279,30 +723,74 @@ if mode == '🚀 記事ゼロイチ生成（新規作成）':
     intent = st.selectbox("🎯 ユーザーの検索意図を選択してください", options=["ステップバイステップで、今日から始められる具体的な手順を知りたい", "失敗しないための注意点を知りたい"], key="gen_intent")
     num_h2 = st.slider("🔢 生成する主要セクション（H2）の数", min_value=5, max_value=10, value=7, key="gen_num_h2")
 
-    if st.button("🚀 ステップ1: SEO骨子を生成する"):
-        generate_outline_logic(keyword, intent, num_h2)
+    render_covered_outlines(keyword)
+
+    if st.button("🚀 ステップ1: SEO骨子を生成する", disabled=job_running("outline")):
+        if use_background_jobs():
+            submit_job("outline", {"keyword": keyword, "intent": intent, "num_h2": num_h2})
+        else:
+            generate_outline_logic(keyword, intent, num_h2)
 
     # ... (骨子の表示コード - 変更なし) ...
     if st.session_state.outline_data:
         data = st.session_state.outline_data
+        index_outline(data, keyword)
         st.markdown("---")
         st.header("✅ 生成された記事骨子")
         st.subheader(f"🥇 H1タイトル: {data.get('article_title_H1', 'タイトルエラー')}")
         
         # 本文生成ロジック
         def generate_body_logic():
-            outline_text = json.dumps(st.session_state.outline_data, ensure_ascii=False, indent=2)
-            body_prompt = f"""
-            あなたはプロのSEOライターです。以下の骨子に厳密に従い、SEOに最適化された記事の本文を生成してください。
-            【ライティングルール】1. **合計約2000字**になるように記述。 2. H2/H3タグは**出力せず**、本文のみ記述。
-            【記事骨子】{outline_text}
-            """
-            with st.spinner("✍️ 記事本文を執筆中..."):
-                st.session_state.article_body = get_gemini_response(body_prompt)
+            body_prompt = pipeline.build_body_prompt(st.session_state.outline_data)
+            st.info("✍️ 記事本文を執筆中...（生成された文章から順に表示されます）")
+            body = write_gemini_stream(body_prompt, stage="body")
+            if body:
+                st.session_state.article_body = body
                 st.success("✅ 記事本文の生成が完了しました！")
-                
-        if st.button("📝 ステップ2: この骨子で記事本文を生成する", key="gen_body_btn"):
-            generate_body_logic()
+
+        # セクション並列生成: H2ごとに同時にリクエストし、骨子の順番で結合する
+        def generate_body_parallel_logic():
+            if not api_key_valid: return
+            use_cache = not st.session_state.get("bypass_cache", False)
+            cache = get_response_cache()
+
+            def generate(prompt):
+                return llm.generate_text(prompt, cache=cache, use_cache=use_cache, stage="body")
+
+            progress = st.progress(0.0, text="✍️ セクションごとに記事本文を並列執筆中...")
+            try:
+                body = generate_sections_parallel(
+                    st.session_state.outline_data,
+                    generate,
+                    on_section_done=lambda done, total: progress.progress(
+                        done / total, text=f"✍️ セクションを並列執筆中... ({done}/{total})"
+                    ),
+                )
+            except Exception as e:
+                st.error(f"AI処理中にエラーが発生しました: {e}")
+                return
+            finally:
+                progress.empty()
+            st.session_state.article_body = body
+            st.success("✅ 記事本文の生成が完了しました！")
+
+        body_engine = st.radio(
+            "⚙️ 本文の生成方式",
+            ("一括生成（ストリーミング表示）", "セクション並列生成（高速）"),
+            key="gen_body_engine",
+            horizontal=True
+        )
+
+        if st.button("📝 ステップ2: この骨子で記事本文を生成する", key="gen_body_btn", disabled=job_running("body")):
+            if use_background_jobs():
+                submit_job("body", {
+                    "outline_data": st.session_state.outline_data,
+                    "parallel": body_engine == "セクション並列生成（高速）",
+                })
+            elif body_engine == "セクション並列生成（高速）":
+                generate_body_parallel_logic()
+            else:
+                generate_body_logic()
         
         # ... (H2/H3の表示 - 簡略化) ...
 
@@ -312,7 +800,6 @@ if mode == '🚀 記事ゼロイチ生成（新規作成）':
 # =================================================================
 
 elif mode == '🔍 既存コンテンツ診断（添削）':
-    reset_session()
     st.session_state.is_diagnosis_mode = True
     
     st.header("🔍 既存記事のSEO診断・添削")
@@ -322,28 +809,63 @@ elif mode == '🔍 既存コンテンツ診断（添削）':
         key="diagnosis_url_input"
     ) 
     
+    st.checkbox(
+        "🔄 キャッシュを使わずにページを取得し直す（記事を更新した直後など）",
+        key="force_refresh"
+    )
+
+    extract_backend = st.selectbox(
+        "🧩 本文の抽出エンジン",
+        options=extractor.BACKENDS,
+        format_func=lambda name: EXTRACT_BACKEND_LABELS[name],
+        key="extract_backend"
+    )
+
     diagnosis_keyword = st.text_input(
         "🔑 この記事のターゲットキーワードは何ですか？",
         key="diagnosis_keyword_input"
     )
 
+    # URLから取得した本文は、次の再実行でウィジェットを作る前に貼り付け欄へ反映する
+    if st.session_state.get("pending_article_input") is not None:
+        st.session_state.existing_article_input = st.session_state.pop("pending_article_input")
+
     existing_article = st.text_area(
         "または、URLから取得できない場合に備え、直接本文を貼り付けられます。",
         height=300,
         key="existing_article_input"
     )
     
-    if st.button("🔬 AIによるSEO診断を開始する"):
+    # 競合上位ページなど、複数URLをまとめて取得する（この欄の操作ではページ全体を再実行しない）
+    render_bulk_fetch_panel(st.session_state.force_refresh, extract_backend)
+    # サイト全体をクロールし、重複・競合しているページのクラスターだけをSEOチェックする
+    render_site_audit_panel(st.session_state.force_refresh, extract_backend)
+
+    if st.button("🔬 AIによるSEO診断を開始する", disabled=job_running("scrape") or job_running("check")):
         if not diagnosis_keyword:
             st.error("ターゲットキーワードが必要です。")
+        elif use_background_jobs() and diagnosis_url:
+            # 取得が終わると、続けてSEOチェックのジョブが登録される
+            submit_job("scrape", {
+                "url": diagnosis_url,
+                "keyword": diagnosis_keyword,
+                "fallback_text": existing_article,
+                "force_refresh": st.session_state.force_refresh,
+                "backend": extract_backend,
+            })
+        elif use_background_jobs() and existing_article and len(existing_article) > 50:
+            st.session_state.article_body = existing_article
+            submit_job("check", {"article_body": existing_article, "keyword": diagnosis_keyword})
         else:
             article_to_diagnose = ""
             
             if diagnosis_url:
-                scraped_text = scrape_and_extract_text(diagnosis_url)
+                scraped_text = scrape_and_extract_text(
+                    diagnosis_url, force_refresh=st.session_state.force_refresh, backend=extract_backend
+                )
                 if scraped_text and len(scraped_text) > 50:
                     article_to_diagnose = scraped_text
-                    st.session_state.existing_article_input = scraped_text
+                    st.session_state.pending_article_input = scraped_text
                 else:
                     st.warning("URLからのコンテンツ取得に失敗したか、内容が不十分でした。貼り付けた本文を使用します。")
                     article_to_diagnose = existing_article
@@ -365,65 +887,84 @@ elif mode == '🔍 既存コンテンツ診断（添削）':
 #                         共通の結果表示エリア
 # =================================================================
 
-current_body = st.session_state.revised_body if st.session_state.revised_body else st.session_state.article_body
-
-if current_body:
-    
-    target_keyword = st.session_state.get('gen_keyword') if not st.session_state.is_diagnosis_mode else st.session_state.get('diagnosis_keyword_input')
-
-    st.markdown("---")
-    st.header("📝 ステップ3: 最終チェックと修正")
-    
-    # 広告枠 2: 中間広告の配置（静的HTML使用）
-    st.markdown("---")
-    st.subheader("💡 記事改善提案の間に広告表示 💡")
-
-    if AD_CODE_MIDDLE_HTML and AD_CODE_MIDDLE_HTML.strip():
-        try:
-            # st.markdown で静的HTMLをレンダリング
-            st.markdown(
-                AD_CODE_MIDDLE_HTML,
-                unsafe_allow_html=True
-            )
-        except Exception:
-            st.warning("🚨 中間広告のレンダリング中にエラーが発生しましたが、アプリは継続します。")
-    else:
-        st.info("💡 広告コード（中間）が設定されていません。")
-    st.markdown("---")
-    
-    # 7. メタ情報生成とチェックリスト実行ボタン
-    col1, col2 = st.columns([1, 1])
-    with col1:
-        if st.button("✨ メタ情報を生成/チェックする", key="meta_check_btn"):
-            generate_meta(current_body)
-    with col2:
-        if st.button("🔍 SEOチェックリストで評価する", key="check_seo_btn"):
+# 7-8. SEOチェックリストの実行・表示と自動修正
+@st.fragment
+def render_seo_check_panel(current_body, target_keyword):
+    if st.button("🔍 SEOチェックリストで評価する", key="check_seo_btn", disabled=job_running("check")):
+        if use_background_jobs():
+            submit_job("check", {
+                "article_body": current_body,
+                "keyword": target_keyword,
+                "meta_data": st.session_state.meta_data,
+            })
+        else:
             check_seo(current_body, target_keyword)
 
-    # 8. SEOチェックリストの表示
     if st.session_state.seo_check and st.session_state.seo_check.get("seo_checklist"):
         st.markdown("#### 📋 AIによるSEO改善提案")
         check_list = st.session_state.seo_check["seo_checklist"]
+
+        for item in check_list:
+            icon = "✅" if item.get('status') == "OK" else "🔴"
+            source = "📏 自動計測" if item.get('source') == "local" else "🤖 AI評価"
+            st.markdown(f"{icon} **{item.get('item')}**（{source}）: {item.get('evaluation', '')}")
+            if item.get('status') != "OK" and item.get('suggestion'):
+                st.caption(f"💡 {item.get('suggestion')}")
         
-        is_revised_needed = any(item.get('status') == "要改善" for item in check_list)
+        is_revised_needed = bool(pipeline.collect_improvements(st.session_state.seo_check))
 
         if is_revised_needed:
             st.warning("🔴 要改善の指摘があります。自動修正を試してください。")
-            if st.button("🔧 AIによる自動修正を実行する", key="auto_revise_btn"):
-                revise_article(current_body, st.session_state.seo_check, target_keyword)
+            revise_mode = st.radio(
+                "🔧 修正方式",
+                ("該当箇所だけを修正（高速）", "全文を書き直す"),
+                key="revise_mode",
+                horizontal=True
+            )
+            if st.button("🔧 AIによる自動修正を実行する", key="auto_revise_btn", disabled=job_running("revise")):
+                if use_background_jobs():
+                    submit_job("revise", {
+                        "article_body": current_body,
+                        "seo_check": st.session_state.seo_check,
+                        "keyword": target_keyword,
+                        "incremental": revise_mode == "該当箇所だけを修正（高速）",
+                    })
+                else:
+                    previous_body = st.session_state.revised_body
+                    revise_article(
+                        current_body, st.session_state.seo_check, target_keyword,
+                        incremental=revise_mode == "該当箇所だけを修正（高速）"
+                    )
+                    if st.session_state.revised_body != previous_body:
+                        # 最終本文と差分の表示を更新するため、ページ全体を再実行する
+                        st.toast("✅ 修正版を最終記事本文に反映しました。")
+                        st.rerun(scope="app")
         else:
             st.success("🎉 SEO上の大きな改善点は見つかりませんでした！")
 
-    # 9. メタ情報の表示
+# 9. メタ情報の生成・表示
+@st.fragment
+def render_meta_panel(current_body):
+    if st.button("✨ メタ情報を生成/チェックする", key="meta_check_btn", disabled=job_running("meta")):
+        if use_background_jobs():
+            submit_job("meta", {"article_body": current_body})
+        else:
+            previous_meta = st.session_state.meta_data
+            generate_meta(current_body)
+            if st.session_state.meta_data != previous_meta:
+                # ダウンロード内容にメタ情報を反映するため、ページ全体を再実行する
+                st.toast("✅ メタ情報をダウンロード内容に反映しました。")
+                st.rerun(scope="app")
+
     if st.session_state.meta_data:
         st.markdown("#### 📧 メタ情報 (検索結果で表示される部分)")
         meta = st.session_state.meta_data
         st.info(f"**SEOタイトル**: {meta.get('meta_title', 'N/A')} (目安: 30-35文字)")
         st.warning(f"**メタディスクリプション**: {meta.get('meta_description', 'N/A')} (目安: 100-120文字)")
-    
-    # 10. 本文コピペエリア (修正版優先)
-    final_body_to_display = st.session_state.revised_body if st.session_state.revised_body else st.session_state.article_body
 
+# 10-11. 本文コピペエリアとダウンロード（本文の編集やダウンロードでページ全体を再実行しない）
+@st.fragment
+def render_final_body_panel(final_body_to_display):
     st.markdown("### ✍️ 最終記事本文 (コピペ用)")
     st.text_area(
         "📝 ブログに貼り付け可能な本文", 
@@ -432,17 +973,9 @@ if current_body:
         key="final_body_output"
     )
 
-    # 11. ダウンロードボタン
-    
-    download_content = f"## SEOレポート\n\n"
-    if st.session_state.meta_data:
-        download_content += f"\n"
-        download_content += f"\n\n"
-    
-    if st.session_state.outline_data:
-        download_content += f"# {st.session_state.outline_data.get('article_title_H1')}\n\n"
-        
-    download_content += final_body_to_display
+    download_content = pipeline.build_markdown_report(
+        st.session_state.outline_data, st.session_state.meta_data, final_body_to_display
+    )
     
     st.download_button(
         label="📥 Markdownファイルとしてダウンロード",
@@ -450,5 +983,49 @@ if current_body:
         file_name=f"seo_article_final.md",
         mime="text/markdown"
     )
+
+    render_internal_links(final_body_to_display)
     
     st.success("🎉 全てのSEOタスクが完了しました！")
+
+# 10. 本文 (修正版優先)
+current_body = st.session_state.revised_body if st.session_state.revised_body else st.session_state.article_body
+
+if current_body:
+    
+    target_keyword = st.session_state.get('gen_keyword') if not st.session_state.is_diagnosis_mode else st.session_state.get('diagnosis_keyword_input')
+
+    st.markdown("---")
+    st.header("📝 ステップ3: 最終チェックと修正")
+    
+    # 広告枠 2: 中間広告の配置（静的HTML使用）
+    st.markdown("---")
+    st.subheader("💡 記事改善提案の間に広告表示 💡")
+
+    if AD_CODE_MIDDLE_HTML and AD_CODE_MIDDLE_HTML.strip():
+        try:
+            # st.markdown で静的HTMLをレンダリング
+            st.markdown(
+                AD_CODE_MIDDLE_HTML,
+                unsafe_allow_html=True
+            )
+        except Exception:
+            st.warning("🚨 中間広告のレンダリング中にエラーが発生しましたが、アプリは継続します。")
+    else:
+        st.info("💡 広告コード（中間）が設定されていません。")
+    st.markdown("---")
+    
+    # ステップ3の各パネルはフラグメントとして分け、ボタン操作ではそのパネルだけを再実行する。
+    # 本文やメタ情報が変わり、他のパネルの表示に影響する場合だけページ全体を再実行する。
+    render_seo_check_panel(current_body, target_keyword)
+    render_meta_panel(current_body)
+
+    # 修正箇所の差分（部分修正の場合）
+    if st.session_state.revised_body and st.session_state.revision_changes:
+        with st.expander(f"🔍 修正箇所の差分（{len(st.session_state.revision_changes)}箇所）"):
+            for change in st.session_state.revision_changes:
+                st.caption(f"セクション{change['index'] + 1}: {'、'.join(change['items'])}")
+            st.code(revision.format_diff(st.session_state.revision_changes), language="diff")
+
+    index_article(current_body, target_keyword)
+    render_final_body_panel(current_body)
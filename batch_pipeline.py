@@ -0,0 +1,185 @@
+"""キーワード一括処理（バッチモード）
+
+CSV（keyword,intent[,num_h2] 列）またはJSONL（同名キー）のキーワード一覧を読み込み、
+骨子 → 本文 → メタ情報 → SEOチェック → 自動修正 をキーワードごとに並列実行します。
+
+- API呼び出しはトークンバケットでクォータ内（--rpm）に抑えます。
+- ステージが終わるたびに結果をチェックポイントとして保存するため、
+  途中で落ちても再実行すれば完了済みのステージは飛ばして再開します。
+- 完了したキーワードから順に <出力先>/<slug>.md と summary.jsonl に書き出します
+  （再実行したときに、前回までに完了していたキーワードは summary.jsonl に書き足しません）。
+
+使い方:
+    GEMINI_API_KEY=... python batch_pipeline.py keywords.csv -o output --rpm 15 --workers 4
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import core
+import pipeline
+import telemetry
+from rate_limit import TokenBucket
+
+DEFAULT_INTENT = "ステップバイステップで、今日から始められる具体的な手順を知りたい"
+DEFAULT_NUM_H2 = 7
+
+
+def load_jobs(path):
+    """CSVまたはJSONLからキーワード一覧を読み込む"""
+    with open(path, encoding="utf-8-sig") as f:
+        if path.endswith(".jsonl"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    jobs = []
+    for row in rows:
+        keyword = (row.get("keyword") or "").strip()
+        if not keyword:
+            continue
+        jobs.append({
+            "keyword": keyword,
+            "intent": (row.get("intent") or "").strip() or DEFAULT_INTENT,
+            "num_h2": int(row.get("num_h2") or DEFAULT_NUM_H2),
+        })
+    return jobs
+
+
+def job_slug(job):
+    """ファイル名に使えるキーワードごとの識別子"""
+    digest = hashlib.sha1(f"{job['keyword']}\n{job['intent']}".encode("utf-8")).hexdigest()[:8]
+    name = re.sub(r'[\\/:*?"<>|\s]+', "_", job["keyword"]).strip("_")[:40]
+    return f"{name}_{digest}"
+
+
+class Checkpoint:
+    """キーワード1件分のステージ結果をJSONファイルに保存する"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.data = json.load(f)
+
+    def save(self, stage, value):
+        self.data[stage] = value
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        # 書き込み途中で落ちても壊れたファイルが残らないよう、置き換えで保存する
+        os.replace(tmp_path, self.path)
+
+
+def run_job(job, out_dir, generate):
+    """1キーワード分のパイプラインを実行し、サマリー用の辞書を返す"""
+    slug = job_slug(job)
+    checkpoint = Checkpoint(os.path.join(out_dir, ".checkpoints", f"{slug}.json"))
+    data = checkpoint.data
+    started = time.monotonic()
+    resumed = [stage for stage in pipeline.STAGES if stage in data]
+    restored = len(resumed) == len(pipeline.STAGES)
+
+    steps = {
+        "outline": lambda: pipeline.generate_outline(job["keyword"], job["intent"], job["num_h2"], generate),
+        "body": lambda: pipeline.generate_body(data["outline"], generate),
+        "meta": lambda: pipeline.generate_meta(data["body"], generate),
+        "check": lambda: pipeline.check_seo(data["body"], job["keyword"], generate, data["meta"]),
+        "revise": lambda: pipeline.revise_article(data["body"], data["check"], generate, job["keyword"]),
+    }
+    for stage in pipeline.STAGES:
+        if stage not in data:
+            with telemetry.stage(stage):
+                checkpoint.save(stage, steps[stage]())
+
+    markdown_path = os.path.join(out_dir, f"{slug}.md")
+    with open(markdown_path, "w", encoding="utf-8") as f:
+        f.write(pipeline.build_markdown_report(data["outline"], data["meta"], data["revise"]))
+
+    needs_revision = bool(pipeline.collect_improvements(data["check"]))
+    return {
+        "keyword": job["keyword"],
+        "status": "done",
+        "file": markdown_path,
+        "meta_title": data["meta"].get("meta_title"),
+        "revised": needs_revision,
+        "chars": len(data["revise"]),
+        "resumed_stages": resumed,
+        "restored": restored,   # 前回までにすべてのステージが完了していた
+        "seconds": round(time.monotonic() - started, 2),
+    }
+
+
+def run_batch(jobs, out_dir, generate, max_workers=4, on_result=None):
+    """全キーワードを並列処理し、完了した順に on_result(summary) を呼ぶ
+
+    キーワードと検索意図が同じ行は同じチェックポイントを使うため、最初の1件だけを処理します。
+    """
+    os.makedirs(os.path.join(out_dir, ".checkpoints"), exist_ok=True)
+    summary_path = os.path.join(out_dir, "summary.jsonl")
+    summary_lock = threading.Lock()
+    results = []
+    # 同じチェックポイントに別々のスレッドから書き込まないよう、先に重複をまとめる
+    unique_jobs = {}
+    for job in jobs:
+        unique_jobs.setdefault(job_slug(job), job)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(run_job, job, out_dir, generate): job for job in unique_jobs.values()}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"keyword": job["keyword"], "status": "error", "error": str(e)}
+            if not result.get("restored"):
+                with summary_lock, open(summary_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(result, ensure_ascii=False) + "\n")
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="キーワード一覧から記事を一括生成します。")
+    parser.add_argument("input", help="keyword,intent 列を持つCSV、または同名キーのJSONL")
+    parser.add_argument("-o", "--out-dir", default="batch_output", help="出力先ディレクトリ")
+    parser.add_argument("--workers", type=int, default=4, help="同時に処理するキーワード数")
+    parser.add_argument("--rpm", type=float, default=15, help="1分あたりの最大リクエスト数（Geminiのクォータに合わせる）")
+    parser.add_argument("--burst", type=int, default=None, help="連続して送れる最大リクエスト数")
+    parser.add_argument("--no-cache", action="store_true", help="応答キャッシュを使わない")
+    args = parser.parse_args(argv)
+
+    if not core.configure_from_env():
+        parser.error("環境変数 GEMINI_API_KEY を設定してください。")
+
+    jobs = load_jobs(args.input)
+    # キャッシュヒットはクォータを消費しないので、実際に送信するときだけバケットを通す
+    bucket = TokenBucket(args.rpm, args.burst)
+    generate = core.make_generate(use_cache=not args.no_cache, before_request=bucket.acquire)
+
+    def report(result):
+        mark = "✅" if result["status"] == "done" else "❌"
+        detail = result.get("file") or result.get("error")
+        if result.get("restored"):
+            detail += "（前回までに完了済み）"
+        print(f"{mark} {result['keyword']}: {detail}", flush=True)
+
+    results = run_batch(jobs, args.out_dir, generate, max_workers=args.workers, on_result=report)
+    failed = sum(1 for r in results if r["status"] != "done")
+    print(f"完了: {len(results) - failed}件 / 失敗: {failed}件")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+"""オフラインのエンドツーエンド・ベンチマーク（APIキー・インターネット接続不要）
+
+偽のGeminiバックエンド（fake_gemini.py）とHTMLフィクスチャを配信するローカルサーバー
+（fixture_server.py）を使い、実際のパイプライン（core / batch_pipeline）を次のシナリオで実行します。
+
+- single_article:      骨子 → 本文 → メタ情報 → SEOチェック → 修正 を1記事ずつ
+- diagnosis:           URLの取得・本文抽出 → SEOチェック
+- bulk:                キーワード一覧のバッチ処理（batch_pipeline.run_batch）と複数URLの一括取得
+- concurrent_sessions: 複数セッションが同時に記事を生成する
+
+シナリオごとに別プロセスで実行し、スループット、所要時間のパーセンタイル、ピークRSSを測ります。
+結果はJSONで保存されるので、--compare で以前の結果と比べると性能の劣化が分かります。
+
+使い方:
+    python bench/bench_e2e.py [--scenarios single_article,diagnosis] [--latency 0.05] [--error-rate 0.02]
+    python bench/bench_e2e.py --compare bench/results/<前回の結果>.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+DEFAULT_OUTPUT_DIR = os.path.join(BENCH_DIR, "results")
+
+SCENARIOS = ("single_article", "diagnosis", "bulk", "concurrent_sessions")
+KEYWORD = "初心者向け アフィリエイト 始め方"
+
+
+def _max_rss_mb():
+    # Linuxでは KB、macOSでは bytes 単位
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _timed(func):
+    """func() を実行して (所要時間ms, エラーの有無) を返す"""
+    started = time.perf_counter()
+    try:
+        error = bool(func())
+    except Exception:
+        error = True
+    return (time.perf_counter() - started) * 1000, error
+
+
+# --- シナリオ（子プロセスの中で実行される） ---
+
+def _write_article(core, index, parallel):
+    """1記事分のパイプラインを実行し、AIの評価が取れなかった場合はTrueを返す"""
+    generate = core.make_generate(use_cache=False)
+    outline = core.outline(f"{KEYWORD} {index}", "具体的な手順を知りたい", 5, generate=generate)
+    body = core.body(outline, parallel=parallel, generate=generate)
+    meta = core.meta(body, generate=generate)
+    check = core.check(body, KEYWORD, meta, generate=generate)
+    core.revise(body, check, KEYWORD, generate=generate)
+    return "ai_error" in check
+
+
+def scenario_single_article(options, base_url):
+    import core
+    return [_timed(lambda i=i: _write_article(core, i, options["parallel"])) for i in range(options["iterations"])]
+
+
+def scenario_diagnosis(options, base_url):
+    import core
+    import fixture_server
+
+    names = sorted(fixture_server.load_fixtures())
+
+    def diagnose(i):
+        page = core.scrape(f"{base_url}/v/{i}/{names[i % len(names)]}")
+        check = core.check(page["text"], KEYWORD, generate=core.make_generate(use_cache=False))
+        return "ai_error" in check
+
+    return [_timed(lambda i=i: diagnose(i)) for i in range(options["iterations"])]
+
+
+def scenario_bulk(options, base_url):
+    import batch_pipeline
+    import core
+    import fixture_server
+
+    jobs = [{"keyword": f"{KEYWORD} {i}", "intent": "具体的な手順を知りたい", "num_h2": 5}
+            for i in range(options["iterations"])]
+    with tempfile.TemporaryDirectory() as out_dir:
+        results = batch_pipeline.run_batch(
+            jobs, out_dir, core.make_generate(use_cache=False), max_workers=options["workers"]
+        )
+    samples = [(r.get("seconds", 0) * 1000, r["status"] != "done") for r in results]
+
+    # 同じ件数のURLを一括取得する（URLごとの所要時間は取得結果の elapsed）
+    names = sorted(fixture_server.load_fixtures())
+    urls = [f"{base_url}/v/{i}/{names[i % len(names)]}" for i in range(options["iterations"] * 4)]
+    for page in core.scrape_many(urls):
+        samples.append((page.get("elapsed", 0) * 1000, "error" in page))
+    return samples
+
+
+def scenario_concurrent_sessions(options, base_url):
+    import core
+
+    def session(session_index):
+        return [_timed(lambda i=i: _write_article(core, f"{session_index}-{i}", options["parallel"]))
+                for i in range(options["iterations"])]
+
+    with ThreadPoolExecutor(max_workers=options["sessions"]) as executor:
+        return [sample for samples in executor.map(session, range(options["sessions"])) for sample in samples]
+
+
+_SCENARIO_FUNCS = {
+    "single_article": scenario_single_article,
+    "diagnosis": scenario_diagnosis,
+    "bulk": scenario_bulk,
+    "concurrent_sessions": scenario_concurrent_sessions,
+}
+
+
+def _run_scenario(name, options, queue):
+    """子プロセスの入口: 一時ディレクトリのキャッシュで1シナリオを実行して結果をキューに入れる"""
+    try:
+        queue.put(_measure_scenario(name, options))
+    except Exception:
+        # 親プロセスが結果を待ち続けないよう、失敗も結果として返す
+        queue.put({"failed": traceback.format_exc()})
+
+
+def _measure_scenario(name, options):
+    work_dir = tempfile.mkdtemp(prefix="seo-bench-")
+    # 各モジュールは読み込み時に保存先を決めるので、import より前に設定する
+    os.environ["SEO_STUDIO_CACHE_PATH"] = os.path.join(work_dir, "responses.sqlite3")
+    os.environ["SEO_STUDIO_SCRAPE_CACHE_PATH"] = os.path.join(work_dir, "pages.sqlite3")
+    os.environ["SEO_STUDIO_JOBS_PATH"] = os.path.join(work_dir, "jobs.sqlite3")
+    os.environ["SEO_STUDIO_TELEMETRY_PATH"] = os.path.join(work_dir, "telemetry.jsonl")
+    sys.path[:0] = [REPO_DIR, BENCH_DIR]
+
+    import fake_gemini
+    import fixture_server
+    import llm
+    import telemetry
+
+    backend = fake_gemini.install(fake_gemini.FakeConfig(
+        latency=options["latency"],
+        seconds_per_1k_chars=options["seconds_per_1k_chars"],
+        non_json_rate=options["non_json_rate"],
+        error_rate=options["error_rate"],
+        max_concurrency=options["max_concurrency"],
+        seed=options["seed"],
+    ))
+    baseline_rss = _max_rss_mb()
+    with fixture_server.serve(delay=options["fetch_delay"]) as base_url:
+        started = time.perf_counter()
+        samples = _SCENARIO_FUNCS[name](options, base_url)
+        seconds = time.perf_counter() - started
+
+    durations = sorted(ms for ms, _ in samples)
+    return {
+        "operations": len(samples),
+        "errors": sum(1 for _, error in samples if error),
+        "seconds": round(seconds, 3),
+        "throughput_per_sec": round(len(samples) / seconds, 3) if seconds else 0.0,
+        "latency_ms": {
+            f"p{int(q * 100)}": round(telemetry.percentile(durations, q), 2) for q in (0.5, 0.95, 0.99)
+        },
+        "peak_rss_mb": round(_max_rss_mb(), 1),
+        "peak_rss_delta_mb": round(_max_rss_mb() - baseline_rss, 1),
+        "backend": backend.stats(),
+        "flow_control": llm.flow_control_stats(),
+        "stages": telemetry.summarize(telemetry.load_records()),
+    }
+
+
+# --- 実行・保存・比較 ---
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current):
+    """前回の結果と比べた、スループットとp95の変化（%）の表を文字列で返す"""
+    lines = [f"{'scenario':<20} {'throughput':>12} {'p95':>10}"]
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        throughput = _change(before["throughput_per_sec"], result["throughput_per_sec"])
+        p95 = _change(before["latency_ms"]["p95"], result["latency_ms"]["p95"])
+        lines.append(f"{name:<20} {throughput:>12} {p95:>10}")
+    return "\n".join(lines)
+
+
+def _change(before, after):
+    if not before:
+        return "-"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="偽のGeminiとローカルのHTMLでパイプライン全体の性能を測ります。")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="実行するシナリオ（カンマ区切り）")
+    parser.add_argument("--iterations", type=int, default=5, help="シナリオごとの記事数・診断数・キーワード数")
+    parser.add_argument("--sessions", type=int, default=4, help="concurrent_sessions の同時セッション数")
+    parser.add_argument("--workers", type=int, default=4, help="bulk の同時処理数")
+    parser.add_argument("--sequential-body", action="store_true", help="本文をセクション並列ではなく一括で生成する")
+    parser.add_argument("--latency", type=float, default=0.05, help="偽Geminiの応答までの待ち時間（秒）")
+    parser.add_argument("--seconds-per-1k-chars", type=float, default=0.02, help="偽Geminiの出力1000文字あたりの生成時間（秒）")
+    parser.add_argument("--non-json-rate", type=float, default=0.0, help="JSONモードで前置き付きテキストを返す割合")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="429エラーを返す割合")
+    parser.add_argument("--max-concurrency", type=int, default=0, help="偽Geminiが同時に受け付ける数（超えたら429。0は無制限）")
+    parser.add_argument("--fetch-delay", type=float, default=0.0, help="フィクスチャサーバーの応答遅延（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="偽Geminiの乱数シード")
+    parser.add_argument("-o", "--output", help=f"結果のJSONの保存先（省略時は {DEFAULT_OUTPUT_DIR}/ に保存）")
+    parser.add_argument("--compare", help="比較する以前の結果のJSON")
+    args = parser.parse_args(argv)
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未対応のシナリオです: {', '.join(unknown)}（利用可能: {', '.join(SCENARIOS)}）")
+
+    options = {
+        "iterations": args.iterations,
+        "sessions": args.sessions,
+        "workers": args.workers,
+        "parallel": not args.sequential_body,
+        "latency": args.latency,
+        "seconds_per_1k_chars": args.seconds_per_1k_chars,
+        "non_json_rate": args.non_json_rate,
+        "error_rate": args.error_rate,
+        "max_concurrency": args.max_concurrency,
+        "fetch_delay": args.fetch_delay,
+        "seed": args.seed,
+    }
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "scenarios": {},
+    }
+
+    # メモリを独立して測れるよう、シナリオごとに新しいプロセスで実行する
+    context = multiprocessing.get_context("spawn")
+    print(f"{'scenario':<20} {'ops':>5} {'ops/sec':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'RSS MB':>8} {'errors':>7}")
+    for name in names:
+        queue = context.Queue()
+        process = context.Process(target=_run_scenario, args=(name, options, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if "failed" in result:
+            print(f"{name:<20} 失敗しました:\n{result['failed']}", file=sys.stderr)
+            continue
+        report["scenarios"][name] = result
+        latency = result["latency_ms"]
+        print(f"{name:<20} {result['operations']:>5} {result['throughput_per_sec']:>9} {latency['p50']:>9} "
+              f"{latency['p95']:>9} {latency['p99']:>9} {result['peak_rss_mb']:>8} {result['errors']:>7}", flush=True)
+
+    output = args.output or os.path.join(
+        DEFAULT_OUTPUT_DIR, f"e2e-{time.strftime('%Y%m%d-%H%M%S')}-{report['revision'] or 'unknown'}.json"
+    )
+    directory = os.path.dirname(output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を保存しました: {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            print(compare(json.load(f), report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
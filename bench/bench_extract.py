@@ -0,0 +1,88 @@
+"""本文抽出エンジンのマイクロベンチマーク
+
+bench/fixtures/ に保存したHTMLを全エンジンで繰り返し抽出し、
+1秒あたりの処理ページ数・出力文字数・ピークメモリを表示します。
+メモリはlxml（C実装）の確保分も含めるため、エンジンごとに別プロセスで
+実行し、処理前後の最大RSSの差を測ります。
+
+使い方:
+    python bench/bench_extract.py [--iterations 50] [--fixtures bench/fixtures]
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extractor  # noqa: E402
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _max_rss_mb():
+    # Linuxでは KB、macOSでは bytes 単位
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+
+def _run_backend(backend, pages, iterations, queue):
+    baseline = _max_rss_mb()
+    chars = 0
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages:
+            chars += len(extractor.extract_article_text(html, backend))
+    elapsed = time.perf_counter() - started
+    queue.put({
+        "backend": backend,
+        "pages": len(pages) * iterations,
+        "seconds": round(elapsed, 3),
+        "pages_per_sec": round(len(pages) * iterations / elapsed, 1),
+        "chars_per_page": chars // (len(pages) * iterations),
+        "peak_rss_delta_mb": round(_max_rss_mb() - baseline, 1),
+    })
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="本文抽出エンジンの速度とメモリを比較します。")
+    parser.add_argument("--iterations", type=int, default=50, help="フィクスチャ全体を処理する回数")
+    parser.add_argument("--fixtures", default=DEFAULT_FIXTURES, help="HTMLフィクスチャのディレクトリ")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args(argv)
+
+    paths = sorted(glob.glob(os.path.join(args.fixtures, "*.html")))
+    if not paths:
+        parser.error(f"HTMLフィクスチャが見つかりません: {args.fixtures}")
+    pages = []
+    for path in paths:
+        with open(path, "rb") as f:
+            pages.append(f.read())
+
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for backend in extractor.BACKENDS:
+        queue = context.Queue()
+        process = context.Process(target=_run_backend, args=(backend, pages, args.iterations, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"フィクスチャ: {len(pages)}件 ({sum(map(len, pages)) / 1024:.0f}KB) × {args.iterations}回")
+    print(f"{'engine':<8} {'pages/sec':>10} {'chars/page':>11} {'peak RSS +MB':>13}")
+    for r in results:
+        print(f"{r['backend']:<8} {r['pages_per_sec']:>10} {r['chars_per_page']:>11} {r['peak_rss_delta_mb']:>13}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
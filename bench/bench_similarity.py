@@ -0,0 +1,129 @@
+"""類似検索インデックス（similarity_index）のベンチマーク
+
+日本語風の合成記事を指定件数だけ一時ディレクトリのインデックスに追加し、
+追加のスループット、インデックスのサイズ、検索（キーワードでの骨子検索と、
+本文全体での内部リンク候補の検索）の p50 / p95 / p99 を表示します。
+検索は新しいプロセスでインデックスを開き直してから測るため、初回の読み込みも含まれます。
+
+使い方:
+    python bench/bench_similarity.py [--docs 30000] [--queries 200] [--seed 0]
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import similarity_index  # noqa: E402
+import telemetry  # noqa: E402
+
+# 合成記事の語彙（話題ごとの語と、どの記事にも出る語）
+TOPICS = [
+    ["テント", "設営", "キャンプ場", "焚き火", "寝袋", "ランタン", "タープ", "ペグ"],
+    ["新NISA", "積立", "証券口座", "投資信託", "配当", "利回り", "インデックス", "非課税"],
+    ["レシピ", "下ごしらえ", "調味料", "フライパン", "献立", "作り置き", "電子レンジ", "味付け"],
+    ["英会話", "発音", "文法", "単語帳", "リスニング", "TOEIC", "オンライン英会話", "シャドーイング"],
+    ["睡眠", "マットレス", "寝室", "体内時計", "カフェイン", "入眠", "昼寝", "枕"],
+    ["転職", "履歴書", "面接", "職務経歴書", "年収", "求人", "エージェント", "自己分析"],
+    ["ダイエット", "筋トレ", "有酸素運動", "タンパク質", "糖質", "カロリー", "ストレッチ", "体脂肪"],
+    ["ブログ", "アフィリエイト", "SEO", "キーワード", "検索意図", "内部リンク", "収益化", "アクセス"],
+]
+COMMON = ["初心者", "おすすめ", "方法", "ポイント", "注意点", "メリット", "デメリット", "比較"]
+TEMPLATES = [
+    "{a}を選ぶときは{b}との相性を確認しておくと安心です。",
+    "{a}の{c}について、実際の手順を具体的に解説します。",
+    "まずは{a}から始めて、慣れてきたら{b}にも挑戦してみましょう。",
+    "{c}を押さえておけば、{a}で失敗することはほとんどありません。",
+    "多くの人が{a}と{b}の違いで迷いますが、目的によって使い分けるのが{c}です。",
+]
+
+
+def make_article(rng, topic_index):
+    words = TOPICS[topic_index]
+    sentences = [
+        rng.choice(TEMPLATES).format(a=rng.choice(words), b=rng.choice(words), c=rng.choice(COMMON))
+        for _ in range(rng.randint(40, 80))
+    ]
+    title = f"{rng.choice(COMMON)}の{rng.choice(words)}と{rng.choice(words)}ガイド"
+    return title, title + "\n\n" + "\n\n".join("".join(sentences[i:i + 4]) for i in range(0, len(sentences), 4))
+
+
+def _percentiles(values):
+    values = sorted(values)
+    return {f"p{int(q * 100)}_ms": round(telemetry.percentile(values, q), 2) for q in (0.5, 0.95, 0.99)}
+
+
+def _measure_queries(path, queries, queue):
+    started = time.perf_counter()
+    index = similarity_index.SimilarityIndex(path)
+    index.search("ウォームアップ")
+    open_ms = round((time.perf_counter() - started) * 1000, 2)
+    results = {}
+    for name, kind, texts in queries:
+        durations = []
+        for text in texts:
+            started = time.perf_counter()
+            index.search(text, limit=5, kind=kind)
+            durations.append((time.perf_counter() - started) * 1000)
+        results[name] = _percentiles(durations)
+    queue.put({"open_ms": open_ms, "queries": results})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="類似検索インデックスの追加・検索の速度を測ります。")
+    parser.add_argument("--docs", type=int, default=30000, help="追加する合成記事の数")
+    parser.add_argument("--queries", type=int, default=200, help="種類ごとの検索回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "index")
+        index = similarity_index.SimilarityIndex(path)
+        started = time.perf_counter()
+        for i in range(args.docs):
+            topic = rng.randrange(len(TOPICS))
+            title, body = make_article(rng, topic)
+            kind = "outline" if i % 4 == 0 else "article"
+            index.add(f"{kind}:{i}", title if kind == "outline" else body, kind, title=title)
+        add_seconds = time.perf_counter() - started
+        stats = index.stats()
+
+        keywords = [f"{rng.choice(words)} {rng.choice(COMMON)}" for words in (rng.choice(TOPICS) for _ in range(args.queries))]
+        bodies = [make_article(rng, rng.randrange(len(TOPICS)))[1] for _ in range(args.queries)]
+        queries = [("keyword→outline", "outline", keywords), ("body→article", "article", bodies)]
+
+        context = multiprocessing.get_context("spawn")
+        queue = context.Queue()
+        process = context.Process(target=_measure_queries, args=(path, queries, queue))
+        process.start()
+        measured = queue.get()
+        process.join()
+
+    result = {
+        "docs": args.docs,
+        "adds_per_sec": round(args.docs / add_seconds, 1),
+        "index_mb": round(stats["bytes"] / 1024 / 1024, 1),
+        **measured,
+    }
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return 0
+
+    print(f"文書数: {result['docs']} / 追加: {result['adds_per_sec']}件/秒 / サイズ: {result['index_mb']}MB")
+    print(f"インデックスを開いて最初の検索まで: {result['open_ms']}ms")
+    print(f"{'query':<18} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+    for name, r in result["queries"].items():
+        print(f"{name:<18} {r['p50_ms']:>9} {r['p95_ms']:>9} {r['p99_ms']:>9}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""ベンチマーク用の偽Geminiバックエンド（APIキー・ネットワーク不要）
+
+llm.get_model を差し替え、プロンプトの種類に応じたそれらしい応答を返します。
+応答までの待ち時間、ストリーミングのチャンク間隔、JSON以外の応答（前置きや
+コードブロック付き）、429（レート制限）エラーの発生率と、同時に受け付けるリクエスト数の
+上限（超えた分は429になる。クォータの再現用）を設定できます。
+乱数はシードで固定できるため、同じ設定なら毎回同じ応答・エラーの並びになります。
+
+    import fake_gemini
+    backend = fake_gemini.install(fake_gemini.FakeConfig(latency=0.2, error_rate=0.05))
+    ...
+    print(backend.stats())
+"""
+
+import json
+import random
+import threading
+import time
+from dataclasses import dataclass
+
+import llm
+
+try:
+    from google.api_core.exceptions import ResourceExhausted as _RateLimitError
+except ImportError:  # google-api-core が無い環境でも同じ属性の例外を送出する
+    class _RateLimitError(Exception):
+        code = 429
+
+
+@dataclass
+class FakeConfig:
+    latency: float = 0.05            # 最初のトークンまでの待ち時間（秒）
+    seconds_per_1k_chars: float = 0.02   # 出力1000文字あたりの生成時間（秒）
+    stream_chunks: int = 8           # ストリーミング時のチャンク数
+    body_chars: int = 2000           # 本文（JSON以外）の応答の文字数
+    non_json_rate: float = 0.0       # JSONモードでも前置き付きのテキストで返す割合
+    error_rate: float = 0.0          # 429エラーを返す割合
+    max_concurrency: int = 0         # 同時に処理できるリクエスト数（0は無制限。超えたら429）
+    seed: int = 0
+
+
+class _Usage:
+    def __init__(self, prompt_tokens, output_tokens):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+
+class _Response:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage_metadata = usage
+
+
+def _estimate_tokens(text):
+    # 日本語はおおよそ1文字1トークンとして数える
+    return len(text)
+
+
+class FakeBackend:
+    """偽のモデルを作り、呼び出し回数や注入したエラー数を集計する"""
+
+    def __init__(self, config):
+        self.config = config
+        self._random = random.Random(config.seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+        self.non_json = 0
+
+    def _roll(self, rate):
+        with self._lock:
+            return self._random.random() < rate
+
+    def _reply(self, prompt, json_mode):
+        if not json_mode:
+            sentence = "これはベンチマーク用に生成された本文の一文です。"
+            return (sentence * (self.config.body_chars // len(sentence) + 1))[:self.config.body_chars]
+        if "監査" in prompt:
+            data = {"seo_checklist": [
+                {"item": "網羅性・深さ", "evaluation": "具体例が不足しています。", "status": "要改善",
+                 "suggestion": "具体的な手順と事例を追加してください。"},
+                {"item": "読みやすさ・論理構成", "evaluation": "問題ありません。", "status": "OK", "suggestion": ""},
+            ]}
+        elif "メタ" in prompt:
+            data = {"meta_title": "ベンチマーク用のSEOタイトルです。三十文字を少し超える長さにしています",
+                    "meta_description": "ベンチマーク用のメタディスクリプションです。" * 4}
+        else:
+            data = {"article_title_H1": "ベンチマーク用の記事タイトル",
+                    "outline": [{"H2": f"見出し{i + 1}", "H3": [f"小見出し{i + 1}-1", f"小見出し{i + 1}-2"]}
+                                for i in range(5)]}
+        text = json.dumps(data, ensure_ascii=False)
+        if self._roll(self.config.non_json_rate):
+            with self._lock:
+                self.non_json += 1
+            text = f"以下が生成結果です。\n```json\n{text}\n```\nご確認ください。"
+        return text
+
+    def generate(self, prompt, generation_config=None, stream=False):
+        config = self.config
+        with self._lock:
+            self.calls += 1
+            over_quota = config.max_concurrency and self.in_flight >= config.max_concurrency
+            if over_quota:
+                self.rate_limited += 1
+            else:
+                self.in_flight += 1
+        if over_quota:
+            raise _RateLimitError("429 Resource has been exhausted (e.g. check quota). Please retry in 0.5s.")
+        try:
+            response = self._generate(prompt, generation_config, stream)
+        except Exception:
+            self._finish()
+            raise
+        if not stream:
+            self._finish()
+            return response
+        return self._finish_after(response)
+
+    def _finish(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def _finish_after(self, chunks):
+        # ストリームは読み終えるまで処理中として数える
+        try:
+            yield from chunks
+        finally:
+            self._finish()
+
+    def _generate(self, prompt, generation_config, stream):
+        config = self.config
+        time.sleep(config.latency)
+        if self._roll(config.error_rate):
+            with self._lock:
+                self.rate_limited += 1
+            raise _RateLimitError("429 Resource has been exhausted (e.g. check quota).")
+
+        json_mode = (generation_config or {}).get("response_mime_type") == "application/json"
+        text = self._reply(prompt, json_mode)
+        usage = _Usage(_estimate_tokens(prompt), _estimate_tokens(text))
+        generation_seconds = len(text) / 1000 * config.seconds_per_1k_chars
+        if not stream:
+            time.sleep(generation_seconds)
+            return _Response(text, usage)
+        return self._stream(text, usage, generation_seconds)
+
+    def _stream(self, text, usage, generation_seconds):
+        count = max(1, self.config.stream_chunks)
+        size = -(-len(text) // count)
+        for i in range(0, len(text), size):
+            time.sleep(generation_seconds / count)
+            last = i + size >= len(text)
+            yield _Response(text[i:i + size], usage if last else None)
+
+    def stats(self):
+        with self._lock:
+            return {"calls": self.calls, "rate_limited": self.rate_limited, "non_json": self.non_json}
+
+
+class _FakeModel:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        return self._backend.generate(prompt, generation_config, stream)
+
+
+def install(config=None):
+    """llm が偽のバックエンドを使うように差し替え、そのバックエンドを返す"""
+    backend = FakeBackend(config or FakeConfig())
+    model = _FakeModel(backend)
+    llm.get_model = lambda model_name=llm.MODEL_NAME: model
+    return backend
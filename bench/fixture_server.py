@@ -0,0 +1,75 @@
+"""保存済みHTMLフィクスチャを配信するローカルHTTPサーバー（ベンチマーク用）
+
+bench/fixtures/<name>.html を次のURLで配信します。
+
+    /<name>              フィクスチャそのもの
+    /v/<n>/<name>        同じ内容を別のURLとして配信する（キャッシュに当たらない一括取得用）
+
+ETag を付けて返し、If-None-Match が一致すれば 304 を返すため、
+取得キャッシュの再検証の経路も計測できます。応答の遅延も設定できます。
+
+    with fixture_server.serve(delay=0.05) as base_url:
+        requests.get(f"{base_url}/blog_article")
+"""
+
+import contextlib
+import glob
+import hashlib
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(directory=DEFAULT_FIXTURES):
+    """{名前（拡張子なし）: HTMLのバイト列} を返す"""
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.html"))):
+        with open(path, "rb") as f:
+            pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # 計測中にアクセスログを出さない
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        name = parts[-1]
+        page = self.server.pages.get(name)
+        if page is None or (len(parts) not in (1, 3)) or (len(parts) == 3 and parts[0] != "v"):
+            self.send_error(404)
+            return
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        etag = '"%s"' % hashlib.sha1(page).hexdigest()[:16]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(page)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(page)
+
+
+@contextlib.contextmanager
+def serve(directory=DEFAULT_FIXTURES, delay=0.0, host="127.0.0.1", port=0):
+    """バックグラウンドでサーバーを起動し、ベースURLを返す（with を抜けると停止する）"""
+    server = ThreadingHTTPServer((host, port), _FixtureHandler)
+    server.daemon_threads = True
+    server.pages = load_fixtures(directory)
+    server.delay = delay
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://{host}:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
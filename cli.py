@@ -0,0 +1,187 @@
+"""記事生成パイプラインのコマンドラインツール
+
+各ステージを個別に実行し、結果を標準出力に書き出します。入力ファイルに "-" を指定すると
+標準入力から読み込むため、ステージをパイプでつないで使えます。
+
+使い方:
+    GEMINI_API_KEY=... python cli.py outline "キーワード" --intent "検索意図" > outline.json
+    python cli.py body outline.json --parallel > body.txt
+    python cli.py meta body.txt
+    python cli.py check body.txt --keyword "キーワード" > check.json
+    python cli.py revise body.txt --check check.json --keyword "キーワード"
+    python cli.py scrape https://example.com/article
+    python cli.py crawl https://example.com/sitemap.xml --max-pages 300 > audit.json
+    python cli.py crawl https://example.com/ --check      # 重複・競合ページだけAIでチェック
+    python cli.py batch keywords.csv -o output       # batch_pipeline.py と同じ
+    python cli.py serve --port 8000                  # HTTP API（api.py）
+    python cli.py worker --workers 4                 # ジョブワーカー（jobs.py）
+"""
+
+import argparse
+import json
+import sys
+
+import core
+import crawler
+import extractor
+import site_audit
+
+
+def _read_text(path):
+    if path == "-":
+        return sys.stdin.read()
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def _read_json(path):
+    return json.loads(_read_text(path))
+
+
+def _print_json(data):
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+
+
+def _generate(args):
+    return core.make_generate(use_cache=not args.no_cache)
+
+
+def cmd_outline(args):
+    _print_json(core.outline(args.keyword, args.intent, args.num_h2, generate=_generate(args)))
+
+
+def cmd_body(args):
+    print(core.body(_read_json(args.outline), parallel=args.parallel, generate=_generate(args)))
+
+
+def cmd_meta(args):
+    _print_json(core.meta(_read_text(args.body), generate=_generate(args)))
+
+
+def cmd_check(args):
+    meta_data = _read_json(args.meta) if args.meta else None
+    _print_json(core.check(_read_text(args.body), args.keyword, meta_data, generate=_generate(args)))
+
+
+def cmd_revise(args):
+    result = core.revise(
+        _read_text(args.body), _read_json(args.check), args.keyword,
+        incremental=not args.full, generate=_generate(args),
+    )
+    if args.json:
+        _print_json(result)
+    else:
+        print(result["revised_body"])
+
+
+def cmd_scrape(args):
+    page = core.scrape(args.url, backend=args.backend, force_refresh=args.force_refresh)
+    if args.json:
+        _print_json({key: page[key] for key in ("url", "text", "cache")})
+    else:
+        print(page["text"])
+
+
+def cmd_crawl(args):
+    def on_page(page):
+        nonlocal done
+        done += 1
+        print(f"\r取得済み: {done}件", end="", file=sys.stderr, flush=True)
+
+    done = 0
+    result = core.audit_site(
+        args.seed, backend=args.backend, max_pages=args.max_pages, force_refresh=args.force_refresh,
+        check_pages=args.check_pages, max_checked_pages=args.max_checked_pages, generate=_generate(args), on_page=on_page,
+    )
+    print(file=sys.stderr)
+    _print_json(result)
+
+
+# 入力を読まずにほかのツールへ引数をそのまま渡すサブコマンド
+_DELEGATED = {
+    "batch": ("batch_pipeline", "キーワード一覧から記事を一括生成する"),
+    "serve": ("api", "HTTP APIサーバーを起動する"),
+    "worker": ("jobs", "バックグラウンドジョブのワーカーを起動する"),
+}
+
+# APIキーが不要なサブコマンド（crawl は --check を付けた場合だけ必要）
+_OFFLINE_COMMANDS = ("scrape", "crawl")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="SEO記事生成パイプラインをコマンドラインから実行します。")
+    parser.add_argument("--no-cache", action="store_true", help="応答キャッシュを使わない")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("outline", help="記事の骨子（JSON）を生成する")
+    p.add_argument("keyword", help="メインキーワード")
+    p.add_argument("--intent", default="", help="検索意図")
+    p.add_argument("--num-h2", type=int, default=5, help="H2見出しの数")
+    p.set_defaults(func=cmd_outline)
+
+    p = subparsers.add_parser("body", help="骨子から記事本文を生成する")
+    p.add_argument("outline", help="骨子のJSONファイル（- で標準入力）")
+    p.add_argument("--parallel", action="store_true", help="H2ごとに並列生成する")
+    p.set_defaults(func=cmd_body)
+
+    p = subparsers.add_parser("meta", help="本文からSEOメタ情報を生成する")
+    p.add_argument("body", help="記事本文のテキストファイル（- で標準入力）")
+    p.set_defaults(func=cmd_meta)
+
+    p = subparsers.add_parser("check", help="本文のSEOチェックリストを作る")
+    p.add_argument("body", help="記事本文のテキストファイル（- で標準入力）")
+    p.add_argument("--keyword", required=True, help="ターゲットキーワード")
+    p.add_argument("--meta", help="メタ情報のJSONファイル（文字数もチェックする）")
+    p.set_defaults(func=cmd_check)
+
+    p = subparsers.add_parser("revise", help="チェックリストの指摘に沿って本文を修正する")
+    p.add_argument("body", help="記事本文のテキストファイル（- で標準入力）")
+    p.add_argument("--check", required=True, help="check の出力（JSONファイル）")
+    p.add_argument("--keyword", required=True, help="ターゲットキーワード")
+    p.add_argument("--full", action="store_true", help="指摘箇所だけでなく全文を書き直す")
+    p.add_argument("--json", action="store_true", help="変更点を含めてJSONで出力する")
+    p.set_defaults(func=cmd_revise)
+
+    p = subparsers.add_parser("scrape", help="URLの本文テキストを取得する")
+    p.add_argument("url")
+    p.add_argument("--backend", choices=extractor.BACKENDS, default=extractor.DEFAULT_BACKEND, help="本文抽出エンジン")
+    p.add_argument("--force-refresh", action="store_true", help="キャッシュを使わずに取得し直す")
+    p.add_argument("--json", action="store_true", help="キャッシュの利用状況を含めてJSONで出力する")
+    p.set_defaults(func=cmd_scrape)
+
+    p = subparsers.add_parser("crawl", help="サイトをクロールして重複・競合しているページを探す")
+    p.add_argument("seed", help="sitemap.xml のURL、またはリンクをたどり始めるページのURL")
+    p.add_argument("--max-pages", type=int, default=crawler.DEFAULT_MAX_PAGES, help="取得するページ数の上限")
+    p.add_argument("--backend", choices=extractor.BACKENDS, default=extractor.DEFAULT_BACKEND, help="本文抽出エンジン")
+    p.add_argument("--force-refresh", action="store_true", help="キャッシュを使わずに取得し直す")
+    p.add_argument("--check", dest="check_pages", action="store_true", help="重複・競合しているページだけをAIでSEOチェックする")
+    p.add_argument("--max-checked-pages", type=int, default=site_audit.DEFAULT_MAX_CHECKED_PAGES,
+                   help="AIでチェックするページ数の上限")
+    p.set_defaults(func=cmd_crawl)
+
+    for name, (_, help_text) in _DELEGATED.items():
+        subparsers.add_parser(name, help=help_text, add_help=False)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in _DELEGATED:
+        module_name, _ = _DELEGATED[argv[0]]
+        return __import__(module_name).main(argv[1:])
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    needs_api = args.command not in _OFFLINE_COMMANDS or getattr(args, "check_pages", False)
+    if needs_api and not core.configure_from_env():
+        parser.error("環境変数 GEMINI_API_KEY を設定してください。")
+    try:
+        args.func(args)
+    except Exception as e:
+        print(f"エラー: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
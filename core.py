@@ -0,0 +1,229 @@
+"""記事生成パイプラインのヘッドレスな入口（Streamlitに依存しない）
+
+骨子・本文・メタ情報・SEOチェック・修正・スクレイピング・サイト分析・類似検索の各ステージを、
+キャッシュの用意やGeminiの呼び出し方を意識せずに使える関数として提供します。
+Streamlit UI（app.py）、CLI（cli.py）、HTTP API（api.py）、ジョブワーカー（jobs.py）は
+いずれもこのモジュールを呼び出すだけの薄い利用者です。
+
+google.generativeai・requests・bs4 などの重いライブラリは実際に使うときまで読み込まないため、
+cron やワーカープロセスからでもすぐに起動できます。
+各ステージのAPI呼び出しには、telemetry でステージ名のタグが付きます。
+should_stop を受け取る関数は、should_stop() が True を返した時点で以降のAPI呼び出し・取得を行わず、
+CancelledError を送出します（バックグラウンドジョブのキャンセル用）。
+"""
+
+import functools
+import os
+import threading
+from concurrent.futures import CancelledError
+
+import crawler
+import extractor
+import llm
+import pipeline
+import revision
+import scrape_cache
+import similarity_index
+import site_audit
+import telemetry
+from gemini_cache import ResponseCache
+from scrape_cache import ScrapeCache
+from section_writer import generate_sections_parallel
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def _shared(name, factory):
+    """プロセス内で共有するキャッシュを1回だけ作る"""
+    with _caches_lock:
+        if name not in _caches:
+            _caches[name] = factory()
+        return _caches[name]
+
+
+def get_response_cache():
+    """プロセス内で共有するGemini応答キャッシュ"""
+    return _shared("responses", ResponseCache)
+
+
+def get_scrape_cache():
+    """プロセス内で共有する取得済みページのキャッシュ"""
+    return _shared("pages", ScrapeCache)
+
+
+def get_similarity_index():
+    """プロセス内で共有する記事・骨子の類似検索インデックス"""
+    return _shared("similarity_index", similarity_index.SimilarityIndex)
+
+
+def configure_from_env():
+    """環境変数 GEMINI_API_KEY でAPIキーを設定する（設定できたかどうかを返す）"""
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        return False
+    llm.configure(api_key)
+    return True
+
+
+def _staged(stage_name):
+    """関数の実行中の記録（API呼び出し・応答の解析）にステージ名のタグを付けるデコレーター"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with telemetry.stage(stage_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _generate_as(stage_name, generate):
+    """ステージ名のタグを付けた generate を返す（スレッドプールの中で呼ばれても記録が分かれる）"""
+    return telemetry.with_stage(generate or make_generate(), stage_name)
+
+
+def make_generate(use_cache=True, before_request=None, should_stop=None):
+    """共有キャッシュを通してGeminiを呼び出す generate(prompt, json_mode) を作る
+
+    should_stop を渡すと、呼び出しのたびに確認し、True なら送信せずに CancelledError を送出します。
+    """
+    cache = get_response_cache()
+
+    def generate(prompt, json_mode=False):
+        if should_stop is not None and should_stop():
+            raise CancelledError()
+        return llm.generate_text(prompt, json_mode, cache=cache, use_cache=use_cache, before_request=before_request)
+    return generate
+
+
+# --- ステージ ---
+
+@_staged("outline")
+def outline(keyword, intent, num_h2, generate=None):
+    """記事の骨子（JSON）を生成する"""
+    return pipeline.generate_outline(keyword, intent, num_h2, _generate_as("outline", generate))
+
+
+@_staged("body")
+def body(outline_data, parallel=False, generate=None, should_stop=None):
+    """骨子に沿って記事本文を生成する（parallel=True ならH2ごとに並列生成する）"""
+    generate = _generate_as("body", generate)
+    if parallel:
+        return generate_sections_parallel(outline_data, generate, should_stop=should_stop)
+    return pipeline.generate_body(outline_data, generate)
+
+
+@_staged("meta")
+def meta(article_body, generate=None):
+    """SEOメタ情報（タイトル、ディスクリプション）を生成する"""
+    return pipeline.generate_meta(article_body, _generate_as("meta", generate))
+
+
+@_staged("check")
+def check(article_body, keyword, meta_data=None, generate=None):
+    """SEOチェックリストを作る
+
+    AIが使えなくてもローカル分析の結果だけでチェックリストを返し、
+    その場合は "ai_error" にエラー内容を入れます。
+    """
+    try:
+        return pipeline.check_seo(article_body, keyword, _generate_as("check", generate), meta_data)
+    except CancelledError:
+        raise  # キャンセルはAIのエラーとして扱わない
+    except Exception as e:
+        _, local_items = pipeline.local_seo_check(article_body, keyword, meta_data)
+        checklist = pipeline.merge_checklists(local_items, None)
+        checklist["ai_error"] = str(e)
+        return checklist
+
+
+@_staged("revise")
+def revise(article_body, seo_check_data, keyword, incremental=True, generate=None, should_stop=None):
+    """「要改善」の指摘に基づいて本文を修正し、{"revised_body", "changes"} を返す
+
+    incremental=True の場合は指摘に該当するセクションだけを書き直し、
+    changes に変更点のリストを入れます（全文を書き直した場合は None）。
+    """
+    generate = _generate_as("revise", generate)
+    if incremental:
+        items = pipeline.collect_improvement_items(seo_check_data)
+        revised_body, changes = revision.revise_sections(
+            article_body, items, keyword, generate, should_stop=should_stop
+        )
+        return {"revised_body": revised_body, "changes": changes}
+    revised_body = pipeline.revise_article(article_body, seo_check_data, generate, keyword)
+    return {"revised_body": revised_body, "changes": None}
+
+
+def _extract_with(backend):
+    """指定した抽出エンジンで本文を取り出す関数を返す"""
+    return lambda html_content: extractor.extract_article_text(html_content, backend)
+
+
+def scrape(url, backend=extractor.DEFAULT_BACKEND, force_refresh=False):
+    """URLの本文テキストを共有キャッシュ経由で取得する（戻り値は scrape_cache.scrape と同じ）"""
+    return scrape_cache.scrape(
+        url, _extract_with(backend), cache=get_scrape_cache(), force_refresh=force_refresh, variant=backend
+    )
+
+
+def scrape_many(urls, backend=extractor.DEFAULT_BACKEND, force_refresh=False, should_stop=None):
+    """複数URLを並列に取得し、入力と同じ順番で結果を返す（失敗したURLは {"url", "error"}）"""
+    return scrape_cache.scrape_many(
+        urls, _extract_with(backend), cache=get_scrape_cache(), force_refresh=force_refresh, variant=backend,
+        should_stop=should_stop,
+    )
+
+
+def audit_site(seed, backend=extractor.DEFAULT_BACKEND, max_pages=crawler.DEFAULT_MAX_PAGES,
+               force_refresh=False, check_pages=False, max_checked_pages=site_audit.DEFAULT_MAX_CHECKED_PAGES,
+               generate=None, should_stop=None, on_page=None):
+    """サイトをクロールして近似重複・競合しているページのクラスターを求める
+
+    check_pages=True の場合は、クラスターに入ったページだけをAIでSEOチェックします
+    （戻り値は site_audit.audit と同じで、チェック結果は各ページの "seo_check" に入る）。
+    """
+    result = site_audit.audit(
+        seed, _extract_with(backend), cache=get_scrape_cache(), max_pages=max_pages,
+        force_refresh=force_refresh, variant=backend, should_stop=should_stop, on_page=on_page,
+    )
+    if check_pages and not (should_stop is not None and should_stop()):
+        site_audit.check_clusters(
+            result["clusters"],
+            lambda url: scrape(url, backend=backend)["text"],
+            lambda text, keyword: check(text, keyword, generate=generate),
+            max_pages=max_checked_pages, should_stop=should_stop,
+        )
+    return result
+
+
+def index_outline(key, outline_data, keyword=""):
+    """生成した骨子を類似検索インデックスに登録する（同じ key なら置き換える）"""
+    # 骨子を生成したときのキーワードも検索対象のテキストに含める（検索意図は選択肢が少なく、
+    # どの骨子にも似た文が入るため含めない）
+    text = "\n".join(filter(None, [keyword, similarity_index.outline_text(outline_data)]))
+    return get_similarity_index().add(
+        key, text, "outline", keyword=keyword, payload=outline_data,
+        title=outline_data.get("article_title_H1", "") if isinstance(outline_data, dict) else "",
+    )
+
+
+def index_article(key, article_body, title="", keyword="", url=""):
+    """記事本文を類似検索インデックスに登録する（同じ key なら置き換える）"""
+    title = title or article_body.strip().split("\n", 1)[0].lstrip("# ").strip()
+    return get_similarity_index().add(key, article_body, "article", title=title, keyword=keyword, url=url)
+
+
+def find_covered_outlines(keyword, exclude_key=None, limit=3, min_score=similarity_index.COVERED_MIN_SCORE):
+    """キーワードが近い、登録済みの骨子を返す（骨子を生成する前の重複確認用）"""
+    return get_similarity_index().search(
+        keyword, limit=limit, kind="outline", exclude_key=exclude_key, min_score=min_score
+    )
+
+
+def suggest_internal_links(article_body, exclude_key=None, limit=5, min_score=similarity_index.LINK_MIN_SCORE):
+    """本文の内部リンク先の候補（登録済みの記事を類似度の高い順に、アンカーテキスト付きで）"""
+    targets = get_similarity_index().search(
+        article_body, limit=limit, kind="article", exclude_key=exclude_key, min_score=min_score
+    )
+    return [dict(target, anchor=similarity_index.anchor_text(article_body, target)) for target in targets]
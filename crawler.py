@@ -0,0 +1,240 @@
+"""サイト全体のクロール（sitemap.xml または開始URLから。robots.txt に従う）
+
+- sitemap.xml（サイトマップインデックス・gzip圧縮も可）を指定した場合は、
+  そこに載っているページを順に取得します。サイトマップは1件ずつ読みながらURLを流すため、
+  ページ数が多くても一覧全体をメモリに持ちません。
+- 通常のページのURLを指定した場合は、そのページから同じホスト内のリンクをたどります。
+- どちらの場合も robots.txt で禁止されたURLは取得せず、Crawl-delay があれば間隔をあけます。
+
+ページの取得と本文の抽出は scrape_and_extract_text と同じ scrape_cache.scrape を通るため、
+取得した本文はキャッシュに残り、後からSEOチェックするときは取得し直しません。
+結果は取得が終わったものから順に返すので、呼び出し側も1ページずつ処理して捨てられます。
+"""
+
+import collections
+import gzip
+import io
+import threading
+import time
+import urllib.robotparser
+import xml.etree.ElementTree as ET
+from urllib.parse import urlsplit
+
+import extractor
+import fetcher
+import scrape_cache
+
+DEFAULT_MAX_PAGES = 500
+DEFAULT_MAX_WORKERS = 4
+MAX_SITEMAPS = 50                        # サイトマップインデックスからたどるサイトマップの上限
+MAX_SITEMAP_BYTES = 50 * 1024 * 1024     # サイトマップの仕様上の上限（展開後）
+MAX_ROBOTS_BYTES = 512 * 1024
+MAX_CRAWL_DELAY = 10.0                   # robots.txt の Crawl-delay に従う上限（秒）
+
+# 本文を持たないファイルへのリンクはたどらない
+_SKIP_EXTENSIONS = (
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg', '.ico', '.pdf', '.zip', '.gz',
+    '.css', '.js', '.json', '.xml', '.mp3', '.mp4', '.mov', '.avi',
+)
+
+
+def is_sitemap_url(url):
+    return urlsplit(url).path.lower().endswith(('.xml', '.xml.gz'))
+
+
+def _origin(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def _host(url):
+    host = urlsplit(url).netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class RobotsRules:
+    """ホストごとの robots.txt を読み込み、取得してよいURLかどうかと取得の間隔を判定する
+
+    robots.txt が 4xx の場合はすべて許可、5xx や接続エラーの場合はすべて禁止として扱います
+    （RFC 9309 と同じ扱い）。
+    """
+
+    def __init__(self, user_agent=fetcher.USER_AGENT):
+        self.user_agent = user_agent
+        self._parsers = {}
+        self._next_fetch = {}
+        self._lock = threading.Lock()
+
+    def _load(self, origin):
+        parser = urllib.robotparser.RobotFileParser(f"{origin}/robots.txt")
+        try:
+            page = fetcher.fetch(parser.url, max_bytes=MAX_ROBOTS_BYTES)
+        except Exception as e:
+            status = getattr(getattr(e, "response", None), "status_code", None)
+            if status is not None and 400 <= status < 500:
+                parser.allow_all = True
+            else:
+                parser.disallow_all = True
+            return parser
+        parser.parse(page["content"].decode("utf-8", "replace").splitlines())
+        return parser
+
+    def _parser(self, url):
+        origin = _origin(url)
+        with self._lock:
+            if origin not in self._parsers:
+                self._parsers[origin] = self._load(origin)
+            return self._parsers[origin]
+
+    def allowed(self, url):
+        return self._parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        delay = self._parser(url).crawl_delay(self.user_agent)
+        return min(float(delay), MAX_CRAWL_DELAY) if delay else 0.0
+
+    def wait_turn(self, url):
+        """Crawl-delay が指定されていれば、同じホストへの前回の取得から間隔をあける"""
+        delay = self.crawl_delay(url)
+        if not delay:
+            return
+        origin = _origin(url)
+        with self._lock:
+            now = time.monotonic()
+            scheduled = max(now, self._next_fetch.get(origin, 0.0))
+            self._next_fetch[origin] = scheduled + delay
+        if scheduled > now:
+            time.sleep(scheduled - now)
+
+
+def parse_sitemap(content):
+    """サイトマップを読み、("page" または "sitemap", URL) を文書順に返すジェネレーター
+
+    展開後に MAX_SITEMAP_BYTES を超えるサイトマップは、上限までに読めたURLだけを返します。
+    """
+    truncated = False
+    if content[:2] == b"\x1f\x8b":
+        # 全体を展開してから切り詰めると、圧縮爆弾でメモリを使い切るため、上限までしか展開しない
+        with gzip.GzipFile(fileobj=io.BytesIO(content)) as f:
+            content = f.read(MAX_SITEMAP_BYTES + 1)
+        truncated = len(content) > MAX_SITEMAP_BYTES
+        content = content[:MAX_SITEMAP_BYTES]
+    try:
+        for _, element in ET.iterparse(io.BytesIO(content)):
+            tag = element.tag.rsplit("}", 1)[-1]
+            if tag in ("url", "sitemap"):
+                loc = next((child.text for child in element if child.tag.rsplit("}", 1)[-1] == "loc"), None)
+                if loc and loc.strip():
+                    yield ("page" if tag == "url" else "sitemap", loc.strip())
+                element.clear()  # 読み終えた要素は捨てて、メモリを一定に保つ
+    except ET.ParseError:
+        if not truncated:
+            raise  # 切り詰めたために途中で終わった場合だけ、そこまでの結果で終える
+
+
+def iter_sitemap_urls(sitemap_url, rules=None):
+    """サイトマップ（インデックスなら子のサイトマップも）に載っているページのURLを順に返す"""
+    queue = collections.deque([sitemap_url])
+    seen = {sitemap_url}
+    while queue and len(seen) <= MAX_SITEMAPS:
+        url = queue.popleft()
+        if rules is not None and not rules.allowed(url):
+            continue
+        page = fetcher.fetch(url, max_bytes=MAX_SITEMAP_BYTES)
+        for kind, loc in parse_sitemap(page["content"]):
+            if kind == "page":
+                yield loc
+            elif loc not in seen:
+                seen.add(loc)
+                queue.append(loc)
+
+
+class _Frontier:
+    """まだ取得していないURLの待ち行列（空になっても、追加されればまた返す）"""
+
+    def __init__(self):
+        self._queue = collections.deque()
+
+    def push(self, url):
+        self._queue.append(url)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._queue:
+            raise StopIteration
+        return self._queue.popleft()
+
+
+def crawl(seed, extract, cache=None, max_pages=DEFAULT_MAX_PAGES, max_workers=DEFAULT_MAX_WORKERS,
+          force_refresh=False, variant="", rules=None, should_stop=None):
+    """seed（sitemap.xml または開始URL）から同じサイトのページを並列に取得するジェネレーター
+
+    取得が終わったページから順に scrape_cache.scrape と同じ形式の辞書を返します。
+    取得に失敗したURLは {"url", "error"}、robots.txt で禁止されたURLは {"url", "skipped": "robots"} です。
+    開始URLからリンクをたどる場合は、リンクを読むためにキャッシュがあってもHTMLを取得し直します。
+    should_stop() が True を返すと、実行中の取得が終わった時点で止まります。
+    """
+    rules = rules or RobotsRules()
+    site = _host(seed)
+    follow_links = not is_sitemap_url(seed)
+    seen = set()
+    blocked = collections.deque()
+
+    def in_scope(url):
+        path = urlsplit(url).path.lower()
+        return _host(url) == site and not path.endswith(_SKIP_EXTENSIONS)
+
+    def full():
+        return len(seen) >= max_pages
+
+    def admit(url):
+        """取得対象に加えてよければ True（禁止されたURLは blocked に入れる）"""
+        if url in seen or full():
+            return False
+        seen.add(url)
+        if not rules.allowed(url):
+            blocked.append(url)
+            return False
+        return True
+
+    def fetch_page(url):
+        rules.wait_turn(url)
+        if not follow_links:
+            return scrape_cache.scrape(url, extract, cache=cache, force_refresh=force_refresh, variant=variant)
+        links = []
+
+        def extract_and_collect(html_content):
+            links.extend(extractor.extract_links(html_content, url))
+            return extract(html_content)
+
+        page = scrape_cache.scrape(url, extract_and_collect, cache=cache, force_refresh=True, variant=variant)
+        return dict(page, links=links)
+
+    if follow_links:
+        frontier = _Frontier()
+        if admit(seed):
+            frontier.push(seed)
+        urls = frontier
+    else:
+        def sitemap_urls():
+            for url in iter_sitemap_urls(seed, rules):
+                if full():
+                    return  # 上限に達したら、残りのサイトマップは取得しない
+                if in_scope(url) and admit(url):
+                    yield url
+
+        urls = sitemap_urls()
+
+    for page in fetcher.imap_urls(fetch_page, urls, max_workers=max_workers, should_stop=should_stop):
+        while blocked:
+            yield {"url": blocked.popleft(), "skipped": "robots"}
+        for link in page.pop("links", ()):
+            if in_scope(link) and admit(link):
+                frontier.push(link)
+        yield page
+        if should_stop is not None and should_stop():
+            return
+    while blocked:
+        yield {"url": blocked.popleft(), "skipped": "robots"}
@@ -0,0 +1,144 @@
+"""HTMLから本文テキストを抽出するエンジン（パーサーのバックエンドを選択可能）
+
+- "lxml": C実装のlxmlでパースし、1回の走査で本文を取り出す高速版。
+  nav / header / footer / aside / script などの定型部分を除外し（header / footer は
+  article・main の外にあるページ全体のものだけ）、
+  取り出した要素の子孫（p の中の span など）は重複して出力しません。
+- "legacy": 従来どおり BeautifulSoup('html.parser') と find_all で抽出する互換版。
+
+lxmlがインストールされていない環境では、自動的に "legacy" を使います。
+パーサーは最初に抽出するときに読み込むため、このモジュールの import 自体は軽量です。
+"""
+
+import importlib.util
+import re
+
+# lxmlが無い環境では従来の抽出方法だけを使う
+_HAS_LXML = importlib.util.find_spec("lxml") is not None
+
+# 本文として拾うタグ（従来の抽出対象と同じ）
+TEXT_TAGS = ('p', 'h1', 'h2', 'h3', 'li', 'span')
+# 本文ではない定型部分として丸ごと除外するタグ
+BOILERPLATE_TAGS = frozenset((
+    'script', 'style', 'noscript', 'template', 'svg', 'iframe', 'form',
+    'nav', 'aside',
+))
+# ページ全体のヘッダー・フッターとして除外するタグ（記事内の header には記事のタイトルが入るため、
+# CONTENT_TAGS の中にあるものは除外しない）
+PAGE_LEVEL_TAGS = frozenset(('header', 'footer'))
+CONTENT_TAGS = frozenset(('article', 'main'))
+MIN_TEXT_LENGTH = 10
+
+BACKENDS = ("lxml", "legacy") if _HAS_LXML else ("legacy",)
+DEFAULT_BACKEND = BACKENDS[0]
+
+_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+_XML_DECLARATION_RE = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+def decode_html(html_content):
+    """HTMLのバイト列を文字列にする（meta charset → UTF-8 → 自動判定の順に試す）"""
+    if isinstance(html_content, str):
+        return html_content
+    match = _CHARSET_RE.search(html_content[:4096])
+    candidates = [match.group(1).decode('ascii', 'ignore')] if match else []
+    for encoding in candidates + ['utf-8']:
+        try:
+            return html_content.decode(encoding)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    from bs4 import UnicodeDammit
+    return UnicodeDammit(html_content, ['cp932', 'euc-jp']).unicode_markup or ''
+
+
+def _extract_legacy(html_content):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+
+    article_text = []
+    for tag in soup.find_all(list(TEXT_TAGS)):
+        text = tag.get_text(strip=True)
+        if text and len(text) > MIN_TEXT_LENGTH:
+            article_text.append(text)
+    return article_text
+
+
+def _extract_lxml(html_content):
+    import lxml.html
+
+    markup = _XML_DECLARATION_RE.sub('', decode_html(html_content), count=1)
+    try:
+        root = lxml.html.document_fromstring(markup)
+    except lxml.etree.ParserError:  # 空のドキュメント
+        return []
+
+    article_text = []
+    stack = [(root, False)]
+    while stack:
+        element, in_content = stack.pop()
+        tag = element.tag
+        if not isinstance(tag, str) or tag in BOILERPLATE_TAGS or (tag in PAGE_LEVEL_TAGS and not in_content):
+            continue  # コメント・処理命令・定型部分は子孫ごと読み飛ばす
+        if tag in TEXT_TAGS:
+            text = ''.join(piece.strip() for piece in element.itertext())
+            if len(text) > MIN_TEXT_LENGTH:
+                article_text.append(text)
+            continue  # 取り出した要素の子孫は重複になるので走査しない
+        # 文書順に取り出せるよう、子要素を逆順に積む
+        in_content = in_content or tag in CONTENT_TAGS
+        stack.extend((child, in_content) for child in reversed(element))
+    return article_text
+
+
+_EXTRACTORS = {"legacy": _extract_legacy}
+if _HAS_LXML:
+    _EXTRACTORS["lxml"] = _extract_lxml
+
+
+def extract_text_blocks(html_content, backend=DEFAULT_BACKEND):
+    """本文テキストを段落などのブロック単位のリストで返す"""
+    if backend not in _EXTRACTORS:
+        raise ValueError(f"未対応の抽出エンジンです: {backend}（利用可能: {', '.join(BACKENDS)}）")
+    return _EXTRACTORS[backend](html_content)
+
+
+def extract_article_text(html_content, backend=DEFAULT_BACKEND):
+    """HTMLから本文テキストのみを抽出する"""
+    return '\n\n'.join(extract_text_blocks(html_content, backend))
+
+
+def extract_links(html_content, base_url):
+    """ページ内のリンク先を絶対URLのリストで返す（rel="nofollow" のリンクと # 以降は除く）
+
+    ページに <meta name="robots" content="nofollow"> がある場合は空のリストを返します。
+    """
+    from urllib.parse import urldefrag, urljoin
+
+    if _HAS_LXML:
+        import lxml.html
+
+        markup = _XML_DECLARATION_RE.sub('', decode_html(html_content), count=1)
+        try:
+            root = lxml.html.document_fromstring(markup)
+        except lxml.etree.ParserError:
+            return []
+        robots = ' '.join(root.xpath('//meta[@name="robots"]/@content')).lower()
+        anchors = [(a.get('href'), a.get('rel') or '') for a in root.iter('a')]
+    else:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(decode_html(html_content), 'html.parser')
+        robots = ' '.join(m.get('content', '') for m in soup.find_all('meta', attrs={'name': 'robots'})).lower()
+        anchors = [(a.get('href'), ' '.join(a.get('rel') or [])) for a in soup.find_all('a')]
+
+    if 'nofollow' in robots:
+        return []
+    links = []
+    for href, rel in anchors:
+        if not href or 'nofollow' in rel.lower():
+            continue
+        url = urldefrag(urljoin(base_url, href.strip()))[0]
+        if url.startswith(('http://', 'https://')):
+            links.append(url)
+    return links
@@ -0,0 +1,159 @@
+"""Webページ取得レイヤー（コネクションプール共有・複数URLの並列取得）
+
+プロセス内で1つの requests.Session を共有し、同じホストへの接続（TCP+TLS）を再利用します。
+複数URLはスレッドプールで同時に取得し、ホストごとの同時接続数と全体の同時接続数を制限します。
+件数が多い場合は imap_urls で、終わったものから順に結果を受け取れます（メモリは同時実行数ぶんだけ使う）。
+gzip / brotli（brotliパッケージがある場合）で圧縮された応答は自動で展開され、
+上限サイズを超える本文は途中で打ち切ります。
+"""
+
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+DEFAULT_TIMEOUT = 10
+DEFAULT_MAX_BYTES = 5 * 1024 * 1024   # 5MB
+DEFAULT_MAX_WORKERS = 8               # 全体の同時接続数
+DEFAULT_PER_HOST = 2                  # 同一ホストへの同時接続数
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+
+_session = None
+_session_lock = threading.Lock()
+_host_semaphores = {}
+_host_lock = threading.Lock()
+
+
+def get_session():
+    """プロセス内で共有するコネクションプール付きセッション"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            # requests は読み込みに時間がかかるため、最初にページを取得するときまで読み込まない
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.util import make_headers
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=32, pool_maxsize=DEFAULT_MAX_WORKERS * 2)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers.update({
+                'User-Agent': USER_AGENT,
+                # urllib3が展開できる形式だけを宣言する（brotliが入っていれば br も含まれる）
+                'Accept-Encoding': make_headers(accept_encoding=True)['accept-encoding'],
+            })
+            _session = session
+        return _session
+
+
+def is_request_error(error):
+    """接続エラーやHTTPエラーなど、ページの取得に失敗したことを表す例外かどうか"""
+    requests = sys.modules.get("requests")
+    return requests is not None and isinstance(error, requests.exceptions.RequestException)
+
+
+def _host_semaphore(url, per_host):
+    key = (urlsplit(url).netloc.lower(), per_host)
+    with _host_lock:
+        if key not in _host_semaphores:
+            _host_semaphores[key] = threading.BoundedSemaphore(per_host)
+        return _host_semaphores[key]
+
+
+def fetch(url, timeout=DEFAULT_TIMEOUT, max_bytes=DEFAULT_MAX_BYTES, headers=None):
+    """URLを1件取得する。HTTPエラーや接続エラーは requests の例外として送出する
+
+    戻り値は {"url", "status", "content", "encoding", "headers", "truncated", "elapsed"} の辞書です。
+    "headers" は大文字小文字を区別しない辞書（requests.structures.CaseInsensitiveDict）です。
+    """
+    started = time.monotonic()
+    with get_session().get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        chunks = []
+        size = 0
+        truncated = False
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= max_bytes:
+                truncated = True
+                break
+        content = b"".join(chunks)[:max_bytes]
+        return {
+            "url": url,
+            "status": response.status_code,
+            "content": content,
+            "encoding": response.encoding,
+            # dict にすると大文字小文字を区別してしまう（Etag・last-modified などを送るサーバーがある）
+            "headers": response.headers.copy(),
+            "truncated": truncated,
+            "elapsed": time.monotonic() - started,
+        }
+
+
+CANCELLED_ERROR = "キャンセルされました"
+
+
+def _run_limited(func, url, per_host, should_stop=None):
+    if should_stop is not None and should_stop():
+        return {"url": url, "error": CANCELLED_ERROR}
+    with _host_semaphore(url, per_host):
+        try:
+            return func(url)
+        except Exception as e:
+            return {"url": url, "error": str(e)}
+
+
+def map_urls(func, urls, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, should_stop=None):
+    """URLごとに func(url) を並列実行し、入力と同じ順番で結果を返す
+
+    ホストごとの同時実行数は per_host、全体の同時実行数は max_workers に制限します。
+    例外が発生したURLは {"url", "error"} の辞書になります（他のURLの処理は続行します）。
+    should_stop() が True を返した後に順番が来たURLは、取得せずに {"url", "error": CANCELLED_ERROR} にします。
+    """
+    if not urls:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+        return list(executor.map(lambda url: _run_limited(func, url, per_host, should_stop), urls))
+
+
+def imap_urls(func, urls, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, should_stop=None):
+    """URLごとに func(url) を並列実行し、終わったものから順に結果を返すジェネレーター
+
+    urls はジェネレーターでもよく、実行中のURLが max_workers 件を超えないように
+    少しずつ読み進めます（URLが何件あっても、保持する結果は同時実行数ぶんだけ）。
+    処理中に urls 側でURLを追加していく使い方（クロールなど）もできます。
+    例外が発生したURLは {"url", "error"} の辞書になります。
+    should_stop() が True を返すと新しいURLを読み進めず、実行中のURLの結果を返して終わります。
+    """
+    urls = iter(urls)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = set()
+        exhausted = False
+        while True:
+            if should_stop is not None and should_stop():
+                exhausted = True  # 止める場合は、実行中のURLの結果だけを返して終わる
+            while not exhausted and len(pending) < max_workers:
+                url = next(urls, None)
+                if url is None:
+                    exhausted = True
+                else:
+                    pending.add(executor.submit(_run_limited, func, url, per_host, should_stop))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+            # 結果を受け取った側がURLを追加したかもしれないので、次のURLを読み直す
+            exhausted = False
+
+
+def fetch_many(urls, max_workers=DEFAULT_MAX_WORKERS, per_host=DEFAULT_PER_HOST, **fetch_kwargs):
+    """複数URLを並列に取得し、入力と同じ順番で結果を返す
+
+    失敗したURLは {"url", "error"} の辞書になります（他のURLの取得は続行します）。
+    """
+    return map_urls(lambda url: fetch(url, **fetch_kwargs), urls, max_workers=max_workers, per_host=per_host)
@@ -0,0 +1,151 @@
+"""Gemini APIの応答をディスクにキャッシュするモジュール
+
+SQLite（WALモード）に保存するため、Streamlitの複数セッション・複数プロセスから
+同じキャッシュを共有できます。キーはモデル名・プロンプト・生成設定・json_modeの
+ハッシュで、TTL切れと件数/サイズ上限を超えた分は最終アクセスが古い順（LRU）に削除します。
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+# キャッシュファイルの保存先（環境変数で変更可能）
+DEFAULT_CACHE_PATH = os.environ.get(
+    "SEO_STUDIO_CACHE_PATH", os.path.join(".cache", "gemini_responses.sqlite3")
+)
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60   # 1週間
+DEFAULT_MAX_ENTRIES = 2000
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024     # 50MB
+
+
+def make_cache_key(model_name, prompt, generation_config=None, json_mode=False):
+    """モデル名・プロンプト・生成設定・json_modeからキャッシュキー（SHA-256）を作る"""
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "prompt": prompt,
+            "config": generation_config or {},
+            "json_mode": bool(json_mode),
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """プロセス間で共有できるLRU/TTL付きの応答キャッシュ"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # スレッドをまたいで使えるよう、操作ごとに接続を開いて閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _bump(conn, name):
+        conn.execute(
+            "INSERT INTO stats(name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key):
+        """キャッシュを参照する。ヒットしなければNoneを返す"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.ttl_seconds:
+                conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (now, key))
+                self._bump(conn, "hits")
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._bump(conn, "misses")
+            return None
+
+    def set(self, key, value):
+        """応答テキストを保存し、上限を超えた分を追い出す"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO entries(key, value, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now),
+            )
+            self._evict(conn, now)
+
+    def delete(self, key):
+        """エントリを削除する（呼び出し元で使えないと分かった応答を捨てるため）"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM entries WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in conn.execute("SELECT key, size FROM entries ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+            evicted += 1
+        if evicted:
+            conn.execute(
+                "INSERT INTO stats(name, value) VALUES ('evictions', ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                (evicted,),
+            )
+
+    def stats(self):
+        """ヒット/ミス数と現在の件数・サイズを返す"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total,
+        }
+
+    def clear(self):
+        """全エントリと統計を削除する"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM stats")
@@ -0,0 +1,83 @@
+"""バックグラウンドジョブの種類ごとの処理（Streamlitに依存しない）
+
+各ハンドラーは handler(params, context) の形で呼ばれ、JSONに変換できる結果を返します。
+params にはUIから渡された入力がそのまま入っています。処理の本体は core にあります。
+キャンセルされたジョブが無駄にAPIやHTTPの呼び出しを続けないよう、core には
+should_stop=context.cancelled を渡し、Gemini呼び出し・セクション・URLの区切りごとに確認させます。
+"""
+
+import core
+import crawler
+import extractor
+
+
+def _generate_for(params, context):
+    """ジョブの設定（キャッシュのバイパス有無）に合わせた generate(prompt, json_mode) を作る
+
+    キャンセルされた後の呼び出しは、送信せずに CancelledError になります。
+    """
+    return core.make_generate(use_cache=not params.get("bypass_cache", False), should_stop=context.cancelled)
+
+
+def run_outline(params, context):
+    return core.outline(
+        params["keyword"], params["intent"], params["num_h2"], generate=_generate_for(params, context)
+    )
+
+
+def run_body(params, context):
+    return core.body(
+        params["outline_data"], parallel=params.get("parallel", False),
+        generate=_generate_for(params, context), should_stop=context.cancelled,
+    )
+
+
+def run_meta(params, context):
+    return core.meta(params["article_body"], generate=_generate_for(params, context))
+
+
+def run_check(params, context):
+    return core.check(
+        params["article_body"], params["keyword"], params.get("meta_data"), generate=_generate_for(params, context)
+    )
+
+
+def run_revise(params, context):
+    return core.revise(
+        params["article_body"], params["seo_check"], params["keyword"],
+        incremental=params.get("incremental", True), generate=_generate_for(params, context),
+        should_stop=context.cancelled,
+    )
+
+
+def run_scrape(params, context):
+    page = core.scrape(
+        params["url"],
+        backend=params.get("backend", extractor.DEFAULT_BACKEND),
+        force_refresh=params.get("force_refresh", False),
+    )
+    return {"url": page["url"], "text": page["text"], "cache": page["cache"]}
+
+
+def run_audit(params, context):
+    # キャンセルされたら、実行中の取得が終わった時点でクロールを止める
+    return core.audit_site(
+        params["seed"],
+        backend=params.get("backend", extractor.DEFAULT_BACKEND),
+        max_pages=params.get("max_pages", crawler.DEFAULT_MAX_PAGES),
+        force_refresh=params.get("force_refresh", False),
+        check_pages=params.get("check_pages", False),
+        generate=_generate_for(params, context),
+        should_stop=context.cancelled,
+    )
+
+
+HANDLERS = {
+    "outline": run_outline,
+    "body": run_body,
+    "meta": run_meta,
+    "check": run_check,
+    "revise": run_revise,
+    "scrape": run_scrape,
+    "audit": run_audit,
+}
@@ -0,0 +1,314 @@
+"""AI処理・スクレイピングのバックグラウンドジョブ（SQLiteをブローカー代わりに使うローカルキュー）
+
+ジョブはIDつきでSQLiteに保存され、ワーカースレッドが順番に取り出して実行します。
+状態（queued / running / done / failed / cancelled）と結果はすべてSQLiteに残るため、
+ブラウザを再読み込みしてもジョブIDさえ分かれば結果を取り直せます。
+
+Streamlitのプロセス内でワーカーを動かすほか、同じDBを見る別プロセスの
+ワーカーとしても起動できます:
+    python jobs.py --workers 4
+
+実行中のジョブには、取り出したプロセス（ホスト名とPID）と最終応答時刻（heartbeat_at）を記録します。
+ワーカーは実行中 HEARTBEAT_SECONDS ごとに応答時刻を更新し、応答が LEASE_SECONDS 以上途絶えたジョブか、
+同じホストで取り出したプロセスが終了しているジョブだけを待機中に戻します（recover）。
+そのため、同じDBを使うプロセスを後から起動しても、他のプロセスが実行中のジョブを二重に実行しません。
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import CancelledError
+
+DEFAULT_DB_PATH = os.environ.get("SEO_STUDIO_JOBS_PATH", os.path.join(".cache", "jobs.sqlite3"))
+DEFAULT_WORKERS = 4
+POLL_SECONDS = 0.5
+RETENTION_SECONDS = 24 * 60 * 60   # 終了したジョブは1日で削除する
+HEARTBEAT_SECONDS = 10             # 実行中のジョブの応答時刻を更新する間隔
+LEASE_SECONDS = 60                 # 応答がこれ以上途絶えたジョブは、ワーカーが落ちたとみなす
+RECOVER_INTERVAL_SECONDS = 30      # ワーカーが待機中に recover を行う間隔
+
+HOSTNAME = socket.gethostname()
+
+FINISHED_STATUSES = ("done", "failed", "cancelled")
+
+
+def _process_alive(pid):
+    """同じホストのプロセスが生きているかどうか（判定できない場合は生きているとみなす）"""
+    if pid == os.getpid():
+        return True
+    if os.name != "posix":
+        return True  # Windows の os.kill はシグナル0でもプロセスを終了させるため使わない
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # 権限がないだけで、プロセスは存在する
+    return True
+
+
+class JobCancelled(Exception):
+    """実行中のジョブがキャンセルされたことを表す例外"""
+
+
+class JobContext:
+    """ハンドラーに渡す、キャンセル確認用のコンテキスト"""
+
+    def __init__(self, queue, job_id):
+        self._queue = queue
+        self.job_id = job_id
+
+    def cancelled(self):
+        return self._queue.cancel_requested(self.job_id)
+
+    def check_cancelled(self):
+        """キャンセルが要求されていれば JobCancelled を送出する（処理の区切りで呼ぶ）"""
+        if self.cancelled():
+            raise JobCancelled()
+
+
+class JobQueue:
+    """SQLiteに保存するジョブキューと、それを処理するワーカースレッド"""
+
+    def __init__(self, handlers, path=DEFAULT_DB_PATH):
+        self.handlers = handlers
+        self.path = path
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._recover_lock = threading.Lock()
+        self._last_recover = 0.0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL,"
+                " status TEXT NOT NULL, result TEXT, error TEXT,"
+                " cancel_requested INTEGER NOT NULL DEFAULT 0, worker TEXT,"
+                " created_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+            # 以前のバージョンで作ったDBには、ワーカーのプロセスと応答時刻の列がない
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, column_type in (("host", "TEXT"), ("pid", "INTEGER"), ("heartbeat_at", "REAL")):
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {column_type}")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # スレッドをまたいで使えるよう、操作ごとに接続を開いて閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # --- 投入・参照・キャンセル ---
+
+    def submit(self, kind, params):
+        """ジョブを登録してIDを返す"""
+        if kind not in self.handlers:
+            raise ValueError(f"未対応のジョブです: {kind}")
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs(id, kind, params, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params, ensure_ascii=False), now),
+            )
+            placeholders = ", ".join("?" * len(FINISHED_STATUSES))
+            conn.execute(
+                f"DELETE FROM jobs WHERE status IN ({placeholders}) AND finished_at < ?",
+                (*FINISHED_STATUSES, now - RETENTION_SECONDS),
+            )
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """ジョブの状態と結果を辞書で返す（存在しなければNone）"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    def cancel(self, job_id):
+        """待機中のジョブは即座に、実行中のジョブは次の区切りでキャンセルする"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            )
+            conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+
+    def cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def recover(self, lease_seconds=LEASE_SECONDS):
+        """実行途中でワーカーが終了したジョブを待機中に戻す（戻したジョブの数を返す）
+
+        応答時刻が lease_seconds 以上前のジョブと、同じホストで取り出したプロセスが
+        すでに終了しているジョブが対象です。キャンセルが要求されていたジョブはキャンセル済みにします。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, host, pid, cancel_requested, COALESCE(heartbeat_at, started_at, 0) AS heartbeat_at"
+                " FROM jobs WHERE status = 'running'"
+            ).fetchall()
+            orphaned = [
+                row for row in rows
+                if row["heartbeat_at"] < now - lease_seconds
+                or (row["host"] == HOSTNAME and row["pid"] is not None and not _process_alive(row["pid"]))
+            ]
+            for row in orphaned:
+                # 判定の後に他のプロセスが終了させたジョブは変えない
+                if row["cancel_requested"]:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'running'",
+                        (now, row["id"]),
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'queued', worker = NULL, host = NULL, pid = NULL,"
+                        " started_at = NULL, heartbeat_at = NULL WHERE id = ? AND status = 'running'",
+                        (row["id"],),
+                    )
+        return len(orphaned)
+
+    def _recover_periodically(self):
+        """待機中のワーカーから、RECOVER_INTERVAL_SECONDS に1回だけ recover を行う"""
+        with self._recover_lock:
+            if time.monotonic() - self._last_recover < RECOVER_INTERVAL_SECONDS:
+                return
+            self._last_recover = time.monotonic()
+        self.recover()
+
+    # --- ワーカー ---
+
+    def _claim(self, worker_name):
+        """待機中のジョブを1件取り出して実行中にする（複数プロセスから呼んでも重複しない）"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            claimed = conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, host = ?, pid = ?, started_at = ?, heartbeat_at = ?"
+                " WHERE id = ? AND status = 'queued'",
+                (worker_name, HOSTNAME, os.getpid(), now, now, row["id"]),
+            ).rowcount
+        return self.get(row["id"]) if claimed else None
+
+    def _heartbeat(self, job_id, finished):
+        """ジョブの実行中、HEARTBEAT_SECONDS ごとに応答時刻を更新する（finished がセットされるまで）"""
+        while not finished.wait(HEARTBEAT_SECONDS):
+            try:
+                with self._connect() as conn:
+                    conn.execute(
+                        "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'", (time.time(), job_id)
+                    )
+            except sqlite3.Error:
+                pass  # 一時的なロック待ちなどは次の更新で取り戻す
+
+    def _finish(self, job_id, status, result=None, error=None):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None,
+                 error, time.time(), job_id),
+            )
+
+    def run_one(self, worker_name="worker"):
+        """ジョブを1件実行する。実行するジョブがなければFalseを返す"""
+        job = self._claim(worker_name)
+        if job is None:
+            return False
+        context = JobContext(self, job["id"])
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job["id"], finished), daemon=True)
+        heartbeat.start()
+        try:
+            result = self.handlers[job["kind"]](job["params"], context)
+            context.check_cancelled()
+        except (JobCancelled, CancelledError):
+            self._finish(job["id"], "cancelled")
+        except Exception as e:
+            # キャンセルで途中の処理が打ち切られた場合のエラーは、失敗ではなくキャンセルとして扱う
+            self._finish(job["id"], "cancelled" if context.cancelled() else "failed", error=str(e))
+        else:
+            self._finish(job["id"], "done", result=result)
+        finally:
+            finished.set()
+        return True
+
+    def _work_loop(self, worker_name):
+        while not self._stop.is_set():
+            if not self.run_one(worker_name):
+                self._recover_periodically()
+                self._wakeup.wait(POLL_SECONDS)
+                self._wakeup.clear()
+
+    def start_workers(self, count=DEFAULT_WORKERS):
+        """デーモンスレッドのワーカーを起動する"""
+        prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        for i in range(count):
+            thread = threading.Thread(target=self._work_loop, args=(f"{prefix}-{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop_workers(self):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="バックグラウンドジョブのワーカーを起動します。")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="ワーカースレッド数")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="ジョブキューのSQLiteファイル")
+    args = parser.parse_args(argv)
+
+    import core
+    import job_handlers
+
+    if not core.configure_from_env():
+        parser.error("環境変数 GEMINI_API_KEY を設定してください。")
+
+    queue = JobQueue(job_handlers.HANDLERS, path=args.db)
+    recovered = queue.recover()
+    if recovered:
+        print(f"実行途中で止まっていたジョブを{recovered}件、待機中に戻しました。", flush=True)
+    queue.start_workers(args.workers)
+    print(f"ワーカーを{args.workers}件起動しました（DB: {args.db}）。Ctrl+Cで終了します。", flush=True)
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        queue.stop_workers()
+
+
+if __name__ == "__main__":
+    main()
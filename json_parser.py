@@ -0,0 +1,144 @@
+"""AIの応答テキストからJSONを取り出すインクリメンタルパーサー
+
+モデルの応答には、JSONの前後に説明文が付いていたり、```json のコードブロックに
+包まれていたり、文字列の中に { } が含まれていたりします。貪欲な正規表現 \\{.*\\} では
+「最初の { から最後の } まで」を取ってしまい、2つ目のオブジェクトや後ろの説明文に
+含まれる括弧で壊れます。
+
+このパーサーは文字列リテラルとエスケープを考慮して括弧の深さを数え、トップレベルの
+オブジェクト（または配列）が閉じた時点でその範囲だけを解析します。ストリーミングの
+チャンクを順に feed() すれば、最初のオブジェクトが閉じた時点で結果が得られます
+（最後に close() を呼ぶと、閉じないまま終わった候補の後ろからも探します）。
+"""
+
+import json
+
+_OPENERS = {"{": "}", "[": "]"}
+
+
+class IncrementalJSONParser:
+    """テキストを少しずつ受け取り、最初に完成したJSONの値を取り出す
+
+    候補（開き括弧から始まる範囲）が壊れていた場合は、その開き括弧の次の文字から探し直します。
+    ストリーミングでは途中のチャンクで閉じていないだけのこともあるため、閉じないまま終わった
+    候補の探し直しは、入力の終わりを知らせる close() で行います。
+    """
+
+    def __init__(self, allow_arrays=False):
+        self.allow_arrays = allow_arrays
+        self.result = None
+        self.done = False
+        self._text = ""
+        self._pos = 0          # 次に読む位置
+        self._start = None     # 現在の候補の開き括弧の位置
+        self._stack = []       # (閉じ括弧, 開き括弧の位置)
+        self._in_string = False
+        self._escaped = False
+        # 解析できないことが分かっている開き括弧の位置（探し直すときに候補にしない）
+        self._doomed = set()
+
+    def feed(self, chunk):
+        """テキストを追加する。JSONが完成していれば done が True になる"""
+        if not self.done:
+            self._text += chunk
+            self._scan()
+        return self
+
+    def close(self):
+        """入力の終わりを知らせる。閉じないまま残った候補を捨てて、後ろから探し直す"""
+        while not self.done and self._stack:
+            # 候補の中でまだ開いている括弧は、そこから読み直しても閉じないまま終わる
+            self._doomed.update(position for _, position in self._stack)
+            self._restart()
+            self._scan()
+        return self
+
+    def _restart(self):
+        """現在の候補を捨て、その開き括弧の次の文字から探し直す"""
+        self._pos = self._start + 1
+        self._start = None
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+
+    def _scan(self):
+        text = self._text
+        while self._pos < len(text) and not self.done:
+            pos = self._pos
+            char = text[pos]
+            self._pos += 1
+            if not self._stack:
+                # トップレベルの値が始まるまでは説明文として読み飛ばす
+                if (char == "{" or (char == "[" and self.allow_arrays)) and pos not in self._doomed:
+                    self._start = pos
+                    self._stack.append((_OPENERS[char], pos))
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+            elif char in _OPENERS:
+                self._stack.append((_OPENERS[char], pos))
+            elif char in "}]":
+                if char != self._stack[-1][0]:
+                    # 括弧の対応が壊れている候補は捨てる。まだ開いている括弧から読み直しても、
+                    # 同じ位置で同じように壊れるので候補にしない
+                    self._doomed.update(position for _, position in self._stack)
+                    self._restart()
+                    continue
+                self._stack.pop()
+                if not self._stack:
+                    self._finish(text[self._start:pos + 1])
+
+    def _finish(self, candidate):
+        try:
+            self.result = json.loads(candidate)
+        except ValueError:
+            try:
+                # よくある崩れ（末尾のカンマ）だけは補正して読む
+                self.result = json.loads(_strip_trailing_commas(candidate))
+            except ValueError:
+                self._restart()
+                return
+        self.done = True
+
+
+def _strip_trailing_commas(text):
+    """文字列リテラルの外にある「, }」「, ]」のカンマを取り除く"""
+    out = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "}]":
+            # 直前の空白を飛ばしてカンマがあれば削除する
+            index = len(out) - 1
+            while index >= 0 and out[index].isspace():
+                index -= 1
+            if index >= 0 and out[index] == ",":
+                del out[index]
+        out.append(char)
+    return "".join(out)
+
+
+def extract_json(text, allow_arrays=False):
+    """テキストから最初に完成したJSONオブジェクト（allow_arrays=True なら配列も）を返す。無ければNone"""
+    if not text:
+        return None
+    parser = IncrementalJSONParser(allow_arrays=allow_arrays).feed(text).close()
+    return parser.result if parser.done else None
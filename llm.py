@@ -0,0 +1,211 @@
+"""Gemini API呼び出しの共通処理（Streamlitに依存しない）
+
+UI側（app.py）からも、ワーカースレッドやバッチ処理からも同じように使えるよう、
+エラーは例外としてそのまま呼び出し元に返します。
+google.generativeai は読み込みに1秒ほどかかるため、最初にAPIを呼ぶときまで読み込みません。
+呼び出しごとの所要時間・トークン数・推定コスト・キャッシュ利用は telemetry に記録します。
+一時的なエラーの再試行、同時実行数の自動調整、サーキットブレーカーは resilience が担当し、
+プロセス内のすべての呼び出し（UI・ジョブ・バッチ）で同じ制御を共有します。
+"""
+
+import functools
+import itertools
+import time
+
+import json_parser
+import resilience
+import telemetry
+from gemini_cache import make_cache_key
+
+# 使用するGeminiモデル
+MODEL_NAME = "gemini-2.5-flash"
+# 1回のリクエストのタイムアウト（秒）。超えた場合は再試行の対象になる
+REQUEST_TIMEOUT = 90
+
+RETRY_POLICY = resilience.RetryPolicy()
+_limiter = resilience.AdaptiveLimiter()
+_breaker = resilience.CircuitBreaker()
+
+
+def _genai():
+    import google.generativeai as genai
+    return genai
+
+
+def configure(api_key):
+    """APIキーを設定する（キャッシュ済みのモデルは作り直す）"""
+    _genai().configure(api_key=api_key)
+    get_model.cache_clear()
+
+
+@functools.lru_cache(maxsize=None)
+def get_model(model_name=MODEL_NAME):
+    """モデルのクライアントをプロセス内で使い回す（呼び出しのたびに作り直さない）"""
+    return _genai().GenerativeModel(model_name)
+
+
+def flow_control_stats():
+    """同時実行数の上限・実行中の件数・429の回数と、サーキットの状態"""
+    return dict(_limiter.stats(), circuit=_breaker.state)
+
+
+def _send(request, before_request=None, keep_slot=False):
+    """request() を再試行・同時実行数の制御・サーキットブレーカー付きで実行し、(結果, 再試行の回数) を返す
+
+    失敗した場合は例外に retries 属性を付けて送出します。
+    """
+    retries = []
+
+    def on_retry(error, delay):
+        retries.append(delay)
+
+    try:
+        result = resilience.call_with_retry(
+            request, RETRY_POLICY, _limiter, _breaker,
+            before_attempt=before_request, on_retry=on_retry, keep_slot=keep_slot,
+        )
+    except Exception as e:
+        e.retries = len(retries)
+        raise
+    return result, len(retries)
+
+
+def build_generation_config(json_mode=False):
+    """generate_contentに渡す生成設定を作る"""
+    config = {}
+    if json_mode:
+        config["response_mime_type"] = "application/json"
+    return config
+
+
+def parse_json_response(text):
+    """応答テキストからJSONオブジェクトを取り出す。見つからなければNone"""
+    with telemetry.timer("parse", format="json", chars=len(text or "")):
+        return json_parser.extract_json(text)
+
+
+def usage_fields(response, model_name=MODEL_NAME):
+    """応答の usage_metadata からトークン数と推定コストを取り出す（無ければ空の辞書）"""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return {}
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    # 思考トークンも出力として課金される
+    output_tokens = (getattr(usage, "candidates_token_count", 0) or 0) + (getattr(usage, "thoughts_token_count", 0) or 0)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "output_tokens": output_tokens,
+        "cost_usd": round(telemetry.estimate_cost(model_name, prompt_tokens, output_tokens), 8),
+    }
+
+
+def _record_call(started, stage, cache, json_mode, stream=False, **fields):
+    telemetry.record(
+        "llm", stage,
+        duration_ms=round((time.perf_counter() - started) * 1000, 2),
+        model=MODEL_NAME, cache=cache, json_mode=json_mode, stream=stream,
+        retries=fields.pop("retries", 0), status=fields.pop("status", "ok"), **fields,
+    )
+
+
+def _cacheable(text, json_mode):
+    """キャッシュしてよい応答か（json_mode では、途中で切れた・壊れたJSONを保存しない）"""
+    return not json_mode or json_parser.extract_json(text) is not None
+
+
+def generate_text(prompt, json_mode=False, cache=None, use_cache=True, before_request=None, stage=None):
+    """プロンプトを送信して応答テキストを返す（キャッシュがあれば優先）
+
+    before_request を渡すと、実際にAPIへ送信する直前に呼び出します（レート制限用）。
+    stage を省略した場合は telemetry.stage() で設定されたステージとして記録します。
+    json_mode の応答は、JSONとして読めるものだけをキャッシュします（再試行で同じ壊れた応答を返さないため）。
+    """
+    started = time.perf_counter()
+    config = build_generation_config(json_mode)
+    cache_key = make_cache_key(MODEL_NAME, prompt, config, json_mode)
+    if cache is not None and use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            if _cacheable(cached, json_mode):
+                _record_call(started, stage, "hit", json_mode)
+                return cached
+            cache.delete(cache_key)  # 以前のバージョンで保存された壊れた応答は捨てて取り直す
+
+    cache_state = "miss" if use_cache else "bypass"
+    model = get_model(MODEL_NAME)
+
+    def request():
+        response = model.generate_content(
+            prompt, generation_config=config, request_options={"timeout": REQUEST_TIMEOUT}
+        )
+        return response, response.text
+
+    try:
+        (response, text), retries = _send(request, before_request)
+    except Exception as e:
+        _record_call(started, stage, cache_state, json_mode, retries=getattr(e, "retries", 0),
+                     status="error", error=f"{type(e).__name__}: {e}")
+        raise
+    _record_call(started, stage, cache_state, json_mode, retries=retries, **usage_fields(response))
+    # バイパス時も最新の応答でキャッシュを更新しておく
+    if cache is not None and _cacheable(text, json_mode):
+        cache.set(cache_key, text)
+    return text
+
+
+def stream_text(prompt, cache=None, use_cache=True, stage=None):
+    """生成中のテキストをチャンクごとに返すジェネレーター
+
+    最初のチャンクを受け取るまでに起きた一時的なエラーは再試行します
+    （表示を始めたあとのエラーは、そのまま呼び出し元に送出します）。
+    """
+    started = time.perf_counter()
+    config = build_generation_config()
+    cache_key = make_cache_key(MODEL_NAME, prompt, config, False)
+    if cache is not None and use_cache:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            _record_call(started, stage, "hit", False, stream=True)
+            yield cached
+            return
+
+    cache_state = "miss" if use_cache else "bypass"
+    model = get_model(MODEL_NAME)
+
+    def open_stream():
+        stream = iter(model.generate_content(
+            prompt, generation_config=config, stream=True, request_options={"timeout": REQUEST_TIMEOUT}
+        ))
+        first = next(stream, None)
+        return stream, ([first] if first is not None else [])
+
+    chunks = []
+    usage = {}
+    first_chunk_ms = None
+    retries = 0
+    holding_slot = False
+    try:
+        # 読み終えるまで同時実行数の枠を使い続ける（途中で止められても finally で返す）
+        (stream, head), retries = _send(open_stream, keep_slot=True)
+        holding_slot = True
+        for chunk in itertools.chain(head, stream):
+            # 使用量は最後のチャンクに累計で入っている
+            usage = usage_fields(chunk) or usage
+            text = chunk.text
+            if text:
+                if first_chunk_ms is None:
+                    first_chunk_ms = round((time.perf_counter() - started) * 1000, 2)
+                chunks.append(text)
+                yield text
+    except Exception as e:
+        _record_call(started, stage, cache_state, False, stream=True, retries=getattr(e, "retries", retries),
+                     status="error", error=f"{type(e).__name__}: {e}")
+        raise
+    finally:
+        if holding_slot:
+            _limiter.release()
+    _record_call(started, stage, cache_state, False, stream=True, retries=retries,
+                 first_chunk_ms=first_chunk_ms, **usage)
+    # 途中で停止された場合はここに到達しないため、完成した本文だけがキャッシュされる
+    if cache is not None:
+        cache.set(cache_key, "".join(chunks))
@@ -0,0 +1,285 @@
+"""同じサイト内の近似重複ページとカニバリゼーション（同じキーワードを狙うページどうしの競合）の検出
+
+ページを1件ずつ add() し、本文そのものは保持せずに小さな署名だけを残します。
+
+- 近似重複: 本文を文字5-gram（日本語は単語の区切りがないため）の集合にして MinHash 署名を作り、
+  推定 Jaccard 係数が DUPLICATE_THRESHOLD 以上のペアを「重複」とします。
+  テンプレート（全ページに入る定型文）が類似度を押し上げないよう、最初の COMMON_SAMPLE_PAGES ページで
+  多くのページに出る5-gram を求め、署名を作る前に取り除きます（それまでのページの5-gram だけは一時的に保持します）。
+- カニバリゼーション: タイトルと本文の頻出語（seo_metrics.tokenize）の上位 KEY_TERMS 語を
+  そのページが狙う語とみなし、その集合の Jaccard 係数が TOPIC_THRESHOLD 以上のペアを「競合」とします。
+  サイト内の半数以上のページに出る語（サイト名など）は比較から外します。
+
+どちらも LSH（署名をバンドに分けてバケットに入れる）で候補のペアだけを比べるため、
+処理時間はページ数に対してほぼ線形です。最後に、重複・競合でつながったページをクラスターにまとめます。
+"""
+
+import zlib
+from collections import Counter, defaultdict
+
+import seo_metrics
+
+NUM_PERMUTATIONS = 128
+SHINGLE_SIZE = 5
+DUPLICATE_THRESHOLD = 0.5       # 推定 Jaccard 係数（本文の文字5-gram）
+TOPIC_THRESHOLD = 0.3           # 狙っている語の集合の Jaccard 係数
+KEY_TERMS = 20
+MIN_TERM_CHARS = 2
+COMMON_TERM_RATIO = 0.5         # これ以上の割合のページに出る語はサイト共通の語として扱う
+MIN_COMMON_TERM_PAGES = 10      # ページが少ないうちは、共通の語かどうかを判定しない
+COMMON_SAMPLE_PAGES = 100       # テンプレートの5-gram を求めるのに使うページ数
+MIN_UNIQUE_SHINGLES = 20        # テンプレートを除くとこれより少なくなるページは、テンプレートごと比べる
+MIN_TEXT_CHARS = 200            # これより短いページは比較しない
+TITLE_MAX_CHARS = 60
+# LSH のバンド分割（バンド数 × 行数 = NUM_PERMUTATIONS）。しきい値付近でも候補に入るよう余裕を持たせる
+DUPLICATE_BANDS = 32            # 4行ずつ: Jaccard 0.42 付近から候補になる
+TOPIC_BANDS = 64                # 2行ずつ: Jaccard 0.13 付近から候補になる
+
+_SHINGLE_CHUNK = 4096
+_PAIR_CHUNK = 4096
+_MASK32 = (1 << 32) - 1
+
+
+def _hash_functions(seed=1):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    # multiply-shift 方式のハッシュ関数族（a は奇数）
+    a = rng.integers(1, 1 << 63, NUM_PERMUTATIONS, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, NUM_PERMUTATIONS, dtype=np.uint64)
+    return a, b
+
+
+_functions = None
+
+
+def minhash(hashes):
+    """32ビットのハッシュ値の配列から MinHash 署名（uint32 × NUM_PERMUTATIONS）を作る"""
+    import numpy as np
+
+    global _functions
+    if _functions is None:
+        _functions = _hash_functions()
+    a, b = _functions
+    signature = np.full(NUM_PERMUTATIONS, _MASK32, dtype=np.uint64)
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    # 長い本文でも一時配列が大きくならないよう、区切って最小値を取る
+    for start in range(0, len(hashes), _SHINGLE_CHUNK):
+        chunk = hashes[start:start + _SHINGLE_CHUNK, None]
+        values = (chunk * a + b) >> np.uint64(32)
+        np.minimum(signature, values.min(axis=0), out=signature)
+    return signature.astype(np.uint32)
+
+
+def ngram_hashes(text, size):
+    """正規化した本文（空白を除く）の文字 size-gram を、出現位置ごとに64ビットのハッシュ値にする"""
+    import numpy as np
+
+    text = "".join(seo_metrics.normalize(text).split())
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    if len(codes) < size:
+        return np.zeros(0, dtype=np.uint64)
+    # 多項式ハッシュ（2^64 で桁あふれさせる）を全位置についてまとめて計算する
+    hashes = np.full(len(codes) - size + 1, size, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * np.uint64(1_000_003) + codes[offset:len(codes) - size + 1 + offset]
+    # 短い n-gram は桁あふれせず上位ビットが偏るので、splitmix64 の仕上げでビットを混ぜる
+    hashes ^= hashes >> np.uint64(30)
+    hashes *= np.uint64(0xBF58476D1CE4E5B9)
+    hashes ^= hashes >> np.uint64(27)
+    hashes *= np.uint64(0x94D049BB133111EB)
+    hashes ^= hashes >> np.uint64(31)
+    return hashes
+
+
+def shingle_hashes(text, size=SHINGLE_SIZE):
+    """本文の文字 size-gram の集合を32ビットのハッシュ値の配列にする"""
+    import numpy as np
+
+    return np.unique(ngram_hashes(text, size) >> np.uint64(32))
+
+
+def term_hashes(terms):
+    import numpy as np
+
+    return np.array([zlib.crc32(term.encode("utf-8")) for term in terms], dtype=np.uint64)
+
+
+def key_terms(text, title="", limit=KEY_TERMS):
+    """ページが狙っている語の候補（タイトルの語を優先し、本文の頻出語で補う）"""
+    terms = list(dict.fromkeys(t for t in seo_metrics.tokenize(title) if len(t) >= MIN_TERM_CHARS))
+    counts = Counter(t for t in seo_metrics.tokenize(text) if len(t) >= MIN_TERM_CHARS and t not in terms)
+    return (terms + [term for term, _ in counts.most_common(limit)])[:limit]
+
+
+def _title(text):
+    first_line = text.strip().split("\n", 1)[0].strip()
+    return first_line[:TITLE_MAX_CHARS]
+
+
+class _LSHBuckets:
+    """署名をバンドに分け、同じバケットに入った過去のページを候補として返す"""
+
+    def __init__(self, bands):
+        self.bands = bands
+        self.rows = NUM_PERMUTATIONS // bands
+        self._buckets = defaultdict(list)
+
+    def add(self, index, signature):
+        candidates = set()
+        for band in range(self.bands):
+            key = (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            bucket = self._buckets[key]
+            candidates.update(bucket)
+            bucket.append(index)
+        return candidates
+
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        self.parent.setdefault(item, item)
+        while self.parent[item] != item:
+            self.parent[item] = self.parent[self.parent[item]]
+            item = self.parent[item]
+        return item
+
+    def union(self, a, b):
+        self.parent[self.find(a)] = self.find(b)
+
+
+class SiteSimilarity:
+    """ページを1件ずつ受け取り、近似重複と競合のクラスターを求める"""
+
+    def __init__(self):
+        self.pages = []
+        self.skipped = 0
+        self._text_signatures = []
+        self._term_sets = []
+        self._term_pages = Counter()
+        self._pending = []                  # テンプレートが決まる前のページの5-gram
+        self._template_shingles = None
+        self._template_terms = frozenset()
+        self._duplicate_buckets = _LSHBuckets(DUPLICATE_BANDS)
+        self._topic_buckets = _LSHBuckets(TOPIC_BANDS)
+        self._duplicate_candidates = set()
+        self._topic_candidates = set()
+
+    def add(self, url, text):
+        """ページを追加する（短すぎて比較できないページは数えるだけで追加しない）"""
+        if not text or len(text) < MIN_TEXT_CHARS:
+            self.skipped += 1
+            return False
+        title = _title(text)
+        terms = key_terms(text, title)
+        self.pages.append({"url": url, "title": title, "chars": len(text)})
+        self._term_sets.append(frozenset(terms))
+        self._term_pages.update(set(terms))
+
+        shingles = shingle_hashes(text)
+        if self._template_shingles is None:
+            self._pending.append(shingles)
+            if len(self._pending) >= COMMON_SAMPLE_PAGES:
+                self._settle_template()
+        else:
+            self._index(len(self.pages) - 1, shingles)
+        return True
+
+    def _common_limit(self, pages):
+        return max(MIN_COMMON_TERM_PAGES, COMMON_TERM_RATIO * pages)
+
+    def _settle_template(self):
+        """ここまでのページで多くのページに出る5-gram・語をテンプレートとし、保留していたページを登録する"""
+        import numpy as np
+
+        pending, self._pending = self._pending, []
+        values, counts = np.unique(np.concatenate(pending), return_counts=True)
+        self._template_shingles = values[counts >= self._common_limit(len(pending))]
+        self._template_terms = frozenset(self._common_terms())
+        for index, shingles in enumerate(pending):
+            self._index(index, shingles)
+
+    def _index(self, index, shingles):
+        import numpy as np
+
+        unique = np.setdiff1d(shingles, self._template_shingles, assume_unique=True)
+        # テンプレートだけのページどうしは、テンプレートごと比べれば重複として見つかる
+        text_signature = minhash(unique if len(unique) >= MIN_UNIQUE_SHINGLES else shingles)
+        self._text_signatures.append(text_signature)
+        for other in self._duplicate_buckets.add(index, text_signature):
+            self._duplicate_candidates.add((other, index))
+        terms = self._term_sets[index] - self._template_terms
+        for other in self._topic_buckets.add(index, minhash(term_hashes(terms))):
+            self._topic_candidates.add((other, index))
+
+    def _common_terms(self):
+        limit = self._common_limit(len(self.pages))
+        return {term for term, count in self._term_pages.items() if count >= limit}
+
+    def pairs(self):
+        """しきい値を超えたペアを [(i, j, "duplicate" / "cannibalization", 類似度)] で返す"""
+        import numpy as np
+
+        if self._pending:
+            self._settle_template()
+        found = {}
+        candidates = sorted(self._duplicate_candidates)
+        if candidates:
+            signatures = np.stack(self._text_signatures)
+            # 同じバケットに入ったペアはすべて比べる（一時配列が大きくならないよう区切る）
+            for start in range(0, len(candidates), _PAIR_CHUNK):
+                chunk = candidates[start:start + _PAIR_CHUNK]
+                left, right = np.array(chunk).T
+                similarities = (signatures[left] == signatures[right]).mean(axis=1)
+                for (i, j), similarity in zip(chunk, similarities.tolist()):
+                    if similarity >= DUPLICATE_THRESHOLD:
+                        found[(i, j)] = ("duplicate", similarity)
+
+        common = self._common_terms()
+        for i, j in self._topic_candidates - set(found):
+            a, b = self._term_sets[i] - common, self._term_sets[j] - common
+            if not a or not b:
+                continue
+            similarity = len(a & b) / len(a | b)
+            if similarity >= TOPIC_THRESHOLD:
+                found[(i, j)] = ("cannibalization", similarity)
+        return [(i, j, reason, similarity) for (i, j), (reason, similarity) in found.items()]
+
+    def shared_terms(self, indices, limit=3):
+        """クラスター内の複数ページが共通して狙っている語（多くのページに出る順）"""
+        common = self._common_terms()
+        counts = Counter(term for i in indices for term in self._term_sets[i] - common)
+        in_titles = Counter(term for i in indices for term in set(seo_metrics.tokenize(self.pages[i]["title"])))
+        # 同じ数のページに出る語なら、タイトルに多く出る語・長い語（複合語）を優先する
+        ranked = sorted(counts, key=lambda term: (-counts[term], -in_titles[term], -len(term)))
+        return [term for term in ranked if counts[term] >= 2][:limit]
+
+    def clusters(self):
+        """重複・競合でつながったページのクラスターを、ページ数の多い順に返す"""
+        union = _UnionFind()
+        edges = defaultdict(list)
+        for i, j, reason, similarity in self.pairs():
+            union.union(i, j)
+            edges[i].append((reason, similarity))
+            edges[j].append((reason, similarity))
+
+        groups = defaultdict(list)
+        for index in edges:
+            groups[union.find(index)].append(index)
+
+        clusters = []
+        for indices in groups.values():
+            indices.sort()
+            reasons = [reason for i in indices for reason, _ in edges[i]]
+            terms = self.shared_terms(indices)
+            clusters.append({
+                "reason": "duplicate" if "duplicate" in reasons else "cannibalization",
+                "similarity": round(max(similarity for i in indices for _, similarity in edges[i]), 3),
+                "keyword": terms[0] if terms else "",
+                "shared_terms": terms,
+                "pages": [self.pages[i] for i in indices],
+            })
+        clusters.sort(key=lambda c: (-len(c["pages"]), -c["similarity"]))
+        return clusters
@@ -0,0 +1,166 @@
+"""記事生成パイプラインの各ステージ（Streamlitに依存しない）
+
+プロンプトの組み立てと応答の解釈だけを担当し、実際のAPI呼び出しは
+引数で受け取る generate(prompt, json_mode=False) に任せます。
+UI（app.py）とバッチ処理（batch_pipeline.py）の両方から使われます。
+プロンプトに入れる本文は prompt_budget でステージごとのトークン予算に収めます。
+"""
+
+import json
+
+import llm
+import prompt_budget
+import revision
+import seo_metrics
+
+STAGES = ("outline", "body", "meta", "check", "revise")
+
+
+# --- プロンプトの組み立て ---
+
+def build_outline_prompt(keyword, intent, num_h2):
+    return f"""
+    あなたはプロのSEOコンテンツストラテジストであり、人気ブログの編集長です。
+    ユーザーが指定したキーワードと検索意図に基づき、SEOで上位表示を目指すための、論理的で網羅性の高い記事の骨子（アウトライン）をJSON形式で生成してください。
+    【メインキーワード】{keyword}
+    【検索意図】{intent}
+    【H2の数】{num_h2}個
+    【出力形式】 {{"article_title_H1": "記事タイトル", "outline": [ {{"H2": "見出し", "H3": ["小見出し", ...]}}, ... ] }}
+    """
+
+
+def build_body_prompt(outline_data):
+    outline_text = json.dumps(outline_data, ensure_ascii=False, indent=2)
+    return f"""
+    あなたはプロのSEOライターです。以下の骨子に厳密に従い、SEOに最適化された記事の本文を生成してください。
+    【ライティングルール】1. **合計約2000字**になるように記述。 2. H2/H3タグは**出力せず**、本文のみ記述。
+    【記事骨子】{outline_text}
+    """
+
+
+def build_meta_prompt(article_body):
+    excerpt = prompt_budget.fit(article_body, "meta")
+    return f"""
+    あなたは広告コピーライターであり、SEOスペシャリストです。
+    以下の記事本文の内容に基づき、検索結果のクリック率（CTR）を最大化するためのSEOメタ情報をJSON形式で生成してください。
+    【ルール】1. meta_title: 30文字〜35文字に収め、クリック率を高めること。 2. meta_description: 100文字〜120文字に収め、具体的に示し、クリックを促すこと。
+    【記事本文抜粋】{excerpt}
+    【出力形式】 {{"meta_title": "生成されたSEOタイトル", "meta_description": "生成されたメタディスクリプション"}}
+    """
+
+
+# AIに評価させる主観的な項目（数値で判定できる項目は seo_metrics で計算する）
+SUBJECTIVE_CHECK_ITEMS = ("網羅性・深さ", "検索意図との一致", "読みやすさ・論理構成", "独自性・信頼性（E-E-A-T）")
+
+
+def build_check_prompt(article_body, keyword, local_summary=None):
+    items = "、".join(SUBJECTIVE_CHECK_ITEMS)
+    measured = f"\n    【計算済みの指標（評価不要）】: {local_summary}" if local_summary else ""
+    excerpt = prompt_budget.fit(article_body, "check", keyword)
+    return f"""
+    あなたは厳格なSEO監査官です。以下の記事本文とターゲットキーワードに基づき、記事の改善点を指摘するチェックリストをJSON形式で生成してください。
+    【ターゲットキーワード】: {keyword}
+    【記事本文】: {excerpt}{measured}
+    【評価項目】以下の{len(SUBJECTIVE_CHECK_ITEMS)}つの項目（{items}）について、改善の必要性を評価してください。文字数やキーワード出現数などの数値は評価しないでください。
+    【出力形式】 {{ "seo_checklist": [ {{"item": "網羅性・深さ", "evaluation": "...", "status": "OK" / "要改善", "suggestion": "..."}}, ... ] }}
+    """
+
+
+def collect_improvement_items(seo_check_data):
+    """チェックリストから、本文の修正で対応できる「要改善」の項目を取り出す"""
+    return [
+        item for item in seo_check_data.get("seo_checklist", [])
+        # メタ情報の指摘は本文の修正では直せないので除外する
+        if item.get("status") == "要改善" and item.get("scope", "body") == "body"
+    ]
+
+
+def collect_improvements(seo_check_data):
+    """チェックリストから「要改善」の項目を箇条書きで取り出す"""
+    return [f"- {item.get('item')}: {item.get('suggestion')}" for item in collect_improvement_items(seo_check_data)]
+
+
+def build_revision_prompt(original_body, improvements):
+    improvement_text = '\n'.join(improvements)
+    return f"""
+    あなたはプロのSEOライターです。
+    以下の「元の記事本文」を、[改善提案リスト]に記載されたすべての指摘を完璧に満たすように修正し、新しい記事本文（修正版）を生成してください。
+    【元の記事本文】 {original_body}
+    【改善提案リスト】 {improvement_text}
+    【ルール】1. 元の記事の構造を保ちながら、本文だけを修正。 2. 修正版の文字数は元の記事と大きく変わらないようにする。 3. プレーンテキスト形式で、修正後の記事本文のみを出力してください。
+    """
+
+
+# --- ステージの実行 ---
+
+def _generate_json(generate, prompt):
+    data = llm.parse_json_response(generate(prompt, json_mode=True))
+    if not data:
+        raise ValueError("AIの応答からJSONを取得できませんでした。")
+    return data
+
+
+def generate_outline(keyword, intent, num_h2, generate):
+    """記事の骨子（JSON）を生成する"""
+    return _generate_json(generate, build_outline_prompt(keyword, intent, num_h2))
+
+
+def generate_body(outline_data, generate):
+    """骨子に沿って記事本文を生成する"""
+    return generate(build_body_prompt(outline_data))
+
+
+def generate_meta(article_body, generate):
+    """SEOメタ情報（タイトル、ディスクリプション）を生成する"""
+    return _generate_json(generate, build_meta_prompt(article_body))
+
+
+def local_seo_check(article_body, keyword, meta_data=None):
+    """AIを使わずに数値で判定できる項目だけのチェックリストを作る"""
+    metrics = seo_metrics.analyze(article_body, keyword, meta_data)
+    return metrics, seo_metrics.build_checklist(metrics)
+
+
+def merge_checklists(local_items, ai_data):
+    """ローカル分析の項目とAIの評価を1つの seo_checklist にまとめる"""
+    ai_items = (ai_data or {}).get("seo_checklist", [])
+    return {"seo_checklist": list(local_items) + [dict(item, source="ai") for item in ai_items]}
+
+
+def check_seo(article_body, keyword, generate, meta_data=None):
+    """記事本文をSEOチェックリストで評価する（数値項目はローカルで計算し、主観的な項目だけAIに任せる）"""
+    metrics, local_items = local_seo_check(article_body, keyword, meta_data)
+    prompt = build_check_prompt(article_body, keyword, seo_metrics.summarize(metrics))
+    return merge_checklists(local_items, _generate_json(generate, prompt))
+
+
+def fits_full_revision(original_body):
+    """全文をまとめて書き直せる長さ（revise の予算以内）かどうか"""
+    return prompt_budget.fits(original_body, "revise")
+
+
+def revise_article(original_body, seo_check_data, generate, keyword=""):
+    """「要改善」の指摘に基づいて本文を修正する。指摘がなければ元の本文を返す
+
+    本文が revise の予算を超える場合は、指摘に該当するセクションだけを書き直します。
+    """
+    improvements = collect_improvements(seo_check_data)
+    if not improvements:
+        return original_body
+    if not fits_full_revision(original_body):
+        revised_body, _ = revision.revise_sections(
+            original_body, collect_improvement_items(seo_check_data), keyword, generate
+        )
+        return revised_body
+    return generate(build_revision_prompt(original_body, improvements))
+
+
+def build_markdown_report(outline_data, meta_data, body):
+    """メタ情報・H1・本文をまとめたMarkdownを作る"""
+    report = "## SEOレポート\n\n"
+    if meta_data:
+        report += f"- SEOタイトル: {meta_data.get('meta_title', '')}\n"
+        report += f"- メタディスクリプション: {meta_data.get('meta_description', '')}\n\n"
+    if outline_data:
+        report += f"# {outline_data.get('article_title_H1')}\n\n"
+    return report + body
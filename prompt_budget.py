@@ -0,0 +1,171 @@
+"""プロンプトに入れる本文を、ステージごとのトークン予算に収める（Streamlitに依存しない）
+
+本文を先頭から文字数で切り落とすと、長い記事では後半の見出しやまとめが失われ、
+短い記事でも予算ぎりぎりまで送ってしまいます。ここではトークン数を見積もり、
+予算を超える場合だけ、見出し・導入とまとめ・各段落の最初の文・キーワードを含む文・
+記事全体でよく出る語を含む文を優先して残す抽出型の要約（condense）を行います。
+残した文は元の順番に並べ、削った箇所には「（中略）」を入れます。
+
+トークン数は API の count_tokens を呼ばずに手元で見積もります（日本語などの
+非ASCII文字は1文字1トークン、ASCIIは4文字で1トークン）。Gemini の実際の値より
+少し多めになるため、予算を超えて送ることはありません。
+
+予算は環境変数 SEO_STUDIO_PROMPT_BUDGETS（例: "meta=800,check=2500"）で変更できます。
+"""
+
+import math
+import os
+import re
+from collections import Counter
+
+import seo_metrics
+import telemetry
+
+# ステージごとの本文の予算（トークン）。プロンプトの指示文は含まない
+DEFAULT_BUDGETS = {
+    "meta": 1200,     # タイトルと説明文を書くには要旨が分かれば十分
+    "check": 2500,
+    "revise": 6000,   # 全文を書き直す上限。超える場合は部分修正に切り替える
+}
+GAP_MARKER = "（中略）"
+
+# 残す優先度の加点
+_HEADING_SCORE = 100.0     # 見出しは必ず残す
+_KEYWORD_BONUS = 3.0
+_LEAD_BONUS = 1.0          # 段落の最初の文（その段落の要旨であることが多い）
+_EDGE_BONUS = 1.5          # 導入とまとめの段落
+
+_NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+# 文末の記号を残したまま文に分ける
+_SENTENCE_RE = re.compile(r'[^。！？!?\n]+[。！？!?]*')
+_MARKDOWN_HEADING_RE = re.compile(r'^#{1,6}\s')
+_HEADING_MAX_CHARS = 40
+_SENTENCE_END_CHARS = "。！？!?、，,"
+
+
+def _load_budgets():
+    budgets = dict(DEFAULT_BUDGETS)
+    for item in os.environ.get("SEO_STUDIO_PROMPT_BUDGETS", "").split(","):
+        name, _, value = item.partition("=")
+        if name.strip() and value.strip().isdigit():
+            budgets[name.strip()] = int(value)
+    return budgets
+
+
+STAGE_BUDGETS = _load_budgets()
+
+
+def estimate_tokens(text):
+    """テキストのトークン数を見積もる（非ASCIIは1文字1トークン、ASCIIは4文字で1トークン）"""
+    if not text:
+        return 0
+    non_ascii = len(_NON_ASCII_RE.findall(text))
+    return non_ascii + math.ceil((len(text) - non_ascii) / 4)
+
+
+def budget_for(stage):
+    return STAGE_BUDGETS.get(stage)
+
+
+def fits(text, stage):
+    """本文がステージの予算に収まるかどうか"""
+    budget = budget_for(stage)
+    return budget is None or estimate_tokens(text) <= budget
+
+
+def _is_heading(paragraph):
+    if _MARKDOWN_HEADING_RE.match(paragraph):
+        return True
+    # 改行を含まない短い行で、文末の句読点で終わらないものを見出しとみなす
+    return "\n" not in paragraph and len(paragraph) <= _HEADING_MAX_CHARS and paragraph[-1] not in _SENTENCE_END_CHARS
+
+
+def _units(text):
+    """本文を (段落番号, 文, 見出しかどうか) のリストに分ける"""
+    units = []
+    for index, paragraph in enumerate(seo_metrics.split_paragraphs(text)):
+        if _is_heading(paragraph):
+            units.append((index, paragraph, True))
+            continue
+        for sentence in _SENTENCE_RE.findall(paragraph):
+            if sentence.strip():
+                units.append((index, sentence.strip(), False))
+    return units
+
+
+def _score_units(units, keyword):
+    frequencies = Counter(token for _, sentence, _ in units for token in seo_metrics.tokenize(sentence))
+    terms = [t for t in seo_metrics.normalize(keyword or "").split() if t]
+    last_paragraph = units[-1][0] if units else 0
+    scores = []
+    previous_paragraph = None
+    for paragraph, sentence, heading in units:
+        lead = paragraph != previous_paragraph
+        previous_paragraph = paragraph
+        if heading:
+            scores.append(_HEADING_SCORE)
+            continue
+        tokens = set(seo_metrics.tokenize(sentence))
+        # 1回しか出ない語は記事の主題とは関係が薄いので数えない
+        score = sum(math.log(frequencies[t]) for t in tokens) / math.sqrt(len(tokens) or 1)
+        normalized = seo_metrics.normalize(sentence)
+        if terms and any(term in normalized for term in terms):
+            score += _KEYWORD_BONUS
+        if lead:
+            score += _LEAD_BONUS
+        if paragraph in (0, last_paragraph):
+            score += _EDGE_BONUS
+        scores.append(score)
+    return scores
+
+
+def condense(text, budget, keyword=None):
+    """本文を budget トークン以内に要約する（収まる場合はそのまま返す）"""
+    if not text or budget is None:
+        return text or ""
+    source_tokens = estimate_tokens(text)
+    if source_tokens <= budget:
+        return text
+
+    with telemetry.timer("condense", source_tokens=source_tokens, budget=budget) as extra:
+        units = _units(text)
+        scores = _score_units(units, keyword)
+        gap_tokens = estimate_tokens(GAP_MARKER)
+        kept = set()
+        seen = set()
+        used = 0
+        # 同点なら前にある文を優先する
+        for i in sorted(range(len(units)), key=lambda i: (-scores[i], i)):
+            sentence = units[i][1]
+            cost = estimate_tokens(sentence) + gap_tokens
+            if sentence in seen or used + cost > budget:
+                continue  # 同じ文の繰り返しは1回だけ残す
+            kept.add(i)
+            seen.add(sentence)
+            used += cost
+
+        paragraphs = []
+        current = None
+        skipped = False
+        for i, (paragraph, sentence, _) in enumerate(units):
+            if i not in kept:
+                skipped = True
+                continue
+            if skipped:
+                paragraphs.append(GAP_MARKER)
+                current = None
+            skipped = False
+            if current is None or current[0] != paragraph:
+                current = (paragraph, [])
+                paragraphs.append(current)
+            current[1].append(sentence)
+        condensed = "\n\n".join(p if isinstance(p, str) else "".join(p[1]) for p in paragraphs)
+        if skipped:
+            condensed += "\n\n" + GAP_MARKER
+        extra["kept_tokens"] = estimate_tokens(condensed)
+    return condensed
+
+
+def fit(text, stage, keyword=None):
+    """ステージの予算に合わせて本文を要約する"""
+    return condense(text, budget_for(stage), keyword)
@@ -0,0 +1,37 @@
+"""クライアント側のトークンバケット型レートリミッター
+
+Gemini APIのクォータ（1分あたりのリクエスト数）を超えないよう、
+複数スレッドからの呼び出しをまとめて制御します。
+"""
+
+import threading
+import time
+
+
+class TokenBucket:
+    """1分あたり rate_per_minute 回まで、最大 burst 回の連続実行を許可するバケット"""
+
+    def __init__(self, rate_per_minute, burst=None):
+        if rate_per_minute <= 0:
+            raise ValueError("rate_per_minute には正の値を指定してください。")
+        self.rate_per_second = rate_per_minute / 60.0
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_minute // 6)))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate_per_second)
+        self.updated_at = now
+
+    def acquire(self, tokens=1.0):
+        """トークンが貯まるまで待ってから消費する"""
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate_per_second
+            time.sleep(wait)
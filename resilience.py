@@ -0,0 +1,277 @@
+"""Gemini呼び出しのリトライ・同時実行数の自動調整・サーキットブレーカー
+
+- 一時的なエラー（429 / 5xx / タイムアウト / 接続エラー）は、指数バックオフ＋ジッターで再試行します。
+  サーバーが待ち時間（retry-after / RetryInfo / "retry in Ns"）を示した場合はそれに従います。
+- 同時に送るリクエスト数は AIMD で調整します。成功するたびに少しずつ増やし、
+  429 を受けたら半分に減らすため、混雑時も全員が一斉に再試行してエラーが増えることを防ぎ、
+  クォータ付近のスループットを保ちます。
+- 5xx やタイムアウトが続いた場合はサーキットを開き、一定時間は送信せずにすぐ失敗させます。
+"""
+
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+# 再試行する HTTP ステータス（429 は混雑、5xx はサーバー側の一時的な障害）
+THROTTLE_STATUSES = (429,)
+RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+# google.api_core の例外名（ステータスコードを持たない場合の判定用）
+_RETRYABLE_NAMES = frozenset((
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable", "InternalServerError",
+    "DeadlineExceeded", "GatewayTimeout", "BadGateway", "RetryError",
+))
+_RETRY_IN_RE = re.compile(r'retry (?:in|after) ([\d.]+)\s*s', re.IGNORECASE)
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いているため、リクエストを送らずに失敗したことを表す例外"""
+
+    def __init__(self, retry_in):
+        super().__init__(f"AIサービスが不安定なため、送信を一時停止しています（{retry_in:.0f}秒後に再開します）。")
+        self.retry_in = retry_in
+
+
+class SlotTimeoutError(TimeoutError):
+    """同時実行数の枠が空くのを待つうちに、再試行を含めた上限時間を過ぎたことを表す例外"""
+
+    def __init__(self, waited):
+        super().__init__(f"AIサービスへの送信待ちが混み合っています（{waited:.0f}秒待っても順番が来ませんでした）。")
+        self.waited = waited
+
+
+# --- エラーの分類 ---
+
+def status_code(error):
+    """例外が表すHTTPステータスコード（分からなければNone）"""
+    code = getattr(error, "code", None)
+    if code is None:
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    try:
+        return int(code) if code is not None else None
+    except (TypeError, ValueError):
+        return None  # gRPC のステータスなど、HTTPのコードでないもの
+
+
+def is_throttle(error):
+    """レート制限（429）によるエラーかどうか"""
+    return status_code(error) in THROTTLE_STATUSES or type(error).__name__ in ("ResourceExhausted", "TooManyRequests")
+
+
+def is_retryable(error):
+    """時間をおけば成功する可能性があるエラーかどうか"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUSES
+    return type(error).__name__ in _RETRYABLE_NAMES
+
+
+def retry_after_seconds(error):
+    """サーバーが示した待ち時間（秒）。示されていなければNone"""
+    # gRPC の RetryInfo（google.api_core の例外の details に入る）
+    for detail in getattr(error, "details", None) or ():
+        delay = getattr(detail, "retry_delay", None)
+        if delay is not None and (getattr(delay, "seconds", 0) or getattr(delay, "nanos", 0)):
+            return delay.seconds + delay.nanos / 1e9
+    # HTTP の Retry-After ヘッダー（秒数の形式のみ）
+    response = getattr(error, "response", None)
+    header = getattr(response, "headers", {}).get("Retry-After") if response is not None else None
+    if header:
+        try:
+            return float(header)
+        except ValueError:
+            pass
+    match = _RETRY_IN_RE.search(str(error))
+    return float(match.group(1)) if match else None
+
+
+# --- リトライ方針 ---
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 5          # 初回を含めた最大試行回数
+    base_delay: float = 1.0        # バックオフの初期値（秒）
+    max_delay: float = 30.0        # 1回の待ち時間の上限（秒）
+    deadline: float = 120.0        # 再試行を含めた全体の上限（秒）
+
+    def backoff(self, attempt, error=None, rng=random):
+        """attempt 回目（0始まり）の失敗後の待ち時間（フルジッター。サーバーの指示があれば優先）"""
+        hinted = retry_after_seconds(error) if error is not None else None
+        if hinted is not None:
+            # 全員が同じ時刻に再送しないよう、指示された時間に少しだけ散らしを加える
+            return min(self.max_delay, hinted) + rng.uniform(0, self.base_delay)
+        return rng.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+# --- 同時実行数の自動調整（AIMD） ---
+
+class AdaptiveLimiter:
+    """429 を受けると半分に、成功が続くと1ずつ増える同時実行数の上限"""
+
+    def __init__(self, initial=8, minimum=1, maximum=32, decrease_factor=0.5, cooldown=1.0):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.throttled = 0
+        self._decreased_at = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """枠が空くまで待って1つ使う（timeout 秒を過ぎたら SlotTimeoutError を送出）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    # 受け取った通知を無駄にしないよう、次に待っているスレッドへ回す
+                    self._condition.notify()
+                    raise SlotTimeoutError(timeout)
+                self._condition.wait(remaining)
+            self.in_flight += 1
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def on_success(self):
+        with self._condition:
+            # 上限ぶんのリクエストが成功するとおよそ1増える（加算的増加）
+            previous = int(self.limit)
+            self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            if int(self.limit) > previous:
+                self._condition.notify()
+
+    def on_throttle(self):
+        with self._condition:
+            self.throttled += 1
+            now = time.monotonic()
+            # 同じ混雑で同時に返ってきた429で何度も減らさないよう、間隔をあける（乗算的減少）
+            if now - self._decreased_at >= self.cooldown:
+                self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                self._decreased_at = now
+
+    def stats(self):
+        with self._condition:
+            return {"limit": int(self.limit), "in_flight": self.in_flight, "throttled": self.throttled}
+
+
+# --- サーキットブレーカー ---
+
+class CircuitBreaker:
+    """サーバー側の障害が続いたら一定時間送信を止める（closed → open → half_open → closed）"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """送信してよいか確認する（止めている間は CircuitOpenError を送出）"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_running:
+                self._trial_running = True  # 様子見として1件だけ通す
+                return
+            raise CircuitOpenError(max(remaining, 0.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def release_trial(self):
+        """様子見の1件が成功・失敗のどちらとも判定できずに終わった場合に、次の1件を通せるようにする"""
+        with self._lock:
+            self._trial_running = False
+
+
+# --- 実行 ---
+
+def call_with_retry(func, policy=None, limiter=None, breaker=None, before_attempt=None, on_retry=None,
+                    keep_slot=False, sleep=time.sleep):
+    """func() を方針に従って再試行しながら実行し、その結果を返す
+
+    before_attempt は送信の直前に毎回呼ばれます（レート制限用）。on_retry(error, delay) は
+    再試行の前に呼ばれます。再試行できないエラーや上限に達した場合は最後の例外を送出します。
+    keep_slot=True の場合は成功しても limiter の枠を返さないので、ストリーミングを
+    読み終えたあとに呼び出し側で limiter.release() してください。
+    limiter の枠を待つのも policy.deadline までで、過ぎたら SlotTimeoutError を送出します。
+    """
+    policy = policy or RetryPolicy()
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            if before_attempt:
+                before_attempt()
+            if limiter is not None:
+                limiter.acquire(timeout=max(0.0, policy.deadline - (time.monotonic() - started)))
+        except BaseException:
+            if breaker is not None:
+                breaker.release_trial()  # 送信していないので、様子見の1件は次に回す
+            raise
+        succeeded = False
+        try:
+            result = func()
+            succeeded = True
+        except Exception as e:
+            error = e
+        finally:
+            if limiter is not None and not (succeeded and keep_slot):
+                limiter.release()
+        if succeeded:
+            if limiter is not None:
+                limiter.on_success()
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+        throttled = is_throttle(error)
+        retryable = is_retryable(error)
+        if limiter is not None and throttled:
+            limiter.on_throttle()
+        if breaker is not None:
+            # 429 は同時実行数の調整で対処するので、障害としては数えない
+            if throttled:
+                breaker.release_trial()
+            elif retryable:
+                breaker.record_failure()
+            else:
+                breaker.record_success()  # 応答は返ってきている（入力側の問題）
+        delay = policy.backoff(attempt, error)
+        attempt += 1
+        out_of_time = time.monotonic() - started + delay > policy.deadline
+        if not retryable or attempt >= policy.max_attempts or out_of_time:
+            raise error
+        if on_retry:
+            on_retry(error, delay)
+        sleep(delay)
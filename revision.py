@@ -0,0 +1,166 @@
+"""改善提案に該当するセクションだけを書き直す部分修正
+
+本文を見出し（## / ###）と段落のまとまり（セクション）に分け、「要改善」の指摘ごとに
+関係するセクションを文字バイグラムの重なりで推定します。該当したセクションだけを並列に書き直して
+元の位置に戻すため、出力トークン数（＝待ち時間）は記事全体ではなく修正箇所の分量に比例します。
+特定の箇所に結び付かない指摘（網羅性・読みやすさなど記事全体への指摘）は、すべてのセクションに渡します。
+セクションの間の区切り（空行・改行）は元のまま残すため、書き直さなかった部分は元の本文と一致します。
+"""
+
+import difflib
+import re
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+
+DEFAULT_MAX_WORKERS = 5
+SECTION_TARGET_CHARS = 600     # 1セクションの目安の文字数
+MAX_SECTIONS_PER_ITEM = 2      # 1つの指摘で書き直すセクションの上限
+MIN_MATCH_SCORE = 0.15         # これ未満なら特定の箇所への指摘ではないとみなす
+
+# 記事の入口と出口に関わる指摘は、導入とまとめのセクションに割り当てる
+_INTRO_OUTRO_ITEMS = ("キーワード",)
+# 段落の区切り（空行）と、見出し行の直前の改行（見出しの前に空行がないMarkdown向け）
+_BLOCK_BOUNDARY_RE = re.compile(r'\n\s*\n|\n(?=[ \t]*#{2,3}\s)')
+_HEADING_RE = re.compile(r'[ \t]*#{2,3}\s')
+
+
+def _split(body, target_chars=SECTION_TARGET_CHARS):
+    """本文を (先頭の空白, セクションのリスト, 各セクションの後ろの区切りのリスト) に分ける
+
+    先頭の空白 + セクションと区切りを交互に並べたものは、元の本文と一致します。
+    セクションは見出し（## / ###）の位置で必ず区切り、見出しの中では段落単位で目安の文字数ごとにまとめます。
+    """
+    content = body.strip()
+    lead = body[:len(body) - len(body.lstrip())]
+    if not content:
+        return lead, [], []
+    blocks = []
+    position = 0
+    for match in _BLOCK_BOUNDARY_RE.finditer(content):
+        blocks.append((content[position:match.start()], match.group()))
+        position = match.end()
+    blocks.append((content[position:], body[len(body.rstrip()):]))
+
+    sections, separators = [], []
+    current = separator = None
+    size = 0
+    heading_only = False
+    for text, block_separator in blocks:
+        is_heading = bool(_HEADING_RE.match(text))
+        if current is not None and (is_heading or (size + len(text) > target_chars and not heading_only)):
+            sections.append(current)
+            separators.append(separator)
+            current = None
+        if current is None:
+            current, size, heading_only = text, len(text), is_heading and '\n' not in text.strip()
+        else:
+            current += separator + text
+            size += len(text)
+            heading_only = False
+        separator = block_separator
+    sections.append(current)
+    separators.append(separator)
+    return lead, sections, separators
+
+
+def split_sections(body, target_chars=SECTION_TARGET_CHARS):
+    """本文を見出しと段落の単位で区切り、目安の文字数ごとのセクションにまとめる"""
+    return _split(body, target_chars)[1]
+
+
+def _bigrams(text):
+    text = re.sub(r'\s', '', text)
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+def map_items_to_sections(sections, items):
+    """指摘項目ごとに書き直すべきセクション番号を推定し、{番号: [項目, ...]} を返す
+
+    どのセクションとも MIN_MATCH_SCORE 以上に重ならない指摘は、記事全体への指摘として
+    すべてのセクションに割り当てます（たまたま語が重なった1か所だけを書き直さない）。
+    """
+    section_grams = [_bigrams(s) for s in sections]
+    targets = {}
+    for item in items:
+        name = item.get("item") or ""
+        if any(key in name for key in _INTRO_OUTRO_ITEMS):
+            chosen = sorted({0, len(sections) - 1})
+        else:
+            grams = _bigrams(f"{item.get('suggestion') or ''}{item.get('evaluation') or ''}")
+            scores = [len(grams & g) / len(grams) if grams else 0.0 for g in section_grams]
+            best = max(scores)
+            if best < MIN_MATCH_SCORE:
+                chosen = range(len(sections))
+            else:
+                ranked = sorted(range(len(sections)), key=lambda i: scores[i], reverse=True)
+                chosen = [i for i in ranked[:MAX_SECTIONS_PER_ITEM] if scores[i] >= best * 0.8]
+        for index in chosen:
+            targets.setdefault(index, []).append(item)
+    return targets
+
+
+def build_section_revision_prompt(sections, index, items, keyword):
+    """1セクション分の修正プロンプト（前後のセクションを文脈として添える）"""
+    improvements = '\n'.join(f"- {item.get('item')}: {item.get('suggestion')}" for item in items)
+    before = sections[index - 1][-200:] if index > 0 else "（記事の冒頭です）"
+    after = sections[index + 1][:200] if index + 1 < len(sections) else "（記事の末尾です）"
+    return f"""
+    あなたはプロのSEOライターです。
+    以下の【修正対象の部分】だけを、[改善提案リスト]を満たすように書き直してください。記事の他の部分は出力しないでください。
+    【ターゲットキーワード】 {keyword}
+    【直前の文章（参考・出力しない）】 {before}
+    【修正対象の部分】 {sections[index]}
+    【直後の文章（参考・出力しない）】 {after}
+    【改善提案リスト】 {improvements}
+    【ルール】1. 前後の文章と自然につながるように書く。 2. 文字数は元の部分と大きく変えない（不足の指摘がある場合は加筆してよい）。 3. 見出し行（# で始まる行）は変えずに残す。 4. プレーンテキスト形式で、書き直した部分の本文のみを出力してください。
+    """
+
+
+def revise_sections(body, items, keyword, generate, max_workers=DEFAULT_MAX_WORKERS, should_stop=None):
+    """指摘に該当するセクションだけを並列に書き直し、(修正版の本文, 変更点のリスト) を返す
+
+    変更点は {"index", "before", "after", "items"} の辞書で、セクション順に並びます。
+    should_stop() が True を返すと、まだ送信していないセクションは送らずに CancelledError を送出します。
+    """
+    lead, sections, separators = _split(body)
+    if not sections or not items:
+        return body, []
+    targets = map_items_to_sections(sections, items)
+
+    indices = sorted(targets)
+    prompts = [build_section_revision_prompt(sections, i, targets[i], keyword) for i in indices]
+    def run(prompt):
+        if should_stop is not None and should_stop():
+            raise CancelledError()
+        return generate(prompt)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as executor:
+        rewritten = list(executor.map(run, prompts))
+
+    revised = list(sections)
+    changes = []
+    for index, text in zip(indices, rewritten):
+        text = (text or "").strip()
+        if not text:
+            continue  # 空の応答で本文が欠けないよう、元のセクションを残す
+        revised[index] = text
+        changes.append({
+            "index": index,
+            "before": sections[index],
+            "after": text,
+            "items": [item.get("item") for item in targets[index]],
+        })
+    return lead + ''.join(section + separator for section, separator in zip(revised, separators)), changes
+
+
+def format_diff(changes):
+    """変更点を unified diff 形式の文字列にする（st.code(language="diff") 表示用）"""
+    lines = []
+    for change in changes:
+        lines.extend(difflib.unified_diff(
+            change["before"].splitlines(),
+            change["after"].splitlines(),
+            fromfile=f"セクション{change['index'] + 1}（修正前）",
+            tofile=f"セクション{change['index'] + 1}（修正後）",
+            lineterm="",
+        ))
+    return '\n'.join(lines)
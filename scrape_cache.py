@@ -0,0 +1,193 @@
+"""取得したページと抽出済みテキストのディスクキャッシュ（HTTPの条件付きリクエスト対応）
+
+URLごとに抽出済みテキストと ETag / Last-Modified をSQLiteに保存します。
+
+- 取得から fresh_seconds 以内なら、ネットワークに出ずにそのまま返します。
+- それを過ぎたら If-None-Match / If-Modified-Since 付きで再検証し、
+  304（未変更）ならHTMLの解析を省略して保存済みのテキストを返します。
+- max_age_seconds を過ぎたエントリと、件数/サイズ上限を超えた分（LRU）は削除します。
+
+取得（kind="fetch"）と本文の抽出（kind="parse"）の所要時間は telemetry に記録します。
+"""
+
+import contextlib
+import os
+import sqlite3
+import time
+
+import fetcher
+import telemetry
+
+DEFAULT_CACHE_PATH = os.environ.get(
+    "SEO_STUDIO_SCRAPE_CACHE_PATH", os.path.join(".cache", "scraped_pages.sqlite3")
+)
+DEFAULT_FRESH_SECONDS = 60 * 60                 # 1時間は再検証なしで使う
+DEFAULT_MAX_AGE_SECONDS = 30 * 24 * 60 * 60     # 30日で破棄
+DEFAULT_MAX_ENTRIES = 1000
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024           # 100MB
+
+
+class ScrapeCache:
+    """URL（と抽出方法）をキーにした抽出済みテキストのキャッシュ"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, fresh_seconds=DEFAULT_FRESH_SECONDS,
+                 max_age_seconds=DEFAULT_MAX_AGE_SECONDS, max_entries=DEFAULT_MAX_ENTRIES,
+                 max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                " url TEXT PRIMARY KEY, text TEXT NOT NULL, etag TEXT, last_modified TEXT,"
+                " size INTEGER NOT NULL, stored_at REAL NOT NULL, validated_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pages_access ON pages(last_access)")
+            conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    @contextlib.contextmanager
+    def _connect(self):
+        # スレッドをまたいで使えるよう、操作ごとに接続を開いて閉じる
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, url):
+        """保存済みのエントリを返す（なければ、または期限切れならNone）"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT text, etag, last_modified, stored_at, validated_at FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+            if not row:
+                return None
+            if now - row[3] > self.max_age_seconds:
+                conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+                return None
+            conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (now, url))
+        text, etag, last_modified, _, validated_at = row
+        return {
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fresh": now - validated_at <= self.fresh_seconds,
+        }
+
+    def put(self, url, text, etag=None, last_modified=None):
+        """抽出済みテキストと検証用ヘッダーを保存し、上限を超えた分を追い出す"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO pages"
+                "(url, text, etag, last_modified, size, stored_at, validated_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, text, etag, last_modified, len(text.encode("utf-8")), now, now, now),
+            )
+            self._evict(conn, now)
+
+    def mark_validated(self, url):
+        """304（未変更）を受け取ったエントリの鮮度を更新する"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("UPDATE pages SET validated_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM pages WHERE stored_at < ?", (now - self.max_age_seconds,))
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        for url, size in conn.execute("SELECT url, size FROM pages ORDER BY last_access ASC").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            count -= 1
+            total -= size
+
+    def record(self, outcome):
+        """取得結果（hit / revalidated / miss）の件数を記録する"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO stats(name, value) VALUES (?, 1) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                (outcome,),
+            )
+
+    def stats(self):
+        """hit / revalidated / miss の件数と現在の件数・サイズを返す"""
+        with self._connect() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM stats").fetchall())
+            count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        return {
+            "hits": counters.get("hit", 0),
+            "revalidated": counters.get("revalidated", 0),
+            "misses": counters.get("miss", 0),
+            "entries": count,
+            "bytes": total,
+        }
+
+    def clear(self):
+        """全エントリと統計を削除する"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM pages")
+            conn.execute("DELETE FROM stats")
+
+
+def scrape(url, extract, cache=None, force_refresh=False, variant="", **fetch_kwargs):
+    """URLの本文テキストをキャッシュ経由で取得する
+
+    extract(html_bytes) で本文を抽出します。抽出方法ごとに結果を分けて保存したい場合は
+    variant（抽出エンジン名など）を指定します。戻り値は
+    {"url", "text", "cache": "hit" / "revalidated" / "miss", "elapsed"} の辞書です。
+    取得エラーは requests の例外として送出します。
+    """
+    started = time.monotonic()
+    key = f"{url}#{variant}" if variant else url
+    with telemetry.timer("fetch", "scrape", url=url, variant=variant) as measured:
+        entry = cache.get(key) if cache is not None and not force_refresh else None
+
+        if entry and entry["fresh"]:
+            outcome, text = "hit", entry["text"]
+        else:
+            headers = {}
+            if entry and entry["etag"]:
+                headers["If-None-Match"] = entry["etag"]
+            if entry and entry["last_modified"]:
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+            page = fetcher.fetch(url, headers=headers or None, **fetch_kwargs)
+            measured.update(http_status=page["status"], bytes=len(page["content"]),
+                            network_ms=round(page["elapsed"] * 1000, 2))
+            if page["status"] == 304 and entry:
+                # 未変更なのでHTMLの解析は行わない
+                outcome, text = "revalidated", entry["text"]
+                cache.mark_validated(key)
+            else:
+                with telemetry.timer("parse", "scrape", format="html", variant=variant, bytes=len(page["content"])):
+                    text = extract(page["content"])
+                outcome = "miss"
+                if cache is not None:
+                    cache.put(key, text, page["headers"].get("ETag"), page["headers"].get("Last-Modified"))
+        measured["cache"] = outcome
+
+    if cache is not None:
+        cache.record(outcome)
+    return {"url": url, "text": text, "cache": outcome, "elapsed": time.monotonic() - started}
+
+
+def scrape_many(urls, extract, cache=None, force_refresh=False, variant="", **pool_kwargs):
+    """複数URLをキャッシュ経由で並列に取得し、入力と同じ順番で結果を返す
+
+    失敗したURLは {"url", "error"} の辞書になります。
+    """
+    def scrape_one(url):
+        return scrape(url, extract, cache=cache, force_refresh=force_refresh, variant=variant)
+
+    return fetcher.map_urls(scrape_one, urls, **pool_kwargs)
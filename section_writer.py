@@ -0,0 +1,121 @@
+"""骨子のH2セクションごとに本文を並列生成するモジュール
+
+記事全体を1回のリクエストで書かせる代わりに、H2ごとにリクエストを分けて
+スレッドプールで同時に投げ、骨子の順番どおりに結合します。
+待ち時間は「全セクションの合計」ではなく「最も遅いセクション」程度になります。
+スレッドはセクションの数だけ用意し、実際に同時に送る数は llm の AdaptiveLimiter
+（429 を受けると減り、成功が続くと増える上限）に任せます。
+"""
+
+import json
+from concurrent.futures import CancelledError, ThreadPoolExecutor, as_completed
+
+DEFAULT_TOTAL_CHARS = 2000
+
+# 骨子JSONの中でH2見出しとして扱うキー（モデルの出力ゆれに対応）
+_HEADING_KEYS = ("H2", "h2", "heading", "title", "section_title")
+_SUBHEADING_KEYS = ("H3", "h3", "subheadings", "sub_sections", "children")
+
+
+def _find_section_list(data):
+    """骨子JSONから、H2セクションの一覧らしきリストを探す"""
+    if isinstance(data, list):
+        if data and all(isinstance(item, dict) for item in data):
+            return data
+        return None
+    if isinstance(data, dict):
+        for value in data.values():
+            found = _find_section_list(value)
+            if found:
+                return found
+    return None
+
+
+def _pick(item, keys):
+    for key in keys:
+        if key in item:
+            return item[key]
+    for key, value in item.items():
+        if any(k.lower() in key.lower() for k in keys):
+            return value
+    return None
+
+
+def _as_text(value):
+    if isinstance(value, dict):
+        return str(_pick(value, _HEADING_KEYS) or next(iter(value.values()), ""))
+    return str(value)
+
+
+def extract_sections(outline_data):
+    """骨子JSONを [{"h2": 見出し, "h3": [小見出し, ...]}, ...] の形に正規化する"""
+    sections = []
+    for item in _find_section_list(outline_data) or []:
+        heading = _pick(item, _HEADING_KEYS)
+        if not heading:
+            continue
+        subheadings = _pick(item, _SUBHEADING_KEYS) or []
+        if not isinstance(subheadings, list):
+            subheadings = [subheadings]
+        sections.append({"h2": _as_text(heading), "h3": [_as_text(s) for s in subheadings]})
+    return sections
+
+
+def build_context_header(outline_data, sections):
+    """全セクション共通の短いコンテキスト（トーンと全体像をそろえるため）"""
+    title = outline_data.get("article_title_H1", "") if isinstance(outline_data, dict) else ""
+    toc = "\n".join(f"{i}. {s['h2']}" for i, s in enumerate(sections, start=1))
+    return f"【記事タイトル】{title}\n【記事全体の構成】\n{toc}"
+
+
+def build_section_prompt(context_header, section, index, total, chars_per_section):
+    """1つのH2セクション分の本文を書かせるプロンプト"""
+    subheadings = json.dumps(section["h3"], ensure_ascii=False)
+    return f"""
+    あなたはプロのSEOライターです。以下の記事構成のうち、{index}番目（全{total}セクション中）のセクションの本文だけを執筆してください。
+    {context_header}
+    【担当セクション】H2: {section['h2']} / H3: {subheadings}
+    【ライティングルール】1. **約{chars_per_section}字**で記述。 2. H2/H3タグは**出力せず**、本文のみ記述。 3. 他のセクションの内容には触れず、記事全体で一貫した「です・ます」調のトーンで書くこと。
+    """
+
+
+def generate_sections_parallel(outline_data, generate, max_workers=None,
+                               total_chars=DEFAULT_TOTAL_CHARS, on_section_done=None, should_stop=None):
+    """H2セクションごとに generate(prompt) を並列実行し、骨子順に結合した本文を返す
+
+    max_workers を省略すると全セクションを同時に投げます（送信数の上限は generate 側で決まります）。
+    on_section_done(完了数, 総数) を渡すと、セクションが1つ終わるたびに呼び出します。
+    いずれかのセクションが失敗した場合は、その例外をそのまま送出します。
+    should_stop() が True を返すと、まだ送信していないセクションは送らずに CancelledError を送出します。
+    """
+    sections = extract_sections(outline_data)
+    if not sections:
+        raise ValueError("骨子からH2セクションを取得できませんでした。")
+
+    context_header = build_context_header(outline_data, sections)
+    chars_per_section = max(200, total_chars // len(sections))
+    prompts = [
+        build_section_prompt(context_header, section, i, len(sections), chars_per_section)
+        for i, section in enumerate(sections, start=1)
+    ]
+
+    def run(prompt):
+        if should_stop is not None and should_stop():
+            raise CancelledError()
+        return generate(prompt)
+
+    results = [None] * len(prompts)
+    with ThreadPoolExecutor(max_workers=min(max_workers or len(prompts), len(prompts))) as executor:
+        futures = {executor.submit(run, prompt): i for i, prompt in enumerate(prompts)}
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                results[futures[future]] = future.result().strip()
+                if on_section_done:
+                    on_section_done(done, len(prompts))
+        except Exception:
+            # 失敗したら未着手のセクションは送信しない
+            for future in futures:
+                future.cancel()
+            raise
+
+    return "\n\n".join(results)
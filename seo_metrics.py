@@ -0,0 +1,162 @@
+"""記事本文のローカルSEO分析（AIを使わずに数値で判定できる項目）
+
+キーワードの出現数・出現率、本文の文字数、段落構成、メタ情報の文字数、
+重複した文を計算し、seo_checklist と同じ形式の項目として返します。
+日本語は単語の区切りがないため、キーワードは部分文字列として数え、
+頻出語は文字種（漢字・カタカナ・英数字）の連続でトークン化して集計します。
+"""
+
+import re
+import unicodedata
+from collections import Counter
+
+# UIに表示している目安と同じ範囲
+TITLE_RANGE = (30, 35)
+DESCRIPTION_RANGE = (100, 120)
+TARGET_BODY_CHARS = 2000
+MIN_BODY_RATIO = 0.8                # 目安の8割未満なら「要改善」
+KEYWORD_DENSITY_RANGE = (1.0, 5.0)  # キーワードが本文に占める割合（%）
+MAX_AVG_PARAGRAPH_CHARS = 200
+MAX_PARAGRAPH_CHARS = 400
+MIN_DUPLICATE_SENTENCE_CHARS = 10
+
+# 文字種ごとの連続をトークンとみなす（ひらがなは助詞などが多いので集計から外す）
+_TOKEN_RE = re.compile(r'[一-龥々〆ヵヶ]+|[ァ-ヴー]+|[a-zA-Z0-9][a-zA-Z0-9\-\.]*')
+_SENTENCE_SPLIT_RE = re.compile(r'[。！？!?\n]+')
+_HALFWIDTH_KANA_RE = re.compile(r'[\uff61-\uff9f]')
+# 全角英数字・記号と全角スペースを半角にする変換表（該当箇所だけ変換するのでNFKCより大幅に速い）
+_FULLWIDTH_TABLE = {cp: cp - 0xFEE0 for cp in range(0xFF01, 0xFF5F)}
+_FULLWIDTH_TABLE[0x3000] = 0x20
+_FULLWIDTH_RE = re.compile(r'[\uff01-\uff5e\u3000]+')
+_PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n')
+
+
+def normalize(text):
+    """全角英数字・半角カナのゆれをそろえ、大文字小文字を区別しない形にする"""
+    text = _FULLWIDTH_RE.sub(lambda m: m.group().translate(_FULLWIDTH_TABLE), text)
+    if _HALFWIDTH_KANA_RE.search(text):
+        text = unicodedata.normalize('NFKC', text)
+    return text.casefold()
+
+
+def tokenize(text):
+    """日本語の文字種の切れ目でトークン化する"""
+    return _TOKEN_RE.findall(normalize(text))
+
+
+def split_sentences(text):
+    return [s.strip() for s in _SENTENCE_SPLIT_RE.split(text) if s.strip()]
+
+
+def split_paragraphs(text):
+    return [p.strip() for p in _PARAGRAPH_SPLIT_RE.split(text) if p.strip()]
+
+
+def analyze(article_body, keyword, meta_data=None):
+    """本文・キーワード・メタ情報から数値指標を計算する"""
+    # 正規化は1回だけ行い、以降の集計はすべて正規化済みの本文に対して行う
+    body = normalize(article_body)
+    body_chars = len(''.join(body.split()))
+    terms = [t for t in normalize(keyword or '').split() if t]
+    term_counts = {t: body.count(t) for t in terms}
+    keyword_chars = sum(len(t) * n for t, n in term_counts.items())
+
+    paragraphs = split_paragraphs(article_body)
+    paragraph_lengths = [len(p) for p in paragraphs]
+
+    sentence_counts = Counter(
+        s for s in split_sentences(body) if len(s) >= MIN_DUPLICATE_SENTENCE_CHARS
+    )
+    duplicates = {s: n for s, n in sentence_counts.items() if n > 1}
+
+    metrics = {
+        "body_chars": body_chars,
+        "keyword_counts": term_counts,
+        "keyword_density": round(keyword_chars / body_chars * 100, 2) if body_chars else 0.0,
+        "paragraph_count": len(paragraphs),
+        "avg_paragraph_chars": round(sum(paragraph_lengths) / len(paragraphs)) if paragraphs else 0,
+        "max_paragraph_chars": max(paragraph_lengths, default=0),
+        "duplicate_sentences": duplicates,
+        "top_terms": Counter(t for t in _TOKEN_RE.findall(body) if len(t) > 1).most_common(10),
+    }
+    if meta_data:
+        metrics["meta_title_chars"] = len(meta_data.get("meta_title") or "")
+        metrics["meta_description_chars"] = len(meta_data.get("meta_description") or "")
+    return metrics
+
+
+def _item(name, ok, evaluation, suggestion, scope="body"):
+    return {
+        "item": name,
+        "evaluation": evaluation,
+        "status": "OK" if ok else "要改善",
+        "suggestion": "" if ok else suggestion,
+        "source": "local",
+        "scope": scope,
+    }
+
+
+def build_checklist(metrics):
+    """数値指標を seo_checklist の項目（status: OK / 要改善）に変換する"""
+    items = []
+
+    missing = [t for t, n in metrics["keyword_counts"].items() if n == 0]
+    low, high = KEYWORD_DENSITY_RANGE
+    density = metrics["keyword_density"]
+    counts = "、".join(f"「{t}」{n}回" for t, n in metrics["keyword_counts"].items()) or "キーワード未指定"
+    if missing:
+        suggestion = f"キーワード「{'」「'.join(missing)}」が本文に含まれていません。見出し直後の段落などに自然に入れてください。"
+    elif density < low:
+        suggestion = f"キーワードの出現率が低いです（目安: {low}〜{high}%）。導入文やまとめに自然な形で追加してください。"
+    else:
+        suggestion = f"キーワードの出現率が高すぎます（目安: {low}〜{high}%）。言い換えや指示語で一部を置き換えてください。"
+    items.append(_item(
+        "キーワードの出現率", not missing and low <= density <= high,
+        f"{counts}（出現率 {density}%）", suggestion,
+    ))
+
+    min_chars = int(TARGET_BODY_CHARS * MIN_BODY_RATIO)
+    items.append(_item(
+        "本文の文字数", metrics["body_chars"] >= min_chars,
+        f"{metrics['body_chars']}字（目安: {TARGET_BODY_CHARS}字前後）",
+        f"本文が短すぎます。具体例や手順の説明を加え、{TARGET_BODY_CHARS}字前後まで充実させてください。",
+    ))
+
+    items.append(_item(
+        "段落の長さ",
+        metrics["avg_paragraph_chars"] <= MAX_AVG_PARAGRAPH_CHARS and metrics["max_paragraph_chars"] <= MAX_PARAGRAPH_CHARS,
+        f"{metrics['paragraph_count']}段落（平均 {metrics['avg_paragraph_chars']}字 / 最長 {metrics['max_paragraph_chars']}字）",
+        f"長すぎる段落があります。1段落は{MAX_AVG_PARAGRAPH_CHARS}字程度を目安に分割し、読みやすくしてください。",
+    ))
+
+    duplicates = metrics["duplicate_sentences"]
+    examples = "」「".join(list(duplicates)[:3])
+    items.append(_item(
+        "重複した文", not duplicates,
+        f"重複している文: {len(duplicates)}件",
+        f"同じ文が繰り返されています（例:「{examples}」）。重複を削除するか、別の表現に書き換えてください。",
+    ))
+
+    if "meta_title_chars" in metrics:
+        low, high = TITLE_RANGE
+        n = metrics["meta_title_chars"]
+        items.append(_item(
+            "SEOタイトルの文字数", low <= n <= high, f"{n}字（目安: {low}〜{high}文字）",
+            f"SEOタイトルを{low}〜{high}文字に調整してください。", scope="meta",
+        ))
+        low, high = DESCRIPTION_RANGE
+        n = metrics["meta_description_chars"]
+        items.append(_item(
+            "メタディスクリプションの文字数", low <= n <= high, f"{n}字（目安: {low}〜{high}文字）",
+            f"メタディスクリプションを{low}〜{high}文字に調整してください。", scope="meta",
+        ))
+    return items
+
+
+def summarize(metrics):
+    """AIへのプロンプトに添える、計算済み指標の短い要約"""
+    counts = "、".join(f"{t}: {n}回" for t, n in metrics["keyword_counts"].items())
+    return (
+        f"文字数 {metrics['body_chars']}字 / キーワード出現 {counts}（出現率 {metrics['keyword_density']}%）/ "
+        f"{metrics['paragraph_count']}段落 / 重複文 {len(metrics['duplicate_sentences'])}件"
+    )
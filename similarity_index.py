@@ -0,0 +1,285 @@
+"""生成・診断した記事と骨子の類似検索インデックス（ローカル・永続・差分更新）
+
+日本語は単語の区切りがないため、正規化した本文の文字2-gram・3-gramをハッシュで
+DIMENSION 次元に割り当て、TF-IDF（TFは 1 + log）のコサイン類似度で検索します。
+
+保存先のディレクトリには次のファイルを置きます。ベクトルはすべて追記型の配列ファイルで、
+読み込み時は numpy.memmap で開くため、文書数が増えても起動時にファイル全体を読みません。
+
+    docs.bin       文書ごとの (特徴量の開始位置, 特徴量の数, 有効フラグ, 種類)
+    features.bin   特徴量の番号（int32）。文書ごとに TF-IDF の上位 MAX_FEATURES 個だけを残す
+    tf.bin         特徴量のTF（float32）
+    df.bin         特徴量ごとの文書頻度（int32 × DIMENSION）
+    meta.sqlite3   タイトル・キーワード・URL・骨子のJSONなどの表示用の情報
+
+同じ key で追加すると古い文書を無効にして追記するため、修正版の本文もそのまま登録し直せます。
+IDF は検索時の文書頻度で計算し、文書が1割以上増えたら保持している重みを計算し直します。
+書き込みはファイルロックで直列化するので、Streamlit とワーカープロセスから同時に使えます。
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import near_duplicates
+import section_writer
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間のロックを行わない
+    fcntl = None
+
+DEFAULT_INDEX_PATH = os.environ.get(
+    "SEO_STUDIO_INDEX_PATH", os.path.join(".cache", "similarity_index")
+)
+DIMENSION_BITS = 18
+DIMENSION = 1 << DIMENSION_BITS
+NGRAM_SIZES = (2, 3)
+MAX_FEATURES = 256             # 1文書あたりに保存する特徴量の数（TF-IDFの上位）
+SNIPPET_CHARS = 120
+REWEIGHT_GROWTH = 1.1          # 文書数がこの倍率を超えて増えたらIDFの重みを計算し直す
+COVERED_MIN_SCORE = 0.2        # キーワードで骨子を探すときの類似度の下限（無関係な骨子は 0.05 未満）
+LINK_MIN_SCORE = 0.1           # 内部リンク先の候補にする記事の類似度の下限
+
+KINDS = ("article", "outline")
+_DOC_DTYPE = [("offset", "<i8"), ("length", "<i4"), ("alive", "u1"), ("kind", "u1")]
+
+
+def _features(text):
+    """本文の文字n-gramを特徴量の番号にして、(番号, TF) の配列を返す"""
+    import numpy as np
+
+    hashes = np.concatenate([near_duplicates.ngram_hashes(text, size) for size in NGRAM_SIZES])
+    # 上位ビットを特徴量の番号にする（多項式ハッシュは下位ビットの偏りが大きい）
+    ids, counts = np.unique((hashes >> np.uint64(64 - DIMENSION_BITS)).astype(np.int32), return_counts=True)
+    return ids, (1.0 + np.log(counts)).astype(np.float32)
+
+
+class SimilarityIndex:
+    """文字n-gram TF-IDF の類似検索インデックス"""
+
+    def __init__(self, path=DEFAULT_INDEX_PATH):
+        import numpy as np
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._docs_path = os.path.join(path, "docs.bin")
+        self._features_path = os.path.join(path, "features.bin")
+        self._tf_path = os.path.join(path, "tf.bin")
+        self._df_path = os.path.join(path, "df.bin")
+        for file_path in (self._docs_path, self._features_path, self._tf_path):
+            open(file_path, "ab").close()
+        if not os.path.exists(self._df_path) or os.path.getsize(self._df_path) != DIMENSION * 4:
+            with open(self._df_path, "wb") as f:
+                f.truncate(DIMENSION * 4)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS documents ("
+                " id INTEGER PRIMARY KEY, key TEXT NOT NULL, kind TEXT NOT NULL, title TEXT, keyword TEXT,"
+                " url TEXT, snippet TEXT, payload TEXT, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_key ON documents(key)")
+        self._df = np.memmap(self._df_path, dtype=np.int32, mode="r+", shape=(DIMENSION,))
+        self._mapped_docs = 0
+        self._weights = None
+        self._weighted_docs = 0
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(os.path.join(self.path, "meta.sqlite3"), timeout=30)
+        # WAL では NORMAL でも壊れない（電源断で直前の数件を失うことはある）
+        conn.execute("PRAGMA synchronous=NORMAL")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @contextlib.contextmanager
+    def _write_lock(self):
+        with self._lock, open(os.path.join(self.path, "write.lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    # --- 配列ファイルの読み込み ---
+
+    def _map(self):
+        """追記された文書があれば配列ファイルを開き直す（文書数を返す）"""
+        import numpy as np
+
+        count = os.path.getsize(self._docs_path) // np.dtype(_DOC_DTYPE).itemsize
+        if count != self._mapped_docs:
+            self._docs = np.memmap(self._docs_path, dtype=_DOC_DTYPE, mode="r+", shape=(count,)) if count else None
+            total = os.path.getsize(self._features_path) // 4
+            self._feature_ids = np.memmap(self._features_path, dtype=np.int32, mode="r", shape=(total,)) if total else None
+            self._tf = np.memmap(self._tf_path, dtype=np.float32, mode="r", shape=(total,)) if total else None
+            self._mapped_docs = count
+        return count
+
+    def _idf(self, alive_docs, ids=None):
+        """IDF（ids を指定した場合はその特徴量の分だけ計算する）"""
+        import numpy as np
+
+        df = self._df if ids is None else self._df[ids]
+        return (np.log((alive_docs + 1) / (df.astype(np.float32) + 1)) + 1).astype(np.float32)
+
+    def _update_weights(self, count):
+        """文書ごとに正規化した TF-IDF の重みを用意する（増えた文書の分だけ追加で計算する）
+
+        文書の特徴量は features.bin に隙間なく並んでいるので、重みも同じ並びの1本の配列で持ち、
+        文書ごとの開始位置（self._starts）で区切って合計します。
+        """
+        import numpy as np
+
+        alive_docs = int(self._docs["alive"].sum())
+        stale = self._weights is None or alive_docs > self._weighted_docs * REWEIGHT_GROWTH
+        first = 0 if stale else len(self._starts)
+        if first == count:
+            return
+        idf = self._idf(alive_docs)
+        docs = self._docs[first:count]
+        begin = int(docs["offset"][0])
+        end = int(docs["offset"][-1] + docs["length"][-1])
+        weights = self._tf[begin:end] * idf[self._feature_ids[begin:end]]
+        norms = np.sqrt(np.add.reduceat(weights * weights, docs["offset"] - begin))
+        weights /= np.repeat(norms, docs["length"]).astype(np.float32)
+        starts = np.asarray(docs["offset"], dtype=np.int64)
+        if stale:
+            self._weights, self._starts, self._weighted_docs = weights, starts, alive_docs
+        else:
+            self._weights = np.concatenate([self._weights, weights])
+            self._starts = np.concatenate([self._starts, starts])
+
+    # --- 追加・検索 ---
+
+    def add(self, key, text, kind, title="", keyword="", url="", payload=None):
+        """文書を追加する（同じ key の文書があれば置き換える）。追加した文書のIDを返す"""
+        import numpy as np
+
+        if kind not in KINDS:
+            raise ValueError(f"未対応の文書の種類です: {kind}")
+        ids, tf = _features(text)
+        if not len(ids):
+            return None
+        with self._write_lock(), self._connect() as conn:
+            count = self._map()
+            for (old_id,) in conn.execute("SELECT id FROM documents WHERE key = ?", (key,)).fetchall():
+                self._remove(old_id, count)
+            conn.execute("DELETE FROM documents WHERE key = ?", (key,))
+
+            # 保存する特徴量は、その時点のIDFで重要な上位 MAX_FEATURES 個に絞る
+            if len(ids) > MAX_FEATURES:
+                alive_docs = int(self._docs["alive"].sum()) if count else 0
+                top = np.argsort(-(tf * self._idf(alive_docs, ids)))[:MAX_FEATURES]
+                top.sort()
+                ids, tf = ids[top], tf[top]
+            # 前回の書き込みが途中で止まっていた場合に備え、最後の文書の直後から書く
+            offset = int(self._docs["offset"][-1] + self._docs["length"][-1]) if count else 0
+            for file_path, values in ((self._features_path, ids.astype("<i4")), (self._tf_path, tf.astype("<f4"))):
+                with open(file_path, "r+b") as f:
+                    f.truncate(offset * 4)
+                    f.seek(offset * 4)
+                    f.write(values.tobytes())
+            record = np.array([(offset, len(ids), 1, KINDS.index(kind))], dtype=_DOC_DTYPE)
+            with open(self._docs_path, "ab") as f:
+                f.write(record.tobytes())
+            # 配列ファイルは共有メモリとして開いているので、書き込みは他のプロセスからもすぐに見える
+            self._df[ids] += 1
+            conn.execute(
+                "INSERT INTO documents (id, key, kind, title, keyword, url, snippet, payload, created_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (count, key, kind, title, keyword, url, " ".join(text.split())[:SNIPPET_CHARS],
+                 json.dumps(payload, ensure_ascii=False) if payload is not None else None, time.time()),
+            )
+        return count
+
+    def _remove(self, doc_id, count):
+        if doc_id >= count or not self._docs["alive"][doc_id]:
+            return
+        offset, length = int(self._docs["offset"][doc_id]), int(self._docs["length"][doc_id])
+        self._docs["alive"][doc_id] = 0
+        self._df[self._feature_ids[offset:offset + length]] -= 1
+
+    def search(self, text, limit=5, kind=None, exclude_key=None, min_score=0.0):
+        """本文に近い文書を類似度の高い順に返す（[{"id", "key", "kind", "title", ..., "score"}]）"""
+        import numpy as np
+
+        ids, tf = _features(text)
+        if not len(ids):
+            return []
+        with self._lock:
+            count = self._map()
+            if not count:
+                return []
+            self._update_weights(count)
+            query = np.zeros(DIMENSION, dtype=np.float32)
+            query[ids] = tf * self._idf(self._weighted_docs, ids)
+            query /= np.linalg.norm(query)
+            scores = np.add.reduceat(query[self._feature_ids[:len(self._weights)]] * self._weights, self._starts)
+            docs = self._docs[:len(scores)]
+            scores[docs["alive"] == 0] = -1.0
+            if kind:
+                scores[docs["kind"] != KINDS.index(kind)] = -1.0
+
+        # 除外する文書の分を見込んで1件多く取り、上位だけを並べ替える
+        size = min(limit + 1, len(scores))
+        candidates = np.argpartition(-scores, size - 1)[:size]
+        candidates = candidates[np.argsort(-scores[candidates])]
+        results = []
+        with self._connect() as conn:
+            for doc_id in candidates:
+                score = float(scores[doc_id])
+                if score <= 0 or score < min_score or len(results) >= limit:
+                    break
+                row = conn.execute(
+                    "SELECT key, kind, title, keyword, url, snippet, payload, created_at FROM documents WHERE id = ?",
+                    (int(doc_id),),
+                ).fetchone()
+                if row is None or (exclude_key and row[0] == exclude_key):
+                    continue
+                results.append({
+                    "id": int(doc_id), "key": row[0], "kind": row[1], "title": row[2], "keyword": row[3],
+                    "url": row[4], "snippet": row[5], "payload": json.loads(row[6]) if row[6] else None,
+                    "created_at": row[7], "score": round(score, 4),
+                })
+        return results
+
+    def stats(self):
+        with self._lock:
+            count = self._map()
+            alive = int(self._docs["alive"].sum()) if count else 0
+        size = sum(os.path.getsize(os.path.join(self.path, name)) for name in os.listdir(self.path))
+        return {"documents": alive, "bytes": size}
+
+
+def outline_text(outline_data):
+    """骨子（JSON）を、検索に使うテキスト（H1・H2・H3を並べたもの）にする
+
+    H2/H3 のキー名や入れ子の形のゆれは section_writer.extract_sections で吸収し、
+    見出しの文字列だけを並べた骨子（{"outline": ["見出し", ...]}）も受け付けます。
+    """
+    is_dict = isinstance(outline_data, dict)
+    lines = [outline_data.get("article_title_H1", "") if is_dict else ""]
+    sections = section_writer.extract_sections(outline_data)
+    for section in sections:
+        lines.append(section["h2"])
+        lines.extend(section["h3"])
+    if not sections:
+        items = outline_data.get("outline") if is_dict else outline_data
+        if isinstance(items, list):
+            lines.extend(item for item in items if isinstance(item, str))  # 文字列以外の要素は読み飛ばす
+    return "\n".join(line.strip() for line in lines if isinstance(line, str) and line.strip())
+
+
+def anchor_text(body, target):
+    """内部リンクのアンカーテキスト候補（本文に出てくるならリンク先のキーワード、なければタイトル）"""
+    keyword = (target.get("keyword") or "").strip()
+    if keyword and all(term in body for term in keyword.split()):
+        return keyword
+    return target.get("title") or keyword
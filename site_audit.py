@@ -0,0 +1,71 @@
+"""サイト全体のカニバリゼーション分析（クロール → 近似重複・競合の検出 → 該当ページだけSEOチェック）
+
+crawler でページを取得しながら、1ページずつ near_duplicates に署名を追加して本文は捨てるため、
+サイトの規模にかかわらずメモリ使用量はほぼ一定です。AIによるSEOチェックは
+重複・競合のクラスターに入ったページだけに行います（本文は取得時のキャッシュから読み直す）。
+"""
+
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import crawler
+import near_duplicates
+
+MAX_ERROR_SAMPLES = 20
+DEFAULT_MAX_CHECKED_PAGES = 20     # AIでチェックするページ数の上限（コストの上限）
+DEFAULT_MAX_WORKERS = 4
+
+
+def audit(seed, extract, cache=None, max_pages=crawler.DEFAULT_MAX_PAGES, max_workers=crawler.DEFAULT_MAX_WORKERS,
+          force_refresh=False, variant="", should_stop=None, on_page=None):
+    """サイトをクロールして、近似重複・競合しているページのクラスターを求める
+
+    on_page(page) は取得が終わったページごとに呼ばれます（進捗表示用）。
+    戻り値は {"seed", "counts", "errors", "clusters"} の辞書です。
+    """
+    similarity = near_duplicates.SiteSimilarity()
+    counts = Counter()
+    errors = []
+    for page in crawler.crawl(seed, extract, cache=cache, max_pages=max_pages, max_workers=max_workers,
+                              force_refresh=force_refresh, variant=variant, should_stop=should_stop):
+        if page.get("skipped"):
+            counts["robots"] += 1
+        elif page.get("error"):
+            counts["errors"] += 1
+            if len(errors) < MAX_ERROR_SAMPLES:
+                errors.append({"url": page["url"], "error": page["error"]})
+        else:
+            counts["fetched"] += 1
+            if not similarity.add(page["url"], page["text"]):
+                counts["too_short"] += 1
+        if on_page:
+            on_page(page)
+
+    clusters = similarity.clusters()
+    counts["flagged"] = sum(len(cluster["pages"]) for cluster in clusters)
+    return {"seed": seed, "counts": dict(counts), "errors": errors, "clusters": clusters}
+
+
+def check_clusters(clusters, load_text, check, max_pages=DEFAULT_MAX_CHECKED_PAGES, max_workers=DEFAULT_MAX_WORKERS,
+                   should_stop=None):
+    """クラスターに入ったページだけを、クラスターの共通キーワードでSEOチェックする
+
+    load_text(url) で本文を読み、check(text, keyword) の結果を各ページの "seo_check" に入れます。
+    チェックするページ数は max_pages まで（大きいクラスターから順に）で、max_workers 件ずつ並列に実行します。
+    should_stop() が True を返した後に順番が来たページはチェックしません。
+    """
+    targets = [(cluster["keyword"], page) for cluster in clusters if cluster["keyword"] for page in cluster["pages"]]
+
+    def check_one(target):
+        keyword, page = target
+        if should_stop is not None and should_stop():
+            return
+        try:
+            page["seo_check"] = check(load_text(page["url"]), keyword)
+        except Exception as e:
+            page["seo_check_error"] = str(e)
+
+    if targets:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(check_one, targets[:max_pages]))
+    return clusters
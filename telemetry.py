@@ -0,0 +1,320 @@
+"""処理ごとの所要時間・トークン数・推定コストの計測（Streamlitに依存しない）
+
+Gemini呼び出し（kind="llm"）、ページ取得（"fetch"）、HTML・JSONの解析（"parse"）を
+1件ずつ記録し、どのステージ（outline / body / meta / check / revise / scrape）の処理かを
+タグとして付けます。記録は次の3か所に反映されます。
+
+- ローテーションするJSONLファイル（プロセスごとに telemetry.<pid>.jsonl へ書き、
+  load_records() がすべてのプロセスのファイルをまとめて読む。ローテーションは
+  プロセスをまたいで安全に行えないため、1つのファイルには1つのプロセスだけが書く）
+- プロセス内の集計（Prometheus形式のテキストとして api.py の /metrics で公開）
+- load_records() + summarize() による p50 / p95 のステージ別サマリー（管理パネル用）
+
+ステージはスレッドごと（contextvars）に保持されるため、スレッドプールの中で呼ばれる
+generate には with_stage() でタグを付けてから渡します。
+"""
+
+import contextlib
+import contextvars
+import functools
+import glob
+import json
+import logging
+import logging.handlers
+import math
+import os
+import threading
+import time
+from collections import deque
+
+DEFAULT_LOG_PATH = os.environ.get(
+    "SEO_STUDIO_TELEMETRY_PATH", os.path.join(".cache", "telemetry.jsonl")
+)
+MAX_LOG_BYTES = 5 * 1024 * 1024   # 5MBごとにローテーション
+LOG_BACKUP_COUNT = 3
+MAX_LOG_AGE_SECONDS = 7 * 24 * 60 * 60   # 更新されなくなったプロセスのファイルは7日で削除する
+WINDOW_SIZE = 1000                # パーセンタイル計算に使う直近の件数（系列ごと）
+
+# 100万トークンあたりの料金（USD, 入力 / 出力）。思考トークンは出力として課金される
+PRICING_PER_MILLION = {
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+_current_stage = contextvars.ContextVar("seo_studio_stage", default=None)
+
+
+# --- ステージのタグ付け ---
+
+def current_stage():
+    return _current_stage.get()
+
+
+@contextlib.contextmanager
+def stage(name):
+    """with ブロック内の記録に、ステージ名のタグを付ける"""
+    token = _current_stage.set(name)
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+
+
+def with_stage(generate, name):
+    """呼び出されたスレッドでステージ名を設定してから generate を実行する関数を返す"""
+    @functools.wraps(generate)
+    def tagged(*args, **kwargs):
+        with stage(name):
+            return generate(*args, **kwargs)
+    return tagged
+
+
+def estimate_cost(model_name, prompt_tokens, output_tokens):
+    """トークン数から推定料金（USD）を計算する（料金表にないモデルは0）"""
+    input_price, output_price = PRICING_PER_MILLION.get(model_name, (0.0, 0.0))
+    return ((prompt_tokens or 0) * input_price + (output_tokens or 0) * output_price) / 1_000_000
+
+
+# --- 記録 ---
+
+class _Series:
+    """kind × stage ごとのプロセス内集計"""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.cache_hits = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+        self.cost_usd = 0.0
+        self.recent_ms = deque(maxlen=WINDOW_SIZE)
+
+    def add(self, record):
+        duration = record.get("duration_ms") or 0.0
+        self.count += 1
+        self.errors += record.get("status") == "error"
+        self.total_ms += duration
+        self.cache_hits += record.get("cache") in ("hit", "revalidated")
+        self.retries += record.get("retries") or 0
+        self.prompt_tokens += record.get("prompt_tokens") or 0
+        self.output_tokens += record.get("output_tokens") or 0
+        self.cost_usd += record.get("cost_usd") or 0.0
+        self.recent_ms.append(duration)
+
+
+def process_log_path(path, pid=None):
+    """プロセスごとの記録ファイルのパス（telemetry.jsonl → telemetry.<pid>.jsonl）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def _log_files(path):
+    """全プロセスの記録ファイル（ローテーション済みのものと、以前の共有ファイルも含む）"""
+    root, ext = os.path.splitext(path)
+    pattern = f"{glob.escape(root)}.*{ext}"
+    return sorted(set(glob.glob(pattern) + glob.glob(pattern + ".*") + glob.glob(glob.escape(path) + "*")))
+
+
+def _remove_stale_logs(path, max_age=MAX_LOG_AGE_SECONDS):
+    now = time.time()
+    for file_path in _log_files(path):
+        try:
+            if now - os.path.getmtime(file_path) > max_age:
+                os.remove(file_path)
+        except OSError:
+            continue
+
+
+class Recorder:
+    """記録をJSONLファイル（プロセスごと）に書き出し、プロセス内でも集計する"""
+
+    def __init__(self, path=DEFAULT_LOG_PATH, max_bytes=MAX_LOG_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self._series = {}
+        self._lock = threading.Lock()
+        self._logger = None
+        self._logger_pid = None
+
+    def _get_logger(self):
+        # ファイルは最初に記録するときに開く（記録しないプロセスでは何も作らない）。
+        # fork した子プロセスでは、親のファイルに書かないよう自分のファイルを開き直す
+        pid = os.getpid()
+        if self._logger is None or self._logger_pid != pid:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            _remove_stale_logs(self.path)
+            logger = logging.getLogger(f"seo_studio.telemetry.{id(self)}.{pid}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            for handler in list(logger.handlers):
+                logger.removeHandler(handler)
+                handler.close()
+            handler = logging.handlers.RotatingFileHandler(
+                process_log_path(self.path, pid), maxBytes=self.max_bytes, backupCount=self.backup_count,
+                encoding="utf-8",
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            self._logger, self._logger_pid = logger, pid
+        return self._logger
+
+    def record(self, kind, stage=None, **fields):
+        """1件の計測結果を記録して、その辞書を返す"""
+        entry = {"ts": round(time.time(), 3), "kind": kind, "stage": stage or current_stage() or "other", "pid": os.getpid()}
+        entry.update(fields)
+        with self._lock:
+            self._series.setdefault((kind, entry["stage"]), _Series()).add(entry)
+            if self.path:
+                try:
+                    self._get_logger().info(json.dumps(entry, ensure_ascii=False))
+                except OSError:
+                    pass  # 計測の失敗で本来の処理を止めない
+        return entry
+
+    @contextlib.contextmanager
+    def timer(self, kind, stage=None, **fields):
+        """with ブロックの所要時間を記録する（例外が出た場合は status="error" で記録して再送出）
+
+        ブロック内で yield された辞書に値を入れると、記録に追加されます。
+        """
+        extra = dict(fields)
+        started = time.perf_counter()
+        try:
+            yield extra
+        except Exception as e:
+            extra.setdefault("status", "error")
+            extra.setdefault("error", f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            extra.setdefault("status", "ok")
+            self.record(kind, stage, duration_ms=round((time.perf_counter() - started) * 1000, 2), **extra)
+
+    def snapshot(self):
+        """プロセス内の集計を {(kind, stage): (集計, ソート済みの直近の所要時間)} で返す"""
+        with self._lock:
+            return {key: (series, sorted(series.recent_ms)) for key, series in self._series.items()}
+
+    def metrics_text(self):
+        """プロセス内の集計をPrometheusのテキスト形式で返す"""
+        lines = [
+            "# HELP seo_studio_operations_total Number of recorded operations.",
+            "# TYPE seo_studio_operations_total counter",
+        ]
+        snapshot = self.snapshot()
+        for (kind, stage), (series, _) in sorted(snapshot.items()):
+            labels = f'kind="{kind}",stage="{stage}"'
+            lines.append(f'seo_studio_operations_total{{{labels},status="ok"}} {series.count - series.errors}')
+            lines.append(f'seo_studio_operations_total{{{labels},status="error"}} {series.errors}')
+        lines += [
+            "# HELP seo_studio_duration_milliseconds Wall time per operation (quantiles over a recent window).",
+            "# TYPE seo_studio_duration_milliseconds summary",
+        ]
+        for (kind, stage), (series, durations) in sorted(snapshot.items()):
+            labels = f'kind="{kind}",stage="{stage}"'
+            for q in (0.5, 0.95):
+                lines.append(f'seo_studio_duration_milliseconds{{{labels},quantile="{q}"}} {percentile(durations, q)}')
+            lines.append(f"seo_studio_duration_milliseconds_sum{{{labels}}} {round(series.total_ms, 2)}")
+            lines.append(f"seo_studio_duration_milliseconds_count{{{labels}}} {series.count}")
+        for name, help_text, attr in (
+            ("seo_studio_cache_hits_total", "Operations served from a cache.", "cache_hits"),
+            ("seo_studio_retries_total", "Retried API requests.", "retries"),
+        ):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            for (kind, stage), (series, _) in sorted(snapshot.items()):
+                lines.append(f'{name}{{kind="{kind}",stage="{stage}"}} {getattr(series, attr)}')
+        lines += [
+            "# HELP seo_studio_tokens_total Gemini tokens by direction.",
+            "# TYPE seo_studio_tokens_total counter",
+        ]
+        llm_series = [(stage, series) for (kind, stage), (series, _) in sorted(snapshot.items()) if kind == "llm"]
+        for stage, series in llm_series:
+            lines.append(f'seo_studio_tokens_total{{stage="{stage}",direction="prompt"}} {series.prompt_tokens}')
+            lines.append(f'seo_studio_tokens_total{{stage="{stage}",direction="output"}} {series.output_tokens}')
+        lines += [
+            "# HELP seo_studio_cost_usd_total Estimated Gemini cost in USD.",
+            "# TYPE seo_studio_cost_usd_total counter",
+        ]
+        for stage, series in llm_series:
+            lines.append(f'seo_studio_cost_usd_total{{stage="{stage}"}} {round(series.cost_usd, 6)}')
+        return "\n".join(lines) + "\n"
+
+
+_recorder = Recorder()
+
+
+def get_recorder():
+    return _recorder
+
+
+def record(kind, stage=None, **fields):
+    """プロセス共通のレコーダーに1件記録する"""
+    return _recorder.record(kind, stage, **fields)
+
+
+def timer(kind, stage=None, **fields):
+    """プロセス共通のレコーダーで with ブロックの所要時間を記録する"""
+    return _recorder.timer(kind, stage, **fields)
+
+
+def metrics_text():
+    return _recorder.metrics_text()
+
+
+# --- 集計 ---
+
+def percentile(sorted_values, q):
+    """ソート済みの値のパーセンタイル（最近傍法）。値がなければ0"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def load_records(path=DEFAULT_LOG_PATH, since=None):
+    """全プロセスの記録を、ローテーション済みのファイルも含めて古い順に読み込む（since はUNIX時刻）"""
+    records = []
+    for file_path in _log_files(path):
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # 書き込み途中の行は読み飛ばす
+                    if since is None or entry.get("ts", 0) >= since:
+                        records.append(entry)
+        except FileNotFoundError:
+            continue  # 読む前にローテーション・削除されたファイル
+    records.sort(key=lambda entry: entry.get("ts", 0))
+    return records
+
+
+def summarize(records):
+    """記録を kind × stage ごとに集計し、p50 / p95 などを含む行のリストを返す"""
+    groups = {}
+    for entry in records:
+        groups.setdefault((entry.get("kind"), entry.get("stage")), []).append(entry)
+
+    rows = []
+    for (kind, stage), entries in sorted(groups.items(), key=lambda item: (str(item[0][0]), str(item[0][1]))):
+        durations = sorted(entry.get("duration_ms") or 0.0 for entry in entries)
+        count = len(entries)
+        hits = sum(1 for e in entries if e.get("cache") in ("hit", "revalidated"))
+        rows.append({
+            "kind": kind,
+            "stage": stage,
+            "count": count,
+            "errors": sum(1 for e in entries if e.get("status") == "error"),
+            "p50_ms": percentile(durations, 0.5),
+            "p95_ms": percentile(durations, 0.95),
+            "cache_hit_rate": round(hits / count, 3) if count else 0.0,
+            "retries": sum(e.get("retries") or 0 for e in entries),
+            "prompt_tokens": sum(e.get("prompt_tokens") or 0 for e in entries),
+            "output_tokens": sum(e.get("output_tokens") or 0 for e in entries),
+            "cost_usd": round(sum(e.get("cost_usd") or 0.0 for e in entries), 6),
+        })
+    return rows
@@ -0,0 +1,83 @@
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import core
+import fetcher
+import jobs
+import llm
+import section_writer
+
+
+def _wait_finished(queue, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = queue.get(job_id)
+        if job["status"] in jobs.FINISHED_STATUSES:
+            return job
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_cancel_running_job_stops_further_requests(tmp_path, monkeypatch):
+    calls = []
+    started = threading.Event()
+
+    def fake_generate_text(prompt, json_mode=False, **kwargs):
+        calls.append(prompt)
+        started.set()
+        time.sleep(0.1)
+        return "本文"
+
+    monkeypatch.setattr(llm, "generate_text", fake_generate_text)
+    monkeypatch.setattr(core, "get_response_cache", lambda: None)
+
+    def handler(params, context):
+        generate = core.make_generate(should_stop=context.cancelled)
+        return [generate(f"セクション{i}") for i in range(20)]
+
+    queue = jobs.JobQueue({"sections": handler}, path=str(tmp_path / "jobs.sqlite3"))
+    queue.start_workers(1)
+    try:
+        job_id = queue.submit("sections", {})
+        assert started.wait(5)
+        queue.cancel(job_id)
+        job = _wait_finished(queue, job_id)
+    finally:
+        queue.stop_workers()
+    assert job["status"] == "cancelled"
+    assert len(calls) < 20
+
+
+def test_generate_sections_parallel_stops_between_sections():
+    outline = {"outline": [{"H2": f"見出し{i}", "H3": []} for i in range(6)]}
+    calls = []
+    stop = threading.Event()
+
+    def generate(prompt):
+        calls.append(prompt)
+        stop.set()
+        return "本文"
+
+    try:
+        section_writer.generate_sections_parallel(outline, generate, max_workers=1, should_stop=stop.is_set)
+    except CancelledError:
+        pass
+    else:
+        raise AssertionError("CancelledError was not raised")
+    assert len(calls) == 1
+
+
+def test_map_urls_skips_urls_after_stop():
+    fetched = []
+    stop = threading.Event()
+
+    def fetch(url):
+        fetched.append(url)
+        stop.set()
+        return {"url": url}
+
+    results = fetcher.map_urls(fetch, [f"http://example.com/{i}" for i in range(5)], max_workers=1,
+                               should_stop=stop.is_set)
+    assert len(fetched) == 1
+    assert [r.get("error") for r in results[1:]] == [fetcher.CANCELLED_ERROR] * 4
@@ -0,0 +1,57 @@
+import json_parser
+from json_parser import IncrementalJSONParser, extract_json
+
+
+def test_object_with_surrounding_prose():
+    assert extract_json('結果は次のとおりです。\n```json\n{"a": 1}\n```\n以上です。') == {"a": 1}
+
+
+def test_braces_inside_strings():
+    assert extract_json('{"text": "括弧 } と { を含む", "n": 2}') == {"text": "括弧 } と { を含む", "n": 2}
+
+
+def test_trailing_commas():
+    assert extract_json('{"items": [1, 2,], }') == {"items": [1, 2]}
+
+
+def test_arrays_only_when_allowed():
+    assert extract_json('[1, 2]') is None
+    assert extract_json('[1, 2]', allow_arrays=True) == [1, 2]
+
+
+def test_unmatched_brace_in_preamble():
+    text = '出力形式 {item: ... の形で返します。\n{"seo_checklist": []}'
+    assert extract_json(text) == {"seo_checklist": []}
+
+
+def test_unterminated_string_in_first_candidate():
+    assert extract_json('{"a": "unterminated}  {"b": 2}') == {"b": 2}
+
+
+def test_mismatched_brackets_do_not_recurse():
+    assert extract_json('{' * 1000 + ']') is None
+    assert extract_json('{' * 5000 + ']' + '{"ok": true}') == {"ok": True}
+
+
+def test_invalid_candidate_falls_back_to_nested_object():
+    assert extract_json('{broken {"inner": 1} }') == {"inner": 1}
+
+
+def test_streaming_chunks():
+    parser = IncrementalJSONParser()
+    text = '前置き {"a": [1, {"b": "}"}]} 後ろの説明'
+    for i in range(0, len(text), 3):
+        parser.feed(text[i:i + 3])
+    assert parser.done and parser.result == {"a": [1, {"b": "}"}]}
+
+
+def test_streaming_waits_for_close_before_giving_up():
+    parser = IncrementalJSONParser().feed('説明 {note: {"a": 1')
+    assert not parser.done
+    parser.feed('}')
+    assert not parser.done  # 外側の { がこの後で閉じる可能性がある
+    assert parser.close().result == {"a": 1}
+
+
+def test_empty_text():
+    assert json_parser.extract_json("") is None
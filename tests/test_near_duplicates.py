@@ -0,0 +1,48 @@
+import random
+
+import near_duplicates
+
+_CHARS = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+
+
+def _text(seed, chars):
+    rng = random.Random(seed)
+    return "".join(rng.choice(_CHARS) for _ in range(chars))
+
+
+# 本文より長い定型文（どのページにも入る）
+_TEMPLATE = _text("template", 600)
+
+
+def _body(seed):
+    return _text(seed, 200)
+
+
+def _page(body):
+    return "家電の記事\n" + body + "\n" + _TEMPLATE
+
+
+def test_template_pages_keep_only_the_real_duplicate_pair():
+    similarity = near_duplicates.SiteSimilarity()
+    pages = 120
+    for index in range(pages):
+        body = _body(3) if index == pages - 5 else _body(index)
+        assert similarity.add(f"https://example.com/{index}", _page(body))
+
+    duplicates = [cluster for cluster in similarity.clusters() if cluster["reason"] == "duplicate"]
+    assert [[page["url"] for page in cluster["pages"]] for cluster in duplicates] == [
+        ["https://example.com/3", f"https://example.com/{pages - 5}"]
+    ]
+
+
+def test_template_only_pages_are_still_duplicates():
+    similarity = near_duplicates.SiteSimilarity()
+    for index in range(60):
+        similarity.add(f"https://example.com/{index}", _page(_body(index)))
+    similarity.add("https://example.com/empty-1", "家電の記事\n" + _TEMPLATE)
+    similarity.add("https://example.com/empty-2", "家電の記事\n" + _TEMPLATE)
+
+    duplicates = [cluster for cluster in similarity.clusters() if cluster["reason"] == "duplicate"]
+    assert [[page["url"] for page in cluster["pages"]] for cluster in duplicates] == [
+        ["https://example.com/empty-1", "https://example.com/empty-2"]
+    ]
@@ -0,0 +1,87 @@
+import threading
+import time
+
+import pytest
+
+import llm
+import resilience
+
+
+def test_acquire_times_out_when_no_slot_frees():
+    limiter = resilience.AdaptiveLimiter(initial=1)
+    limiter.acquire()
+    started = time.monotonic()
+    with pytest.raises(resilience.SlotTimeoutError):
+        limiter.acquire(timeout=0.05)
+    assert time.monotonic() - started < 1
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_acquire_gets_slot_released_before_timeout():
+    limiter = resilience.AdaptiveLimiter(initial=1)
+    limiter.acquire()
+    threading.Timer(0.05, limiter.release).start()
+    limiter.acquire(timeout=5)
+    assert limiter.stats()["in_flight"] == 1
+
+
+def test_call_with_retry_waits_for_slot_only_until_deadline():
+    limiter = resilience.AdaptiveLimiter(initial=1)
+    breaker = resilience.CircuitBreaker()
+    limiter.acquire()
+    calls = []
+    with pytest.raises(resilience.SlotTimeoutError):
+        resilience.call_with_retry(lambda: calls.append(1), resilience.RetryPolicy(deadline=0.05), limiter, breaker)
+    assert calls == []
+    assert limiter.stats()["in_flight"] == 1
+
+
+class _Chunk:
+    def __init__(self, text):
+        self.text = text
+
+
+class _Model:
+    def __init__(self, texts, fail_after=None):
+        self.texts = texts
+        self.fail_after = fail_after
+
+    def generate_content(self, prompt, **kwargs):
+        for i, text in enumerate(self.texts):
+            if i == self.fail_after:
+                raise RuntimeError("stream broke")
+            yield _Chunk(text)
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    monkeypatch.setattr(llm, "_limiter", resilience.AdaptiveLimiter())
+    monkeypatch.setattr(llm.telemetry, "record", lambda *args, **kwargs: None)
+
+    def install(model):
+        monkeypatch.setattr(llm, "get_model", lambda name=None: model)
+    return install
+
+
+def test_stream_releases_slot_when_closed_early(fake_model):
+    fake_model(_Model(["a", "b", "c"]))
+    stream = llm.stream_text("prompt")
+    assert next(stream) == "a"
+    assert llm._limiter.stats()["in_flight"] == 1
+    stream.close()
+    assert llm._limiter.stats()["in_flight"] == 0
+
+
+def test_stream_releases_slot_on_error(fake_model):
+    fake_model(_Model(["a", "b", "c"], fail_after=1))
+    stream = llm.stream_text("prompt")
+    assert next(stream) == "a"
+    with pytest.raises(RuntimeError):
+        next(stream)
+    assert llm._limiter.stats()["in_flight"] == 0
+
+
+def test_stream_releases_slot_when_finished(fake_model):
+    fake_model(_Model(["a", "b"]))
+    assert "".join(llm.stream_text("prompt")) == "ab"
+    assert llm._limiter.stats()["in_flight"] == 0
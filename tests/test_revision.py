@@ -0,0 +1,44 @@
+import revision
+
+
+def _sections():
+    return [
+        "テントの設営は平らな場所を選び、ペグをしっかり打ち込みます。",
+        "焚き火台を使えば芝生を傷めずに焚き火を楽しめます。",
+        "寝袋は季節に合わせた快適温度のものを選びましょう。",
+    ]
+
+
+def test_specific_item_goes_to_matching_section():
+    items = [{"item": "具体性", "suggestion": "焚き火台の使い方と焚き火の注意点を追加"}]
+    assert revision.map_items_to_sections(_sections(), items) == {1: items}
+
+
+def test_global_item_goes_to_every_section():
+    items = [{"item": "網羅性・深さ", "evaluation": "全体的に情報が不足", "suggestion": "事例を増やす"}]
+    targets = revision.map_items_to_sections(_sections(), items)
+    assert sorted(targets) == [0, 1, 2]
+
+
+def test_split_on_headings_without_blank_lines_round_trips():
+    body = "# タイトル\n## 見出し1\n本文A\n### 小見出し\n本文B\n\n\n段落C\n## 見出し2\n本文D\n"
+    lead, sections, separators = revision._split(body)
+    assert [section.splitlines()[0] for section in sections] == ["# タイトル", "## 見出し1", "### 小見出し", "## 見出し2"]
+    assert lead + "".join(s + sep for s, sep in zip(sections, separators)) == body
+
+
+def test_long_paragraphs_are_grouped_by_target_chars():
+    body = "\n\n".join("段落" * 200 for _ in range(4))
+    assert len(revision.split_sections(body)) == 4
+
+
+def test_revise_sections_keeps_untouched_text_and_separators():
+    body = "## 設営\nテントの設営は平らな場所を選びます。\n## 焚き火\n焚き火台を使いましょう。\n"
+    items = [{"item": "具体性", "suggestion": "焚き火台の選び方を追加"}]
+
+    def generate(prompt):
+        return "## 焚き火\n焚き火台は耐荷重で選びましょう。"
+
+    revised, changes = revision.revise_sections(body, items, "キャンプ", generate)
+    assert revised == "## 設営\nテントの設営は平らな場所を選びます。\n## 焚き火\n焚き火台は耐荷重で選びましょう。\n"
+    assert [change["index"] for change in changes] == [1]